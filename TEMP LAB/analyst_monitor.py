@@ -1,9 +1,16 @@
 import _snowflake
-import json
+import os
+import sys
 import streamlit as st
 import pandas as pd
 from snowflake.snowpark.context import get_active_session
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from analyst_intent import ai_classify
+from analyst_log_collector import enrichment_sql
+from analyst_sql_analysis import analyze
+from app_workloads import use_workload
+
 # --- Configurable Variables ---
 DB = "CORTEX_ANALYST_DEMO"
 SCHEMA = "REVENUE_TIMESERIES"
@@ -11,100 +18,150 @@ STAGE = "RAW_DATA"
 FILE_NAME = "revenue_timeseries.yaml"
 STAGE_PATH = f"@{DB}.{SCHEMA}.{STAGE}/{FILE_NAME}"
 
+# History table kept up to date by analyst_log_collector.py (covers every
+# semantic model). Set to None to read the live log for STAGE_PATH instead.
+HISTORY_TABLE = f"{DB}.{SCHEMA}.ANALYST_REQUESTS_HISTORY"
+
 # Get session
 session = get_active_session()
-
-# Query Cortex Analyst logs
-query = f"""
-SELECT *
-FROM TABLE(
-  SNOWFLAKE.LOCAL.CORTEX_ANALYST_REQUESTS(
-    'FILE_ON_STAGE',
-    '{STAGE_PATH}'
-  )
-)
+use_workload(session, "dashboard", app="analyst_monitor")
+
+# Query Cortex Analyst logs. TEXT_RESPONSE, INTENT, COMPLEXITY_SCORE, TABLE_LIST
+# and HAS_WARNINGS are precomputed by the collector (or derived by the same SQL
+# for the live log), so RESPONSE_BODY is never brought into pandas.
+LOG_COLUMNS = """
+    TIMESTAMP, REQUEST_ID, USER_NAME, SEMANTIC_MODEL_NAME, LATEST_QUESTION, GENERATED_SQL,
+    RESPONSE_STATUS_CODE, TO_VARCHAR(WARNINGS) AS WARNINGS, TO_VARCHAR(FEEDBACK) AS FEEDBACK,
+    TEXT_RESPONSE, INTENT, COMPLEXITY_SCORE, TABLE_LIST, HAS_WARNINGS
 """
-df = session.sql(query).to_pandas()
-
-# Convert timestamp
-df['TIMESTAMP'] = pd.to_datetime(df['TIMESTAMP'])
-
-# Extract plain text from RESPONSE_BODY
-def extract_text_response(response):
-    try:
-        content = json.loads(response)['message']['content']
-        for item in content:
-            if isinstance(item, dict) and 'text' in item:
-                return item['text']
-    except:
-        return None
-
-df['TEXT_RESPONSE'] = df['RESPONSE_BODY'].apply(extract_text_response)
-
-# --- Intelligence: Intent Classification ---
-def classify_intent(question):
-    q = str(question).lower()
-    if any(word in q for word in ['trend', 'over time', 'daily', 'weekly', 'monthly']):
-        return 'Trend Analysis'
-    if any(word in q for word in ['average', 'sum', 'count', 'aggregate']):
-        return 'Aggregation'
-    if ' vs ' in q or 'compare' in q:
-        return 'Comparison'
-    if 'anomaly' in q or 'unexpected' in q:
-        return 'Anomaly Detection'
-    return 'Other'
-
-df['INTENT'] = df['LATEST_QUESTION'].apply(classify_intent)
-
-# --- Intelligence: Query Complexity Score ---
-def query_complexity(sql):
-    if pd.isna(sql):
-        return 0
-    return sql.count("SELECT") + sql.count("JOIN") + sql.count("WITH")
-
-df['COMPLEXITY_SCORE'] = df['GENERATED_SQL'].apply(query_complexity)
+if HISTORY_TABLE:
+    query = f"SELECT {LOG_COLUMNS} FROM {HISTORY_TABLE}"
+else:
+    query = f"""
+    SELECT {LOG_COLUMNS}
+    FROM (
+      SELECT *, {enrichment_sql()}
+      FROM TABLE(
+        SNOWFLAKE.LOCAL.CORTEX_ANALYST_REQUESTS(
+          'FILE_ON_STAGE',
+          '{STAGE_PATH}'
+        )
+      )
+    )
+    """
+
+# Cached for CACHE_TTL_SECONDS; changing a filter re-renders from memory
+CACHE_TTL_SECONDS = 600
+
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, show_spinner="Loading Cortex Analyst logs...")
+def load_logs(query: str) -> pd.DataFrame:
+    """Base dataset, fetched and prepared once per query (i.e. per log source)."""
+    logs = session.sql(query).to_pandas()
+    logs['TIMESTAMP'] = pd.to_datetime(logs['TIMESTAMP'])
+    logs['DATE'] = logs['TIMESTAMP'].dt.date
+    # The collector stores the parsed complexity score; the live log only has the
+    # keyword estimate, so parse each distinct statement here instead
+    if not HISTORY_TABLE:
+        logs['COMPLEXITY_SCORE'] = analyze(logs['GENERATED_SQL'])['complexity_score']
+    return logs
+
+
+def filter_mask(logs: pd.DataFrame, user="All", model="All", start=None, end=None, search="") -> pd.Series:
+    """All sidebar filters combined into a single boolean mask (no intermediate copies)."""
+    mask = pd.Series(True, index=logs.index)
+    if user != "All":
+        mask &= logs['USER_NAME'] == user
+    if model != "All":
+        mask &= logs['SEMANTIC_MODEL_NAME'] == model
+    if start is not None:
+        mask &= logs['DATE'] >= start
+    if end is not None:
+        mask &= logs['DATE'] <= end
+    if search:
+        mask &= (logs['LATEST_QUESTION'].str.contains(search, case=False, na=False, regex=False) |
+                 logs['GENERATED_SQL'].str.contains(search, case=False, na=False, regex=False))
+    return mask
+
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def filtered_logs(query: str, filters: tuple, use_ai: bool) -> pd.DataFrame:
+    """Rows matching one filter tuple, memoized per tuple."""
+    logs = load_logs(query)
+    rows = logs[filter_mask(logs, *filters)]
+    if use_ai:
+        rows = rows.assign(INTENT=ai_classify(session, rows['LATEST_QUESTION']))
+    return rows
+
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def summarize(query: str, filters: tuple, use_ai: bool) -> dict:
+    """Chart aggregates for one filter tuple, memoized per tuple."""
+    rows = filtered_logs(query, filters, use_ai)
+    has_warnings = rows['HAS_WARNINGS'].fillna(False).astype(bool)
+    tables = rows['TABLE_LIST'].dropna().str.split(',').explode()
+    success = rows.groupby(['USER_NAME', rows['GENERATED_SQL'].notna().rename('SUCCESS')]).size().unstack(fill_value=0)
+    success['Total'] = success.sum(axis=1)
+    return {
+        'total': len(rows),
+        'successful': int(rows['GENERATED_SQL'].notnull().sum()),
+        'daily': rows.groupby('DATE').size().rename_axis('Date').rename('total_requests').to_frame(),
+        'intents': rows['INTENT'].value_counts(),
+        'tables': tables[tables != ''].value_counts().head(10),
+        'warning_patterns': rows['WARNINGS'][has_warnings].value_counts().head(10),
+        'per_user': rows['USER_NAME'].value_counts(),
+        'success_by_user': success.sort_values(by='Total', ascending=False).drop(columns='Total'),
+    }
+
+
+base = load_logs(query)
 
 # --- Sidebar Filters ---
 st.sidebar.title("Filters")
 
 # User filter
-selected_user = st.sidebar.selectbox("User", ["All"] + sorted(df['USER_NAME'].unique().tolist()))
-if selected_user != "All":
-    df = df[df['USER_NAME'] == selected_user]
+selected_user = st.sidebar.selectbox("User", ["All"] + sorted(base['USER_NAME'].unique().tolist()))
 
-# Semantic model filter
-selected_model = st.sidebar.selectbox("Semantic Model", ["All"] + sorted(df['SEMANTIC_MODEL_NAME'].unique().tolist()))
-if selected_model != "All":
-    df = df[df['SEMANTIC_MODEL_NAME'] == selected_model]
+# Semantic model filter (options limited to the selected user)
+user_rows = base[filter_mask(base, selected_user)]
+selected_model = st.sidebar.selectbox("Semantic Model", ["All"] + sorted(user_rows['SEMANTIC_MODEL_NAME'].unique().tolist()))
 
 # Date range filter
-start_date = st.sidebar.date_input("Start Date", df['TIMESTAMP'].min().date())
-end_date = st.sidebar.date_input("End Date", df['TIMESTAMP'].max().date())
-df = df[(df['TIMESTAMP'].dt.date >= start_date) & (df['TIMESTAMP'].dt.date <= end_date)]
+model_rows = user_rows[filter_mask(user_rows, model=selected_model)]
+start_date = st.sidebar.date_input("Start Date", model_rows['TIMESTAMP'].min().date())
+end_date = st.sidebar.date_input("End Date", model_rows['TIMESTAMP'].max().date())
+
+# Intent classifier (keyword INTENT comes from analyst_intent.py via the collector SQL)
+use_ai_intent = st.sidebar.checkbox("Classify intents with AI_CLASSIFY", value=False)
 
 # Keyword search
 search_term = st.sidebar.text_input("Search (Question or SQL)")
-if search_term:
-    df = df[df['LATEST_QUESTION'].str.contains(search_term, case=False, na=False) |
-            df['GENERATED_SQL'].str.contains(search_term, case=False, na=False)]
+
+if st.sidebar.button("Refresh data"):
+    st.cache_data.clear()
+    st.rerun()
+
+filters = (selected_user, selected_model, start_date, end_date, search_term)
+df = filtered_logs(query, filters, use_ai_intent)
+summary = summarize(query, filters, use_ai_intent)
 
 # --- Title ---
 st.title("📊 Snowflake Cortex Analyst Dashboard")
 
 # --- KPIs ---
 col1, col2, col3 = st.columns(3)
-col1.metric("Total Requests", len(df))
-col2.metric("Successful Requests", df['GENERATED_SQL'].notnull().sum())
-col3.metric("Failure Rate", f"{100 * (df['GENERATED_SQL'].isnull().sum() / len(df)):.1f}%")
+col1.metric("Total Requests", summary['total'])
+col2.metric("Successful Requests", summary['successful'])
+failure_rate = 100 * (summary['total'] - summary['successful']) / summary['total'] if summary['total'] else 0.0
+col3.metric("Failure Rate", f"{failure_rate:.1f}%")
 
 # --- Daily Usage Trend ---
 st.subheader("📅 Daily Usage Trend")
-daily_counts = df.groupby(df['TIMESTAMP'].dt.date).size().reset_index(name='total_requests')
-st.line_chart(daily_counts.rename(columns={'TIMESTAMP': 'Date'}).set_index('Date'))
+st.line_chart(summary['daily'])
 
 # --- Intent Distribution ---
 st.subheader("🧠 Question Intent Distribution")
-st.bar_chart(df['INTENT'].value_counts())
+st.bar_chart(summary['intents'])
 
 # --- Questions with SQL ---
 st.subheader("🙋 Questions by User with Generated SQL")
@@ -116,37 +173,19 @@ st.dataframe(questions_df)
 
 # --- Table Usage ---
 st.subheader("📃 Most Referenced Tables")
-def extract_tables(row):
-    try:
-        return json.loads(row.replace("\n", "").replace("'", '"'))
-    except:
-        return []
-
-all_tables = df['TABLES_REFERENCED'].dropna().apply(extract_tables)
-table_flat = pd.Series([table for sublist in all_tables for table in sublist])
-table_counts = table_flat.value_counts().head(10)
-st.bar_chart(table_counts)
+st.bar_chart(summary['tables'])
 
 # --- Requests with Warnings ---
 st.subheader("⚠️ Requests with Warnings")
 with st.expander("View Requests with Warnings"):
-    warnings_df = df[
-        df['WARNINGS'].notna() &
-        (df['WARNINGS'].str.lower() != 'null') &
-        (df['WARNINGS'] != '[]')
-    ][[
+    warnings_df = df[df['HAS_WARNINGS'].fillna(False).astype(bool)][[
         'TIMESTAMP', 'USER_NAME', 'LATEST_QUESTION', 'WARNINGS'
     ]].rename(columns={'LATEST_QUESTION': 'QUESTION'})
     st.dataframe(warnings_df)
 
 # --- Top Warning Patterns ---
 st.subheader("🚨 Top Warning Patterns")
-warning_patterns = df['WARNINGS'][
-    df['WARNINGS'].notna() &
-    (df['WARNINGS'].str.lower() != 'null') &
-    (df['WARNINGS'] != '[]')
-].value_counts().head(10)
-st.bar_chart(warning_patterns)
+st.bar_chart(summary['warning_patterns'])
 
 # --- Failed Requests ---
 st.subheader("🚫 Failed Requests")
@@ -158,19 +197,15 @@ with st.expander("View Failed Requests"):
 
 # --- Requests Per User ---
 st.subheader("👥 Requests Per User")
-st.bar_chart(df['USER_NAME'].value_counts())
+st.bar_chart(summary['per_user'])
 
 # --- Success vs Failure by User ---
 st.subheader("✅ Success vs ❌ Failure by User")
-df['SUCCESS'] = df['GENERATED_SQL'].notna()
-success_df = df.groupby(['USER_NAME', 'SUCCESS']).size().unstack(fill_value=0)
-success_df['Total'] = success_df.sum(axis=1)
-success_df = success_df.sort_values(by='Total', ascending=False)
-st.bar_chart(success_df.drop(columns='Total'))
+st.bar_chart(summary['success_by_user'])
 
 # --- User Activity Table ---
 st.subheader("🔍 User Activity Table")
-user_counts = df['USER_NAME'].value_counts().reset_index()
+user_counts = summary['per_user'].reset_index()
 user_counts.columns = ['USER_NAME', 'TOTAL_REQUESTS']
 st.dataframe(user_counts)
 
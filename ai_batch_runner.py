@@ -0,0 +1,378 @@
+#------------------------------------------------------------------------------
+# AI BATCH RUNNER
+# Runs an AI_COMPLETE prompt template over a table in chunked, resumable,
+# set-based statements (the patterns in LLM_PROMPT_ENGINEERING_SF.ipynb, at
+# table scale).
+#
+# - The template references source columns as {COLUMN}; it is rendered in SQL,
+#   and identical rendered prompts are queued (and billed) once, keyed by
+#   SHA2 of the prompt, in <TARGET>_PROMPTS
+# - Queued prompts are prechecked with COUNT_TOKENS; prompts over
+#   max_prompt_tokens are marked SKIPPED instead of being sent
+# - Pending prompts are completed CHUNK_SIZE at a time, one MERGE per chunk.
+#   A failed chunk is split in half and retried; a single prompt that still
+#   fails is marked FAILED. Splitting continues only while the failure looks
+#   like one bad prompt (one half succeeds, or a per-row error): a statement-
+#   wide error (unknown model, privileges, warehouse) is raised at once and
+#   leaves the prompts PENDING. The failed statement rolls back, so the good
+#   prompts in it are completed (and billed) again: one bad prompt costs about
+#   2 * log2(chunk size) extra statements and up to ~2x the chunk's tokens.
+#   Each split is logged; lower chunk_size when prompts fail often
+# - Rerunning the same job resumes with what is still PENDING;
+#   retry_failed=True also moves FAILED prompts back to PENDING first
+# - With a JSON schema, structured output is written to typed columns
+#   (string -> VARCHAR, integer -> NUMBER, number -> FLOAT, boolean -> BOOLEAN,
+#   array -> ARRAY, object -> OBJECT)
+# - <TARGET> is a view joining every source row to its result
+# - Each chunk's rows, tokens, throughput and query id are logged in
+#   <TARGET>_BATCHES; batch_report() adds the credits billed per chunk from
+#   CORTEX_FUNCTIONS_QUERY_USAGE_HISTORY (which lags by up to a few hours)
+#
+# Usage:
+#   run_batch(session, "DB.SCHEMA.REVIEWS", ["REVIEW_ID"],
+#             "Classify the sentiment of this review: {REVIEW_TEXT}",
+#             "DB.SCHEMA.REVIEW_SENTIMENT", model="claude-4-sonnet",
+#             schema={"type": "object",
+#                     "properties": {"sentiment": {"type": "string", "enum": ["positive", "negative", "neutral"]}},
+#                     "required": ["sentiment"]})
+#------------------------------------------------------------------------------
+
+import json
+import re
+import time
+import uuid
+
+import pandas as pd
+
+CHUNK_SIZE = 500               # prompts per AI_COMPLETE statement
+MAX_PROMPT_TOKENS = 8000       # prompts above this are SKIPPED
+DEFAULT_MODEL_PARAMETERS = {"temperature": 0}
+
+# Optional estimate until usage history catches up: credits per million tokens
+# by model (see the Snowflake service consumption table for current rates)
+CREDITS_PER_MILLION_TOKENS = {
+    # "claude-4-sonnet": 2.55,
+}
+
+JSON_SQL_TYPES = {
+    "string": "VARCHAR",
+    "integer": "NUMBER",
+    "number": "FLOAT",
+    "boolean": "BOOLEAN",
+    "array": "ARRAY",
+    "object": "OBJECT",
+}
+
+# AI_COMPLETE errors caused by one prompt (rather than the whole statement)
+ROW_ERROR_PATTERN = re.compile(
+    r"max(imum)?[ _]tokens|context (window|length)|too long|exceeds? the|content (filter|policy)|invalid (prompt|input)",
+    re.IGNORECASE,
+)
+
+_PLACEHOLDER = re.compile(r"\{([A-Za-z_][A-Za-z0-9_$]*)\}")
+
+
+def _literal(text: str) -> str:
+    return "'" + text.replace("\\", "\\\\").replace("'", "''") + "'"
+
+
+def sql_constant(value) -> str:
+    """Python value as a Snowflake constant ({'k': v} objects, [..] arrays)."""
+    if isinstance(value, dict):
+        return "{" + ", ".join(f"{_literal(str(k))}: {sql_constant(v)}" for k, v in value.items()) + "}"
+    if isinstance(value, (list, tuple)):
+        return "[" + ", ".join(sql_constant(v) for v in value) + "]"
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if value is None:
+        return "NULL"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return _literal(str(value))
+
+
+def render_template(template: str, alias: str = None) -> str:
+    """SQL expression building the prompt from {COLUMN} placeholders (NULLs render as '')."""
+    prefix = f"{alias}." if alias else ""
+    parts, pos = [], 0
+    for match in _PLACEHOLDER.finditer(template):
+        if match.start() > pos:
+            parts.append(_literal(template[pos:match.start()]))
+        parts.append(f"COALESCE(TO_VARCHAR({prefix}{match.group(1)}), '')")
+        pos = match.end()
+    if pos < len(template):
+        parts.append(_literal(template[pos:]))
+    if not parts:
+        return "''"
+    return parts[0] if len(parts) == 1 else f"CONCAT({', '.join(parts)})"
+
+
+def typed_columns(schema: dict, output: str = "OUTPUT") -> dict:
+    """{COLUMN: (sql type, expression over output)} for a JSON schema's top-level properties."""
+    columns = {}
+    for name, prop in ((schema or {}).get("properties") or {}).items():
+        sql_type = JSON_SQL_TYPES.get(prop.get("type"), "VARIANT")
+        value = f'{output}:"{name}"'
+        expression = {
+            "VARCHAR": f"{value}::VARCHAR",
+            "NUMBER": f"TRY_TO_NUMBER({value}::VARCHAR)",
+            "FLOAT": f"TRY_TO_DOUBLE({value}::VARCHAR)",
+            "BOOLEAN": f"TRY_TO_BOOLEAN({value}::VARCHAR)",
+            "ARRAY": f"IFF(IS_ARRAY({value}), {value}::ARRAY, NULL)",
+            "OBJECT": f"IFF(IS_OBJECT({value}), {value}::OBJECT, NULL)",
+        }.get(sql_type, value)
+        columns[re.sub(r"\W", "_", name).upper()] = (sql_type, expression)
+    return columns
+
+
+def ensure_tables(session, target: str, columns: dict) -> None:
+    """Create the prompt queue and batch log (and any new typed columns)."""
+    session.sql(f"""
+        CREATE TABLE IF NOT EXISTS {target}_PROMPTS (
+            PROMPT_HASH VARCHAR,
+            PROMPT VARCHAR,
+            PROMPT_TOKENS NUMBER,
+            STATUS VARCHAR,             -- PENDING | DONE | SKIPPED | FAILED
+            RESPONSE VARIANT,           -- AI_COMPLETE(..., show_details => TRUE)
+            OUTPUT VARIANT,             -- structured output or text
+            INPUT_TOKENS NUMBER,
+            OUTPUT_TOKENS NUMBER,
+            ERROR VARCHAR,
+            RUN_ID VARCHAR,
+            BATCH_NO NUMBER,
+            QUEUED_AT TIMESTAMP_LTZ,
+            COMPLETED_AT TIMESTAMP_LTZ
+        )
+    """).collect()
+    for name, (sql_type, _) in columns.items():
+        session.sql(f"ALTER TABLE {target}_PROMPTS ADD COLUMN IF NOT EXISTS {name} {sql_type}").collect()
+    session.sql(f"""
+        CREATE TABLE IF NOT EXISTS {target}_BATCHES (
+            RUN_ID VARCHAR,
+            BATCH_NO NUMBER,
+            QUERY_ID VARCHAR,
+            MODEL VARCHAR,
+            PROMPTS NUMBER,
+            SUCCEEDED NUMBER,
+            FAILED NUMBER,
+            INPUT_TOKENS NUMBER,
+            OUTPUT_TOKENS NUMBER,
+            SECONDS FLOAT,
+            PROMPTS_PER_SECOND FLOAT,
+            EST_CREDITS FLOAT,
+            STARTED_AT TIMESTAMP_LTZ
+        )
+    """).collect()
+
+
+def enqueue(session, source: str, template: str, target: str, model: str,
+            max_prompt_tokens: int = MAX_PROMPT_TOKENS, where: str = None) -> int:
+    """Queue new distinct prompts with their token count; returns rows inserted."""
+    prompt = render_template(template)
+    result = session.sql(f"""
+        INSERT INTO {target}_PROMPTS (PROMPT_HASH, PROMPT, PROMPT_TOKENS, STATUS, QUEUED_AT)
+        SELECT PROMPT_HASH, PROMPT, TOKENS, IFF(TOKENS > ?, 'SKIPPED', 'PENDING'), CURRENT_TIMESTAMP()
+        FROM (
+            SELECT PROMPT_HASH, PROMPT, SNOWFLAKE.CORTEX.COUNT_TOKENS({_literal(model)}, PROMPT) AS TOKENS
+            FROM (
+                SELECT DISTINCT SHA2({prompt}) AS PROMPT_HASH, {prompt} AS PROMPT
+                FROM {source}
+                {f"WHERE {where}" if where else ""}
+            ) p
+            WHERE NOT EXISTS (SELECT 1 FROM {target}_PROMPTS q WHERE q.PROMPT_HASH = p.PROMPT_HASH)
+        )
+    """, params=[max_prompt_tokens]).collect()
+    return result[0][0] if result else 0
+
+
+def create_output_view(session, source: str, key_columns: list, template: str, target: str,
+                       columns: dict) -> None:
+    """<TARGET>: one row per source row with its status and typed result columns."""
+    keys = ", ".join(f"s.{k}" for k in key_columns)
+    typed = "".join(f", p.{name}" for name in columns)
+    session.sql(f"""
+        CREATE OR REPLACE VIEW {target} AS
+        SELECT {keys}, p.STATUS, p.OUTPUT{typed}, p.PROMPT_HASH
+        FROM {source} s
+        LEFT JOIN {target}_PROMPTS p ON p.PROMPT_HASH = SHA2({render_template(template, "s")})
+    """).collect()
+
+
+def _complete_chunk(session, target: str, model: str, options: str, typed_set: str,
+                    run_id: str, batch_no: int, hashes: list) -> tuple:
+    """One MERGE over the given pending prompts; returns (query_id, rows updated)."""
+    job = session.sql(f"""
+        MERGE INTO {target}_PROMPTS t
+        USING (
+            SELECT PROMPT_HASH, RESPONSE,
+                   COALESCE(RESPONSE:structured_output[0]:raw_message,
+                            TRY_PARSE_JSON(RESPONSE:choices[0]:messages::VARCHAR),
+                            RESPONSE:choices[0]:messages) AS OUTPUT
+            FROM (
+                SELECT PROMPT_HASH,
+                       AI_COMPLETE(model => {_literal(model)}, prompt => PROMPT{options}, show_details => TRUE) AS RESPONSE
+                FROM {target}_PROMPTS
+                WHERE STATUS = 'PENDING'
+                  AND PROMPT_HASH IN (SELECT value::VARCHAR FROM TABLE(FLATTEN(PARSE_JSON(?))))
+            )
+        ) s
+        ON t.PROMPT_HASH = s.PROMPT_HASH
+        WHEN MATCHED THEN UPDATE SET
+            STATUS = IFF(s.OUTPUT IS NULL, 'FAILED', 'DONE'),
+            RESPONSE = s.RESPONSE,
+            OUTPUT = s.OUTPUT,
+            INPUT_TOKENS = s.RESPONSE:usage:prompt_tokens::NUMBER,
+            OUTPUT_TOKENS = s.RESPONSE:usage:completion_tokens::NUMBER,
+            ERROR = IFF(s.OUTPUT IS NULL, 'Empty response', NULL),
+            RUN_ID = ?,
+            BATCH_NO = ?,
+            COMPLETED_AT = CURRENT_TIMESTAMP(){typed_set}
+    """, params=[json.dumps(hashes), run_id, batch_no]).collect_nowait()
+    result = job.result()
+    return job.query_id, result[0][0] if result else 0
+
+
+def _complete_with_retry(session, target, model, options, typed_set, run_id, batch_no, hashes,
+                         log=print, error: Exception = None) -> list:
+    """
+    Complete hashes, splitting failed chunks; returns [(query_id, rows updated)] per statement.
+
+    A failed statement is split in half only while the failure looks like one
+    bad prompt: one half succeeds, or the error matches ROW_ERROR_PATTERN. If
+    both halves fail with another error (unknown model, missing privilege,
+    suspended warehouse, ...), it is raised and the prompts stay PENDING. A
+    failed statement rolls back, so the prompts of both halves are sent (and
+    billed) again.
+    """
+    if error is None:
+        try:
+            return [_complete_chunk(session, target, model, options, typed_set, run_id, batch_no, hashes)]
+        except Exception as e:
+            error = e
+    if len(hashes) == 1:
+        session.sql(f"""
+            UPDATE {target}_PROMPTS
+            SET STATUS = 'FAILED', ERROR = ?, RUN_ID = ?, BATCH_NO = ?, COMPLETED_AT = CURRENT_TIMESTAMP()
+            WHERE PROMPT_HASH = ?
+        """, params=[str(error)[:4000], run_id, batch_no, hashes[0]]).collect()
+        return []
+
+    log(f"Batch {batch_no}: statement over {len(hashes)} prompts failed ({str(error)[:200]}); "
+        f"splitting and re-sending them (billed again)")
+    half = len(hashes) // 2
+    statements, failed = [], []
+    for part in (hashes[:half], hashes[half:]):
+        try:
+            statements.append(_complete_chunk(session, target, model, options, typed_set, run_id, batch_no, part))
+        except Exception as e:
+            failed.append((part, e))
+    if len(failed) == 2 and not any(ROW_ERROR_PATTERN.search(str(e)) for _, e in failed):
+        raise RuntimeError(f"Batch {batch_no}: AI_COMPLETE failed for the whole statement, not one prompt; "
+                           f"its prompts are left PENDING: {failed[0][1]}") from failed[0][1]
+    for part, e in failed:
+        statements += _complete_with_retry(session, target, model, options, typed_set, run_id, batch_no,
+                                           part, log, e)
+    return statements
+
+
+def run_batch(session, source: str, key_columns: list, template: str, target: str, model: str,
+              schema: dict = None, model_parameters: dict = None, where: str = None,
+              chunk_size: int = CHUNK_SIZE, max_prompt_tokens: int = MAX_PROMPT_TOKENS,
+              max_batches: int = None, retry_failed: bool = False, log=print) -> pd.DataFrame:
+    """
+    Run a prompt template over a table; safe to rerun to resume.
+
+    Prompts that ended FAILED stay FAILED on a rerun unless retry_failed is set.
+
+    Args:
+        session: Snowpark session.
+        source: Fully qualified source table or view.
+        key_columns: Columns identifying a source row (carried into the output view).
+        template: Prompt with {COLUMN} placeholders.
+        target: Fully qualified name for the output view; <target>_PROMPTS and
+            <target>_BATCHES are created next to it.
+        model: AI_COMPLETE model.
+        schema: Optional JSON schema for structured output (typed columns).
+        model_parameters: AI_COMPLETE model_parameters (default temperature 0).
+        where: Optional filter on the source table.
+        chunk_size: Prompts per statement.
+        max_prompt_tokens: Prompts with more tokens are skipped.
+        max_batches: Stop after this many chunks (the rest stay PENDING).
+        retry_failed: Move FAILED prompts back to PENDING before running.
+        log: Progress callback.
+
+    Returns:
+        DataFrame with one row per chunk from <target>_BATCHES for this run.
+    """
+    run_id = uuid.uuid4().hex
+    columns = typed_columns(schema)
+    ensure_tables(session, target, columns)
+    queued = enqueue(session, source, template, target, model, max_prompt_tokens, where)
+    create_output_view(session, source, key_columns, template, target, columns)
+    log(f"Queued {queued} new distinct prompts")
+    if retry_failed:
+        result = session.sql(f"""
+            UPDATE {target}_PROMPTS SET STATUS = 'PENDING', ERROR = NULL
+            WHERE STATUS = 'FAILED'
+        """).collect()
+        log(f"Re-queued {result[0][0] if result else 0} failed prompts")
+
+    options = f", model_parameters => {sql_constant(model_parameters or DEFAULT_MODEL_PARAMETERS)}"
+    if schema:
+        options += f", response_format => {sql_constant({'type': 'json', 'schema': schema})}"
+    typed_set = "".join(f",\n            {name} = {expr}" for name, (_, expr) in typed_columns(schema, "s.OUTPUT").items())
+    rate = CREDITS_PER_MILLION_TOKENS.get(model)
+
+    batch_no = 0
+    while max_batches is None or batch_no < max_batches:
+        hashes = [row[0] for row in session.sql(
+            f"SELECT PROMPT_HASH FROM {target}_PROMPTS WHERE STATUS = 'PENDING' ORDER BY PROMPT_HASH LIMIT ?",
+            params=[chunk_size]).collect()]
+        if not hashes:
+            break
+        batch_no += 1
+        started = time.time()
+        statements = _complete_with_retry(session, target, model, options, typed_set, run_id, batch_no, hashes, log)
+        seconds = time.time() - started
+
+        stats = session.sql(f"""
+            SELECT COUNT_IF(STATUS = 'DONE'), COUNT_IF(STATUS = 'FAILED'),
+                   COALESCE(SUM(INPUT_TOKENS), 0), COALESCE(SUM(OUTPUT_TOKENS), 0)
+            FROM {target}_PROMPTS
+            WHERE RUN_ID = ? AND BATCH_NO = ?
+        """, params=[run_id, batch_no]).collect()[0]
+        est_credits = (stats[2] + stats[3]) / 1e6 * rate if rate else None
+        session.sql(f"""
+            INSERT INTO {target}_BATCHES
+            SELECT ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, DATEADD(millisecond, -?, CURRENT_TIMESTAMP())
+        """, params=[run_id, batch_no, ",".join(q for q, _ in statements), model, len(hashes),
+                     stats[0], stats[1], stats[2], stats[3], seconds, len(hashes) / seconds if seconds else None,
+                     est_credits, int(seconds * 1000)]).collect()
+        log(f"Batch {batch_no}: {stats[0]} done, {stats[1]} failed, "
+            f"{stats[2] + stats[3]:,} tokens, {len(hashes) / seconds:,.1f} prompts/s")
+
+    return batch_report(session, target, run_id)
+
+
+def batch_report(session, target: str, run_id: str = None) -> pd.DataFrame:
+    """Per-chunk metrics, with billed credits from CORTEX_FUNCTIONS_QUERY_USAGE_HISTORY once available."""
+    return session.sql(f"""
+        WITH batches AS (
+            SELECT * FROM {target}_BATCHES WHERE ? IS NULL OR RUN_ID = ?
+        ),
+        batch_queries AS (
+            -- A chunk that was split and retried ran as several statements
+            SELECT b.RUN_ID, b.BATCH_NO, TRIM(q.value) AS QUERY_ID
+            FROM batches b, LATERAL SPLIT_TO_TABLE(b.QUERY_ID, ',') q
+        ),
+        billed AS (
+            SELECT bq.RUN_ID, bq.BATCH_NO, SUM(u.TOKEN_CREDITS) AS BILLED_CREDITS
+            FROM batch_queries bq
+            JOIN SNOWFLAKE.ACCOUNT_USAGE.CORTEX_FUNCTIONS_QUERY_USAGE_HISTORY u ON u.QUERY_ID = bq.QUERY_ID
+            GROUP BY 1, 2
+        )
+        SELECT b.*, billed.BILLED_CREDITS
+        FROM batches b
+        LEFT JOIN billed ON billed.RUN_ID = b.RUN_ID AND billed.BATCH_NO = b.BATCH_NO
+        ORDER BY b.STARTED_AT, b.BATCH_NO
+    """, params=[run_id, run_id]).to_pandas()
@@ -0,0 +1,173 @@
+#------------------------------------------------------------------------------
+# ANALYST CHARTS
+# Chart pipeline for Cortex Analyst result sets of any size.
+#
+# - chart_spec() picks the chart from column dtypes: a date/time column with
+#   numeric columns is a line chart, a text column with numeric columns is a
+#   bar chart, anything else is shown as a table only
+# - Results that were fetched whole are reduced in pandas: LTTB for line
+#   charts (keeps peaks and troughs), top-N + "Other" for bar charts
+# - Results too large to fetch are reduced in the warehouse from
+#   RESULT_SCAN(query_id): equal-count buckets for line charts, grouped
+#   top-N + "Other" for bar charts
+# - fetch_result() brings at most max_rows rows of a finished query into pandas
+#
+# Usage:
+#   df, truncated = fetch_result(session, query_id)
+#   spec = chart_spec(df)
+#   data = chart_data(df, spec) if not truncated else warehouse_chart_data(session, query_id, spec)
+#------------------------------------------------------------------------------
+
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+MAX_POINTS = 1500          # points per line chart series
+TOP_N = 20                 # bars before the rest are grouped into "Other"
+MAX_FETCH_ROWS = 50000     # rows brought into the app for the data view
+OTHER_LABEL = "Other"
+
+
+def _is_temporal(series: pd.Series) -> bool:
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return True
+    values = series.dropna()
+    return series.dtype == object and not values.empty and values.map(
+        lambda v: isinstance(v, (date, datetime))).all()
+
+
+def _is_numeric(series: pd.Series) -> bool:
+    if pd.api.types.is_bool_dtype(series):
+        return False
+    if pd.api.types.is_numeric_dtype(series):
+        return True
+    # NUMBER columns with a scale can arrive as Decimal objects
+    return series.dtype == object and not series.dropna().empty and \
+        pd.to_numeric(series.dropna(), errors="coerce").notna().all()
+
+
+def chart_spec(df: pd.DataFrame) -> dict:
+    """{"kind": "line" | "bar" | None, "x": column, "y": [numeric columns]}."""
+    spec = {"kind": None, "x": None, "y": []}
+    if df is None or len(df.index) < 2 or len(df.columns) < 2:
+        return spec
+    temporal = [c for c in df.columns if _is_temporal(df[c])]
+    numeric = [c for c in df.columns if c not in temporal and _is_numeric(df[c])]
+    others = [c for c in df.columns if c not in temporal and c not in numeric]
+    if temporal and numeric:
+        spec.update(kind="line", x=temporal[0], y=numeric)
+    elif others and numeric:
+        spec.update(kind="bar", x=others[0], y=numeric)
+    elif len(numeric) > 1:
+        spec.update(kind="line", x=numeric[0], y=numeric[1:])
+    return spec
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: indices of the threshold points that best keep the shape."""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    every = (n - 2) / (threshold - 2)
+    selected = [0]
+    a = 0
+    for i in range(threshold - 2):
+        avg_start = int(np.floor((i + 1) * every)) + 1
+        avg_end = min(int(np.floor((i + 2) * every)) + 1, n)
+        avg_x, avg_y = x[avg_start:avg_end].mean(), y[avg_start:avg_end].mean()
+        start, end = int(np.floor(i * every)) + 1, int(np.floor((i + 1) * every)) + 1
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected.append(a)
+    selected.append(n - 1)
+    return np.array(selected)
+
+
+def downsample_line(df: pd.DataFrame, x: str, ys: list, max_points: int = MAX_POINTS) -> pd.DataFrame:
+    """Sorted by x and reduced with LTTB per series (union of the kept points)."""
+    data = df[[x] + ys].copy()
+    if not pd.api.types.is_numeric_dtype(data[x]):
+        data[x] = pd.to_datetime(data[x])
+    data[ys] = data[ys].apply(pd.to_numeric, errors="coerce")
+    data = data.dropna(subset=[x]).sort_values(x)
+    if len(data.index) > max_points:
+        xs = data[x].astype("int64").to_numpy(dtype=float) if not pd.api.types.is_numeric_dtype(data[x]) \
+            else data[x].to_numpy(dtype=float)
+        keep = set()
+        for y in ys:
+            keep.update(lttb_indices(xs, data[y].fillna(0).to_numpy(dtype=float), max_points).tolist())
+        data = data.iloc[sorted(keep)]
+    return data.set_index(x)
+
+
+def top_n_other(df: pd.DataFrame, x: str, ys: list, n: int = TOP_N) -> pd.DataFrame:
+    """Sums per category; everything past the top n (by the first measure) becomes "Other"."""
+    data = df[[x] + ys].copy()
+    data[ys] = data[ys].apply(pd.to_numeric, errors="coerce")
+    grouped = data.groupby(data[x].astype(str))[ys].sum().sort_values(ys[0], ascending=False)
+    if len(grouped.index) > n:
+        rest = grouped.iloc[n:].sum().rename(OTHER_LABEL)
+        grouped = pd.concat([grouped.iloc[:n], rest.to_frame().T])
+    grouped.index.name = x
+    return grouped
+
+
+def chart_data(df: pd.DataFrame, spec: dict) -> pd.DataFrame:
+    """Chart-ready frame (indexed by x) for a result that was fetched whole."""
+    if spec["kind"] == "line":
+        return downsample_line(df, spec["x"], spec["y"])
+    if spec["kind"] == "bar":
+        return top_n_other(df, spec["x"], spec["y"])
+    return None
+
+
+def _quote(column: str) -> str:
+    return '"' + str(column).replace('"', '""') + '"'
+
+
+def fetch_result(session, query_id: str, max_rows: int = MAX_FETCH_ROWS) -> tuple:
+    """(first max_rows rows, truncated flag) of a finished query, read from RESULT_SCAN."""
+    df = session.sql("SELECT * FROM TABLE(RESULT_SCAN(?)) LIMIT ?",
+                     params=[query_id, max_rows + 1]).to_pandas()
+    return df.head(max_rows), len(df.index) > max_rows
+
+
+def warehouse_chart_data(session, query_id: str, spec: dict,
+                         max_points: int = MAX_POINTS, top_n: int = TOP_N) -> pd.DataFrame:
+    """Chart-ready frame computed in the warehouse for a result too large to fetch."""
+    if spec["kind"] is None:
+        return None
+    x = _quote(spec["x"])
+    ys = [_quote(y) for y in spec["y"]]
+    if spec["kind"] == "line":
+        # Equal-count buckets along x; each bucket contributes its first x and mean values
+        sql = f"""
+            SELECT MIN({x}) AS {x}, {", ".join(f"AVG({y}) AS {y}" for y in ys)}
+            FROM (
+                SELECT {x}, {", ".join(ys)}, NTILE(?) OVER (ORDER BY {x}) AS BUCKET
+                FROM TABLE(RESULT_SCAN(?))
+                WHERE {x} IS NOT NULL
+            )
+            GROUP BY BUCKET
+            ORDER BY 1
+        """
+        params = [max_points, query_id]
+    else:
+        sql = f"""
+            WITH grouped AS (
+                SELECT TO_VARCHAR({x}) AS CATEGORY, {", ".join(f"SUM({y}) AS {y}" for y in ys)}
+                FROM TABLE(RESULT_SCAN(?))
+                GROUP BY 1
+            ),
+            ranked AS (
+                SELECT *, ROW_NUMBER() OVER (ORDER BY {ys[0]} DESC NULLS LAST) AS RN
+                FROM grouped
+            )
+            SELECT IFF(RN <= ?, CATEGORY, '{OTHER_LABEL}') AS {x}, {", ".join(f"SUM({y}) AS {y}" for y in ys)}
+            FROM ranked
+            GROUP BY 1
+            ORDER BY 2 DESC
+        """
+        params = [query_id, top_n]
+    return session.sql(sql, params=params).to_pandas().set_index(spec["x"])
@@ -0,0 +1,87 @@
+#------------------------------------------------------------------------------
+# ANALYST INTENT
+# Shared question-intent classifier for the Cortex Analyst dashboards and the
+# log collector, so the taxonomy is defined in exactly one place.
+#
+# - A taxonomy is an ordered {label: [keywords]} mapping; the first label
+#   (in order) with a keyword contained in the question wins
+# - to_sql_case() renders the taxonomy as a SQL CASE expression, so keyword
+#   intent is computed in the warehouse (the log collector stores it at ingest)
+# - ai_classify() optionally labels questions with AI_CLASSIFY in batches;
+#   results are cached by (taxonomy, question hash) for the life of the process
+#
+# Usage:
+#   intent_sql = to_sql_case(column="LATEST_QUESTION")
+#   df["INTENT"] = ai_classify(session, df["LATEST_QUESTION"])
+#------------------------------------------------------------------------------
+
+import hashlib
+import json
+import re
+
+import pandas as pd
+
+DEFAULT_TAXONOMY = {
+    "Trend Analysis": ["trend", "over time", "daily", "weekly", "monthly"],
+    "Aggregation": ["average", "sum", "count", "aggregate"],
+    "Comparison": [" vs ", "compare"],
+    "Anomaly Detection": ["anomaly", "unexpected"],
+}
+DEFAULT_LABEL = "Other"
+
+# Questions sent to AI_CLASSIFY per statement
+AI_BATCH_SIZE = 200
+
+_cache = {}
+
+
+def _taxonomy_key(taxonomy: dict, mode: str) -> str:
+    return mode + ":" + hashlib.sha1(json.dumps(taxonomy, sort_keys=False).encode()).hexdigest()
+
+
+def _question_hash(question: str) -> str:
+    return hashlib.sha1(question.encode("utf-8")).hexdigest()
+
+
+def _sql_regex_escape(keyword: str) -> str:
+    """Escape a keyword for a POSIX regex inside a single-quoted SQL string literal."""
+    escaped = re.sub(r"([.^$*+?()\[\]{}|\\])", r"\\\\\1", keyword)
+    return escaped.replace("'", "''")
+
+
+def to_sql_case(taxonomy: dict = None, column: str = "LATEST_QUESTION", default: str = DEFAULT_LABEL) -> str:
+    """Render the taxonomy as a SQL CASE expression with the same first-match semantics."""
+    taxonomy = taxonomy or DEFAULT_TAXONOMY
+    branches = []
+    for label, keywords in taxonomy.items():
+        regex = "|".join(_sql_regex_escape(k.lower()) for k in keywords)
+        branches.append(f"WHEN REGEXP_INSTR(LOWER({column}), '{regex}') > 0 THEN '{label}'")
+    return "CASE\n        " + "\n        ".join(branches) + f"\n        ELSE '{default}'\n    END"
+
+
+def ai_classify(session, questions: pd.Series, taxonomy: dict = None, default: str = DEFAULT_LABEL,
+                batch_size: int = AI_BATCH_SIZE) -> pd.Series:
+    """
+    Classify questions with AI_CLASSIFY, using the taxonomy labels as categories.
+
+    Only distinct questions not classified before are sent, batch_size per
+    statement. Questions the model cannot label fall back to `default`.
+    """
+    taxonomy = taxonomy or DEFAULT_TAXONOMY
+    key = _taxonomy_key(taxonomy, "ai")
+    categories = json.dumps(list(taxonomy) + [default])
+
+    todo = [q for q in questions.dropna().unique() if (key, _question_hash(q)) not in _cache]
+    for start in range(0, len(todo), batch_size):
+        batch = todo[start:start + batch_size]
+        values = ", ".join(["(?)"] * len(batch))
+        rows = session.sql(f"""
+            SELECT column1 AS QUESTION,
+                   AI_CLASSIFY(column1, PARSE_JSON(?)):labels[0]::VARCHAR AS LABEL
+            FROM VALUES {values}
+        """, params=[categories] + batch).collect()
+        for row in rows:
+            _cache[(key, _question_hash(row["QUESTION"]))] = row["LABEL"] or default
+
+    labels = {q: _cache[(key, _question_hash(q))] for q in questions.dropna().unique()}
+    return questions.map(labels).fillna(default)
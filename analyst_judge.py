@@ -0,0 +1,164 @@
+#------------------------------------------------------------------------------
+# ANALYST JUDGE
+# LLM-as-a-judge scoring for Cortex Analyst batch test results (the "LLM as a
+# Judge" pattern from LLM_PROMPT_ENGINEERING_SF.ipynb, applied to a table).
+#
+# - judge() grades every (question, SQL) pair of a results table in one
+#   set-based MERGE: a single AI_COMPLETE statement with a JSON-schema rubric
+# - Judgments are cached in JUDGMENTS_TABLE by (question, SHA2 of the
+#   normalized SQL, judge model); pairs already graded are not sent again, so
+#   re-running a suite only grades new or changed answers
+# - judged_results() returns the rubric columns per (question, SQL) of a
+#   results table
+#
+# The results table is the one saved by batch_cortex_analyst_tester.py
+# (lower-case, quoted column names); pass columns= for other layouts.
+#
+# Usage:
+#   judge(session, "DB.SCHEMA.BATCH_RESULTS", judgments_table="DB.SCHEMA.ANALYST_JUDGMENTS")
+#   df = judged_results(session, "DB.SCHEMA.BATCH_RESULTS", "DB.SCHEMA.ANALYST_JUDGMENTS")
+#------------------------------------------------------------------------------
+
+import pandas as pd
+
+from ai_batch_runner import sql_constant, typed_columns
+from analyst_sql_analysis import NORMALIZED_SQL
+
+JUDGMENTS_TABLE = "ANALYST_JUDGMENTS"
+DEFAULT_JUDGE_MODEL = "claude-4-sonnet"
+
+# Column expressions in the results table
+RESULT_COLUMNS = {
+    "question": '"question"',
+    "interpretation": '"interpretation"',
+    "sql": '"query"',
+    "preview": '"result_preview"',
+}
+
+# Preview text passed to the judge is cut to this many characters
+MAX_PREVIEW_CHARS = 2000
+
+RUBRIC_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "score": {"type": "integer", "description": "1 (wrong) to 5 (fully correct)"},
+        "verdict": {"type": "string", "enum": ["correct", "partially_correct", "incorrect", "no_sql"]},
+        "answers_question": {"type": "boolean"},
+        "issues": {"type": "array", "items": {"type": "string"}},
+        "reasoning": {"type": "string"},
+    },
+    "required": ["score", "verdict", "answers_question", "issues", "reasoning"],
+}
+
+JUDGE_PROMPT = """You are reviewing SQL generated by a text-to-SQL assistant.
+Grade whether the SQL and its result correctly answer the question.
+
+Check, in order:
+1. Does the SQL answer the question that was asked (not a different one)?
+2. Are the filters, time ranges, grouping and aggregations right?
+3. Does the assistant's interpretation match what the SQL does?
+4. Does the result preview look plausible for the question?
+
+If there is no SQL, use verdict "no_sql" and score 1.
+
+<question>{question}</question>
+<interpretation>{interpretation}</interpretation>
+<sql>{sql}</sql>
+<result_preview>{preview}</result_preview>"""
+
+
+def _prompt_sql(columns: dict) -> str:
+    """CONCAT(...) expression filling JUDGE_PROMPT from the results row."""
+    values = {
+        "question": f"COALESCE({columns['question']}, '')",
+        "interpretation": f"COALESCE({columns['interpretation']}, '')",
+        "sql": f"COALESCE({columns['sql']}, '')",
+        "preview": f"LEFT(COALESCE(TO_VARCHAR({columns['preview']}), ''), {MAX_PREVIEW_CHARS})",
+    }
+    parts, rest = [], JUDGE_PROMPT
+    for name in ("question", "interpretation", "sql", "preview"):
+        before, rest = rest.split("{" + name + "}", 1)
+        parts += [sql_constant(before), values[name]]
+    parts.append(sql_constant(rest))
+    return f"CONCAT({', '.join(parts)})"
+
+
+def ensure_table(session, table: str = JUDGMENTS_TABLE) -> None:
+    """Create the judgments cache with one typed column per rubric field."""
+    rubric = "".join(f"\n            {name} {sql_type}," for name, (sql_type, _) in typed_columns(RUBRIC_SCHEMA).items())
+    session.sql(f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            QUESTION VARCHAR,
+            SQL_HASH VARCHAR,           -- SHA2 of the normalized SQL
+            MODEL VARCHAR,{rubric}
+            JUDGMENT VARIANT,
+            JUDGED_AT TIMESTAMP_LTZ
+        )
+    """).collect()
+
+
+def judge(session, results_table: str, model: str = DEFAULT_JUDGE_MODEL,
+          judgments_table: str = JUDGMENTS_TABLE, columns: dict = None) -> int:
+    """
+    Grade every ungraded (question, SQL) pair of results_table in one statement.
+
+    Args:
+        session: Snowpark session.
+        results_table: Saved batch tester results.
+        model: Judge model for AI_COMPLETE.
+        judgments_table: Cache of judgments.
+        columns: Overrides for RESULT_COLUMNS.
+
+    Returns:
+        Number of new judgments.
+    """
+    columns = {**RESULT_COLUMNS, **(columns or {})}
+    ensure_table(session, judgments_table)
+    rubric = typed_columns(RUBRIC_SCHEMA, "s.JUDGMENT")
+    sql_hash = NORMALIZED_SQL.format(column=f"COALESCE({columns['sql']}, '')")
+    result = session.sql(f"""
+        MERGE INTO {judgments_table} t
+        USING (
+            SELECT QUESTION, SQL_HASH,
+                   TRY_PARSE_JSON(TO_VARCHAR(AI_COMPLETE(
+                       model => {sql_constant(model)},
+                       prompt => PROMPT,
+                       model_parameters => {sql_constant({"temperature": 0})},
+                       response_format => {sql_constant({"type": "json", "schema": RUBRIC_SCHEMA})}
+                   ))) AS JUDGMENT
+            FROM (
+                -- One row per distinct (question, SQL); duplicates in the suite are graded once
+                SELECT {columns['question']} AS QUESTION, {sql_hash} AS SQL_HASH, ANY_VALUE({_prompt_sql(columns)}) AS PROMPT
+                FROM {results_table}
+                WHERE {columns['question']} IS NOT NULL
+                GROUP BY 1, 2
+            ) r
+            WHERE NOT EXISTS (
+                SELECT 1 FROM {judgments_table} j
+                WHERE j.QUESTION = r.QUESTION AND j.SQL_HASH = r.SQL_HASH AND j.MODEL = {sql_constant(model)}
+            )
+        ) s
+        ON t.QUESTION = s.QUESTION AND t.SQL_HASH = s.SQL_HASH AND t.MODEL = {sql_constant(model)}
+        WHEN NOT MATCHED AND s.JUDGMENT IS NOT NULL THEN INSERT
+            (QUESTION, SQL_HASH, MODEL, {", ".join(rubric)}, JUDGMENT, JUDGED_AT)
+        VALUES
+            (s.QUESTION, s.SQL_HASH, {sql_constant(model)}, {", ".join(expr for _, expr in rubric.values())},
+             s.JUDGMENT, CURRENT_TIMESTAMP())
+    """).collect()
+    return result[0][0] if result else 0
+
+
+def judged_results(session, results_table: str, judgments_table: str = JUDGMENTS_TABLE,
+                   model: str = DEFAULT_JUDGE_MODEL, columns: dict = None) -> pd.DataFrame:
+    """Rubric columns for each distinct (QUESTION, SQL) pair of results_table."""
+    columns = {name: f"r.{column}" for name, column in {**RESULT_COLUMNS, **(columns or {})}.items()}
+    sql_hash = NORMALIZED_SQL.format(column=f"COALESCE({columns['sql']}, '')")
+    rubric = ", ".join(f"j.{name}" for name in typed_columns(RUBRIC_SCHEMA))
+    return session.sql(f"""
+        SELECT DISTINCT {columns['question']} AS QUESTION, {columns['sql']} AS SQL, {rubric}
+        FROM {results_table} r
+        JOIN {judgments_table} j
+          ON j.QUESTION = {columns['question']}
+         AND j.SQL_HASH = {sql_hash}
+         AND j.MODEL = ?
+    """, params=[model]).to_pandas()
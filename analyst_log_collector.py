@@ -0,0 +1,270 @@
+#------------------------------------------------------------------------------
+# ANALYST LOG COLLECTOR
+# Copies new rows from SNOWFLAKE.LOCAL.CORTEX_ANALYST_REQUESTS into a local,
+# clustered history table so the Analyst dashboards read one small table
+# instead of scanning the log table function on every page load.
+#
+# - Covers every semantic model: all .yaml files on the configured stages plus
+#   every semantic view visible to the role
+# - One watermark per model; each run only reads rows newer than it (minus a
+#   small overlap for late-arriving rows, de-duplicated on REQUEST_ID)
+# - Dashboard columns (text response, intent, complexity score, tables,
+#   warnings flag) are derived here in SQL at load time, so dashboards select
+#   typed columns instead of parsing JSON per row on every page load
+# - Generated SQL is then parsed once per distinct statement
+#   (analyst_sql_analysis.py) and its features stored in SQL_FEATURES; the
+#   parsed complexity score replaces the SQL keyword-count estimate
+#
+# Deploy as a stored procedure + task (run in the schema that should hold the
+# history table, after uploading this file to a stage):
+#
+#   CREATE OR REPLACE PROCEDURE COLLECT_ANALYST_LOGS(MODEL_STAGES ARRAY)
+#     RETURNS VARCHAR
+#     LANGUAGE PYTHON
+#     RUNTIME_VERSION = '3.11'
+#     PACKAGES = ('snowflake-snowpark-python', 'pandas', 'sqlglot')
+#     IMPORTS = ('@<CODE_STAGE>/analyst_log_collector.py', '@<CODE_STAGE>/analyst_intent.py',
+#                '@<CODE_STAGE>/analyst_sql_analysis.py')
+#     HANDLER = 'analyst_log_collector.collect';
+#
+#   CREATE OR REPLACE TASK COLLECT_ANALYST_LOGS_TASK
+#     WAREHOUSE = <WAREHOUSE>
+#     SCHEDULE = '60 MINUTE'
+#   AS
+#     CALL COLLECT_ANALYST_LOGS(['CORTEX_ANALYST_DEMO.REVENUE_TIMESERIES.RAW_DATA']);
+#
+#   ALTER TASK COLLECT_ANALYST_LOGS_TASK RESUME;
+#------------------------------------------------------------------------------
+
+import json
+
+from analyst_intent import to_sql_case
+from analyst_sql_analysis import analyze_sql
+
+HISTORY_TABLE = "ANALYST_REQUESTS_HISTORY"
+WATERMARK_TABLE = "ANALYST_LOG_WATERMARKS"
+
+# Re-read this much history before the watermark to pick up late-arriving rows
+OVERLAP_MINUTES = 60
+
+# Distinct generated statements parsed per collector run
+SQL_ANALYSIS_BATCH = 5000
+
+# Intent classification shared with the dashboards (analyst_intent.py)
+INTENT_SQL = to_sql_case()
+
+# Typed columns derived from each log row at load time
+ENRICHED_COLUMNS = {
+    "TEXT_RESPONSE": "VARCHAR",
+    "INTENT": "VARCHAR",
+    "COMPLEXITY_SCORE": "NUMBER",
+    "TABLE_LIST": "VARCHAR",       # comma-separated TABLES_REFERENCED
+    "TABLE_COUNT": "NUMBER",
+    "HAS_WARNINGS": "BOOLEAN",
+}
+
+
+def enrichment_expressions() -> dict:
+    """
+    SQL expression for each ENRICHED_COLUMNS entry.
+
+    The expressions work on both the CORTEX_ANALYST_REQUESTS table function
+    and the history table. TABLES_REFERENCED is semi-structured in both
+    (ARRAY / VARIANT), so it is used as an array directly.
+    """
+    tables = "TO_ARRAY(TABLES_REFERENCED)"
+    sql = "UPPER(GENERATED_SQL)"
+    return {
+        # First text item of the Analyst response
+        "TEXT_RESPONSE": "GET(FILTER(TRY_PARSE_JSON(TO_VARCHAR(RESPONSE_BODY)):message:content, "
+                         "c -> c:text IS NOT NULL), 0):text::VARCHAR",
+        "INTENT": INTENT_SQL,
+        # Keyword-count estimate, replaced by the parsed score in analyze_new_sql()
+        "COMPLEXITY_SCORE": f"COALESCE(REGEXP_COUNT({sql}, 'SELECT') + REGEXP_COUNT({sql}, 'JOIN') "
+                            f"+ REGEXP_COUNT({sql}, 'WITH'), 0)",
+        "TABLE_LIST": f"ARRAY_TO_STRING({tables}, ',')",
+        "TABLE_COUNT": f"COALESCE(ARRAY_SIZE({tables}), 0)",
+        "HAS_WARNINGS": "COALESCE(ARRAY_SIZE(TRY_PARSE_JSON(TO_VARCHAR(WARNINGS))) > 0, FALSE)",
+    }
+
+
+def enrichment_sql() -> str:
+    """The enriched columns as a SELECT-list fragment ('<expr> AS <column>, ...')."""
+    return ",\n    ".join(f"{expr} AS {name}" for name, expr in enrichment_expressions().items())
+
+
+def ensure_tables(session) -> None:
+    """Create the history and watermark tables if they do not exist."""
+    session.sql(f"""
+        CREATE TABLE IF NOT EXISTS {HISTORY_TABLE} (
+            MODEL_SOURCE VARCHAR,          -- 'FILE_ON_STAGE' or 'SEMANTIC_VIEW' source it was read from
+            MODEL_PATH VARCHAR,            -- stage path or semantic view name
+            TIMESTAMP TIMESTAMP_LTZ,
+            REQUEST_ID VARCHAR,
+            SEMANTIC_MODEL_NAME VARCHAR,
+            USER_NAME VARCHAR,
+            LATEST_QUESTION VARCHAR,
+            GENERATED_SQL VARCHAR,
+            RESPONSE_STATUS_CODE NUMBER,
+            TABLES_REFERENCED VARIANT,
+            WARNINGS VARIANT,
+            FEEDBACK VARIANT,
+            RESPONSE_BODY VARIANT,
+            LOADED_AT TIMESTAMP_LTZ
+        )
+        CLUSTER BY (TO_DATE(TIMESTAMP), SEMANTIC_MODEL_NAME)
+    """).collect()
+    # Tables created before the enriched columns existed
+    for name, sql_type in ENRICHED_COLUMNS.items():
+        session.sql(f"ALTER TABLE {HISTORY_TABLE} ADD COLUMN IF NOT EXISTS {name} {sql_type}").collect()
+    session.sql(f"ALTER TABLE {HISTORY_TABLE} ADD COLUMN IF NOT EXISTS SQL_FEATURES VARIANT").collect()
+    session.sql(f"""
+        CREATE TABLE IF NOT EXISTS {WATERMARK_TABLE} (
+            MODEL_SOURCE VARCHAR,
+            MODEL_PATH VARCHAR,
+            LAST_TIMESTAMP TIMESTAMP_LTZ,
+            REFRESHED_AT TIMESTAMP_LTZ
+        )
+    """).collect()
+
+
+def discover_models(session, model_stages: list) -> list:
+    """Return [(source_type, path)] for every semantic model to collect."""
+    models = []
+    for stage in model_stages or []:
+        stage = stage.lstrip("@")
+        for row in session.sql(f"LIST @{stage}").collect():
+            name = row["name"]
+            if name.endswith((".yaml", ".yml")):
+                # LIST returns '<stage name>/<path>' - rebuild a fully-qualified path
+                models.append(("FILE_ON_STAGE", f"@{stage}/{name.split('/', 1)[1]}"))
+    try:
+        for row in session.sql("SHOW SEMANTIC VIEWS IN ACCOUNT").collect():
+            models.append(("SEMANTIC_VIEW", f"{row['database_name']}.{row['schema_name']}.{row['name']}"))
+    except Exception:
+        # Semantic views are not available to this role/account
+        pass
+    return models
+
+
+def collect_model(session, source_type: str, path: str) -> int:
+    """Merge rows newer than the model's watermark into the history table."""
+    watermark = session.sql(
+        f"SELECT MAX(LAST_TIMESTAMP) FROM {WATERMARK_TABLE} WHERE MODEL_SOURCE = ? AND MODEL_PATH = ?",
+        params=[source_type, path],
+    ).collect()[0][0]
+
+    since = (
+        f"DATEADD(minute, -{OVERLAP_MINUTES}, ?::TIMESTAMP_LTZ)" if watermark is not None
+        else "'1970-01-01'::TIMESTAMP_LTZ"
+    )
+    params = [source_type, path, source_type, path]
+    if watermark is not None:
+        params += [watermark, watermark]
+
+    result = session.sql(f"""
+        MERGE INTO {HISTORY_TABLE} h
+        USING (
+            SELECT ? AS MODEL_SOURCE,
+                   ? AS MODEL_PATH,
+                   TIMESTAMP,
+                   REQUEST_ID,
+                   SEMANTIC_MODEL_NAME,
+                   USER_NAME,
+                   LATEST_QUESTION,
+                   GENERATED_SQL,
+                   RESPONSE_STATUS_CODE,
+                   TO_VARIANT(TABLES_REFERENCED) AS TABLES_REFERENCED,
+                   TRY_PARSE_JSON(TO_VARCHAR(WARNINGS)) AS WARNINGS,
+                   TRY_PARSE_JSON(TO_VARCHAR(FEEDBACK)) AS FEEDBACK,
+                   TRY_PARSE_JSON(TO_VARCHAR(RESPONSE_BODY)) AS RESPONSE_BODY,
+                   {enrichment_sql()}
+            FROM TABLE(SNOWFLAKE.LOCAL.CORTEX_ANALYST_REQUESTS(?, ?))
+            WHERE TIMESTAMP >= {since}
+        ) s
+        ON h.REQUEST_ID = s.REQUEST_ID
+           AND h.TIMESTAMP >= {since}
+        WHEN NOT MATCHED THEN INSERT (
+            MODEL_SOURCE, MODEL_PATH, TIMESTAMP, REQUEST_ID, SEMANTIC_MODEL_NAME, USER_NAME,
+            LATEST_QUESTION, GENERATED_SQL, RESPONSE_STATUS_CODE, TABLES_REFERENCED,
+            WARNINGS, FEEDBACK, RESPONSE_BODY, LOADED_AT,
+            {", ".join(ENRICHED_COLUMNS)}
+        ) VALUES (
+            s.MODEL_SOURCE, s.MODEL_PATH, s.TIMESTAMP, s.REQUEST_ID, s.SEMANTIC_MODEL_NAME, s.USER_NAME,
+            s.LATEST_QUESTION, s.GENERATED_SQL, s.RESPONSE_STATUS_CODE, s.TABLES_REFERENCED,
+            s.WARNINGS, s.FEEDBACK, s.RESPONSE_BODY, CURRENT_TIMESTAMP(),
+            {", ".join("s." + name for name in ENRICHED_COLUMNS)}
+        )
+    """, params=params).collect()
+    inserted = result[0][0] if result else 0
+
+    session.sql(f"""
+        MERGE INTO {WATERMARK_TABLE} w
+        USING (
+            SELECT ? AS MODEL_SOURCE, ? AS MODEL_PATH, MAX(TIMESTAMP) AS LAST_TIMESTAMP
+            FROM {HISTORY_TABLE}
+            WHERE MODEL_SOURCE = ? AND MODEL_PATH = ?
+        ) s
+        ON w.MODEL_SOURCE = s.MODEL_SOURCE AND w.MODEL_PATH = s.MODEL_PATH
+        WHEN MATCHED THEN UPDATE SET LAST_TIMESTAMP = s.LAST_TIMESTAMP, REFRESHED_AT = CURRENT_TIMESTAMP()
+        WHEN NOT MATCHED AND s.LAST_TIMESTAMP IS NOT NULL THEN
+            INSERT (MODEL_SOURCE, MODEL_PATH, LAST_TIMESTAMP, REFRESHED_AT)
+            VALUES (s.MODEL_SOURCE, s.MODEL_PATH, s.LAST_TIMESTAMP, CURRENT_TIMESTAMP())
+    """, params=[source_type, path, source_type, path]).collect()
+    return inserted
+
+
+def backfill_enrichment(session) -> None:
+    """Derive the enriched columns for rows loaded before they existed."""
+    assignments = ",\n    ".join(f"{name} = {expr}" for name, expr in enrichment_expressions().items())
+    session.sql(f"UPDATE {HISTORY_TABLE} SET {assignments} WHERE INTENT IS NULL").collect()
+
+
+def analyze_new_sql(session, batch_size: int = SQL_ANALYSIS_BATCH) -> int:
+    """Parse generated SQL without SQL_FEATURES and store its features and complexity score."""
+    rows = session.sql(f"""
+        SELECT DISTINCT GENERATED_SQL
+        FROM {HISTORY_TABLE}
+        WHERE GENERATED_SQL IS NOT NULL AND SQL_FEATURES IS NULL
+        LIMIT {int(batch_size)}
+    """).collect()
+    if not rows:
+        return 0
+
+    records = []
+    for row in rows:
+        features = analyze_sql(row["GENERATED_SQL"])
+        records.append((row["GENERATED_SQL"], json.dumps(features), features["complexity_score"]))
+    session.create_dataframe(
+        records, schema=["GENERATED_SQL", "FEATURES", "COMPLEXITY_SCORE"]
+    ).write.save_as_table("ANALYST_SQL_FEATURES_BATCH", mode="overwrite", table_type="temporary")
+
+    session.sql(f"""
+        UPDATE {HISTORY_TABLE} h
+        SET SQL_FEATURES = PARSE_JSON(s.FEATURES),
+            COMPLEXITY_SCORE = s.COMPLEXITY_SCORE
+        FROM ANALYST_SQL_FEATURES_BATCH s
+        WHERE h.GENERATED_SQL = s.GENERATED_SQL
+          AND h.SQL_FEATURES IS NULL
+    """).collect()
+    return len(records)
+
+
+def collect(session, model_stages: list = None) -> str:
+    """Stored procedure handler: refresh the history table for every semantic model."""
+    ensure_tables(session)
+    backfill_enrichment(session)
+    total, failed = 0, []
+    models = discover_models(session, model_stages)
+    for source_type, path in models:
+        try:
+            total += collect_model(session, source_type, path)
+        except Exception as exc:
+            failed.append(f"{path}: {exc}")
+    analyzed = analyze_new_sql(session)
+
+    summary = (f"Collected {total} new request(s) from {len(models) - len(failed)} model(s); "
+               f"analyzed {analyzed} new statement(s)")
+    if failed:
+        summary += f"; {len(failed)} failed - " + "; ".join(failed)[:2000]
+    return summary
@@ -0,0 +1,151 @@
+#------------------------------------------------------------------------------
+# ANALYST QUERY COSTS
+# Measured cost and latency per Cortex Analyst question, instead of a flat
+# credits-per-1000-messages estimate.
+#
+# - The chat and batch apps record every (request_id, query_id) pair, with the
+#   Analyst round-trip time, in ANALYST_QUERY_MAP
+# - request_costs() joins the pairs with ACCOUNT_USAGE:
+#     QUERY_HISTORY              - elapsed / queued time, bytes scanned, warehouse
+#     QUERY_ATTRIBUTION_HISTORY  - warehouse credits attributed to the query
+#     CORTEX_ANALYST_USAGE_HISTORY - Analyst credits (hourly, per user, split
+#                                    evenly over that hour's requests)
+# - slowest_questions() / most_expensive_sql() rank the result
+#
+# ACCOUNT_USAGE views lag by up to a few hours; recent questions show NULL
+# costs until they catch up.
+#------------------------------------------------------------------------------
+
+from datetime import date, timedelta
+
+import pandas as pd
+
+QUERY_MAP_TABLE = "ANALYST_QUERY_MAP"
+
+_ensured = set()
+
+
+def ensure_table(session, table: str = QUERY_MAP_TABLE) -> None:
+    """Create the (request_id, query_id) table once per process."""
+    if table in _ensured:
+        return
+    session.sql(f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            REQUEST_ID VARCHAR,
+            QUERY_ID VARCHAR,
+            SOURCE_APP VARCHAR,
+            SEMANTIC_MODEL VARCHAR,
+            QUESTION VARCHAR,
+            ANALYST_MS NUMBER,          -- Analyst API round trip measured by the app
+            RECORDED_AT TIMESTAMP_LTZ
+        )
+    """).collect()
+    _ensured.add(table)
+
+
+def record_query(session, request_id: str, query_id: str, source_app: str,
+                 semantic_model: str = None, question: str = None, analyst_ms: float = None,
+                 table: str = QUERY_MAP_TABLE) -> None:
+    """Persist one (request_id, query_id) pair."""
+    ensure_table(session, table)
+    session.sql(f"""
+        INSERT INTO {table} (REQUEST_ID, QUERY_ID, SOURCE_APP, SEMANTIC_MODEL, QUESTION, ANALYST_MS, RECORDED_AT)
+        SELECT ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP()
+    """, params=[request_id, query_id, source_app, semantic_model, question,
+                 None if analyst_ms is None else round(analyst_ms)]).collect()
+
+
+def request_costs(session, table: str = QUERY_MAP_TABLE, start_date=None, end_date=None,
+                  requests: tuple = None) -> pd.DataFrame:
+    """
+    One row per recorded (request_id, query_id) with measured latency and credits.
+
+    Args:
+        session: Snowpark session.
+        table: (request_id, query_id) table written by record_query().
+        start_date: First day of RECORDED_AT to include (default: 30 days ago).
+        end_date: Last day of RECORDED_AT to include (default: today).
+        requests: Optional (sql, params) subquery returning the REQUEST_IDs to
+            keep, e.g. the dashboard's user / model filters on the request log.
+    """
+    end_date = end_date or date.today()
+    start_date = start_date or end_date - timedelta(days=30)
+    keep = f"AND REQUEST_ID IN ({requests[0]})" if requests else ""
+    return session.sql(f"""
+        WITH pairs AS (
+            SELECT *
+            FROM {table}
+            WHERE TO_DATE(RECORDED_AT) BETWEEN ? AND ?
+              {keep}
+        ),
+        queries AS (
+            SELECT QUERY_ID, QUERY_TEXT, USER_NAME, WAREHOUSE_NAME, WAREHOUSE_SIZE,
+                   TOTAL_ELAPSED_TIME, QUEUED_OVERLOAD_TIME + QUEUED_PROVISIONING_TIME AS QUEUED_TIME,
+                   BYTES_SCANNED, ROWS_PRODUCED
+            FROM SNOWFLAKE.ACCOUNT_USAGE.QUERY_HISTORY
+            WHERE START_TIME >= DATEADD(day, -1, ?::DATE) AND START_TIME < DATEADD(day, 1, ?::DATE)
+              AND QUERY_ID IN (SELECT QUERY_ID FROM pairs)
+        ),
+        attribution AS (
+            SELECT QUERY_ID, CREDITS_ATTRIBUTED_COMPUTE
+            FROM SNOWFLAKE.ACCOUNT_USAGE.QUERY_ATTRIBUTION_HISTORY
+            WHERE START_TIME >= DATEADD(day, -1, ?::DATE) AND START_TIME < DATEADD(day, 1, ?::DATE)
+              AND QUERY_ID IN (SELECT QUERY_ID FROM pairs)
+        ),
+        analyst AS (
+            SELECT START_TIME, END_TIME, USERNAME, CREDITS / NULLIF(REQUEST_COUNT, 0) AS CREDITS_PER_REQUEST
+            FROM SNOWFLAKE.ACCOUNT_USAGE.CORTEX_ANALYST_USAGE_HISTORY
+            WHERE START_TIME >= DATEADD(day, -1, ?::DATE) AND START_TIME < DATEADD(day, 1, ?::DATE)
+        )
+        SELECT p.RECORDED_AT,
+               p.REQUEST_ID,
+               p.QUERY_ID,
+               p.SOURCE_APP,
+               p.SEMANTIC_MODEL,
+               p.QUESTION,
+               q.QUERY_TEXT,
+               q.USER_NAME,
+               q.WAREHOUSE_NAME,
+               q.WAREHOUSE_SIZE,
+               p.ANALYST_MS,
+               q.TOTAL_ELAPSED_TIME AS SQL_ELAPSED_MS,
+               q.QUEUED_TIME AS SQL_QUEUED_MS,
+               COALESCE(p.ANALYST_MS, 0) + COALESCE(q.TOTAL_ELAPSED_TIME, 0) AS END_TO_END_MS,
+               q.BYTES_SCANNED,
+               q.ROWS_PRODUCED,
+               a.CREDITS_ATTRIBUTED_COMPUTE AS SQL_CREDITS,
+               u.CREDITS_PER_REQUEST AS ANALYST_CREDITS,
+               COALESCE(a.CREDITS_ATTRIBUTED_COMPUTE, 0) + COALESCE(u.CREDITS_PER_REQUEST, 0) AS TOTAL_CREDITS
+        FROM pairs p
+        LEFT JOIN queries q ON q.QUERY_ID = p.QUERY_ID
+        LEFT JOIN attribution a ON a.QUERY_ID = p.QUERY_ID
+        LEFT JOIN analyst u
+               ON u.USERNAME = q.USER_NAME
+              AND p.RECORDED_AT >= u.START_TIME
+              AND p.RECORDED_AT < u.END_TIME
+        ORDER BY p.RECORDED_AT DESC
+    """, params=[start_date, end_date] + (list(requests[1]) if requests else [])
+                 + [start_date, end_date] * 3).to_pandas()
+
+
+def slowest_questions(costs: pd.DataFrame, n: int = 10) -> pd.DataFrame:
+    """Questions with the longest Analyst + SQL time."""
+    columns = ["QUESTION", "SEMANTIC_MODEL", "ANALYST_MS", "SQL_ELAPSED_MS", "SQL_QUEUED_MS",
+               "END_TO_END_MS", "WAREHOUSE_NAME", "REQUEST_ID", "QUERY_ID"]
+    return costs.nlargest(n, "END_TO_END_MS")[columns]
+
+
+def most_expensive_sql(costs: pd.DataFrame, n: int = 10) -> pd.DataFrame:
+    """Generated statements ranked by total credits across all their executions."""
+    if costs.empty:
+        return costs
+    return (
+        costs.dropna(subset=["QUERY_TEXT"])
+        .groupby("QUERY_TEXT", as_index=False)
+        .agg(executions=("QUERY_ID", "count"),
+             total_credits=("TOTAL_CREDITS", "sum"),
+             sql_credits=("SQL_CREDITS", "sum"),
+             median_elapsed_ms=("SQL_ELAPSED_MS", "median"),
+             bytes_scanned=("BYTES_SCANNED", "sum"))
+        .nlargest(n, "total_credits")
+    )
@@ -0,0 +1,267 @@
+#------------------------------------------------------------------------------
+# ANALYST SQL ANALYSIS
+# Structural features of Cortex Analyst generated SQL, replacing the
+# SELECT/JOIN/WITH substring counts used as a complexity score.
+#
+# - analyze_sql() parses a statement once with sqlglot (Snowflake dialect) and
+#   returns join count, CTE count and dependency depth, subquery nesting,
+#   aggregate and window function counts and the referenced tables
+# - Without sqlglot (or for SQL it cannot parse) a tokenizer-based fallback
+#   strips comments and string literals first, so identifiers like
+#   SELECTED_REGION or text in comments do not inflate the score
+# - Results are cached by SQL hash for the life of the process
+# - query_shapes() joins the features with ACCOUNT_USAGE.QUERY_HISTORY (matched
+#   on a hash of the normalized query text) to show which query shapes are slow
+#
+# Usage:
+#   from analyst_sql_analysis import analyze
+#   features = analyze(df["GENERATED_SQL"])
+#------------------------------------------------------------------------------
+
+import hashlib
+import re
+
+import pandas as pd
+
+try:
+    import sqlglot
+    from sqlglot import exp
+except ImportError:
+    sqlglot = None
+
+FEATURE_COLUMNS = ["joins", "ctes", "cte_depth", "subquery_depth", "aggregates", "windows",
+                   "tables", "complexity_score", "parsed"]
+
+AGGREGATE_FUNCTIONS = (
+    "SUM", "AVG", "COUNT", "MIN", "MAX", "MEDIAN", "STDDEV", "VARIANCE", "ANY_VALUE",
+    "LISTAGG", "ARRAY_AGG", "OBJECT_AGG", "APPROX_COUNT_DISTINCT", "COUNT_IF", "PERCENTILE_CONT",
+)
+
+_cache = {}
+
+
+def _sql_hash(sql: str) -> str:
+    return hashlib.sha1(sql.encode("utf-8")).hexdigest()
+
+
+def complexity_score(features: dict) -> int:
+    """Weighted score: nesting and CTE chains cost more than flat joins."""
+    return (
+        1
+        + features["joins"]
+        + features["ctes"]
+        + features["cte_depth"]
+        + 2 * features["subquery_depth"]
+        + features["windows"]
+        + (1 if features["aggregates"] else 0)
+    )
+
+
+def _analyze_parsed(sql: str) -> dict:
+    tree = sqlglot.parse_one(sql, read="snowflake")
+
+    ctes = {cte.alias_or_name.upper(): cte for cte in tree.find_all(exp.CTE)}
+
+    def cte_depth(name, seen=()):
+        refs = {t.name.upper() for t in ctes[name].this.find_all(exp.Table)} & set(ctes)
+        refs -= set(seen) | {name}
+        return 1 + max((cte_depth(r, seen + (name,)) for r in refs), default=0)
+
+    def nesting(select):
+        depth, node = 0, select.parent
+        while node is not None and not isinstance(node, exp.CTE):
+            if isinstance(node, exp.Select):
+                depth += 1
+            node = node.parent
+        return depth
+
+    tables = sorted({
+        ".".join(part for part in (t.catalog, t.db, t.name) if part).upper()
+        for t in tree.find_all(exp.Table)
+        if t.name and t.name.upper() not in ctes
+    })
+    aggregates = [a for a in tree.find_all(exp.AggFunc) if not isinstance(a.parent, exp.Window)]
+    return {
+        "joins": len(list(tree.find_all(exp.Join))),
+        "ctes": len(ctes),
+        "cte_depth": max((cte_depth(name) for name in ctes), default=0),
+        "subquery_depth": max((nesting(s) for s in tree.find_all(exp.Select)), default=0),
+        "aggregates": len(aggregates),
+        "windows": len(list(tree.find_all(exp.Window))),
+        "tables": tables,
+        "parsed": True,
+    }
+
+
+# Comments, string literals and quoted identifiers are blanked before matching
+_NOISE = re.compile(r"--[^\n]*|/\*.*?\*/|'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"", re.S)
+_TOKEN = re.compile(r"\(|\)|[A-Za-z_][\w$]*(?:\.[A-Za-z_][\w$]*)*")
+
+
+def _analyze_tokens(sql: str) -> dict:
+    tokens = _TOKEN.findall(_NOISE.sub(" ", sql).upper())
+
+    cte_names = set()
+    if tokens and tokens[0] == "WITH":
+        # WITH a AS (...), b AS (...): names are the identifiers before 'AS ('
+        for i in range(len(tokens) - 2):
+            if tokens[i + 1] == "AS" and tokens[i + 2] == "(":
+                cte_names.add(tokens[i])
+
+    # Open parentheses: the CTE name for one opening a CTE body (nesting restarts
+    # there), None otherwise
+    parens = []
+    depends = {name: set() for name in cte_names}
+    subquery_depth = joins = aggregates = windows = 0
+    tables = set()
+    for i, token in enumerate(tokens):
+        nxt = tokens[i + 1] if i + 1 < len(tokens) else ""
+        if token == "(":
+            opens_cte = i >= 2 and tokens[i - 1] == "AS" and tokens[i - 2] in cte_names
+            parens.append(tokens[i - 2] if opens_cte else None)
+        elif token == ")":
+            if parens:
+                parens.pop()
+        elif token == "SELECT":
+            # Subquery nesting counts the parentheses opened since the innermost CTE body
+            inner = 0
+            for name in reversed(parens):
+                if name is not None:
+                    break
+                inner += 1
+            subquery_depth = max(subquery_depth, inner)
+        elif token == "JOIN":
+            joins += 1
+        elif token == "OVER" and nxt == "(":
+            windows += 1
+        elif token in AGGREGATE_FUNCTIONS and nxt == "(" and not _followed_by_over(tokens, i + 1):
+            aggregates += 1
+        if token in ("FROM", "JOIN") and nxt not in ("(", ""):
+            if nxt not in cte_names:
+                tables.add(nxt)
+            else:
+                body = next((name for name in reversed(parens) if name is not None), None)
+                if body is not None and body != nxt:
+                    depends[body].add(nxt)
+
+    def cte_depth(name, seen=()):
+        refs = depends[name] - set(seen) - {name}
+        return 1 + max((cte_depth(r, seen + (name,)) for r in refs), default=0)
+
+    return {
+        "joins": joins,
+        "ctes": len(cte_names),
+        "cte_depth": max((cte_depth(name) for name in cte_names), default=0),
+        "subquery_depth": subquery_depth,
+        "aggregates": aggregates,
+        "windows": windows,
+        "tables": sorted(tables),
+        "parsed": False,
+    }
+
+
+def _followed_by_over(tokens: list, open_index: int) -> bool:
+    """True if the parenthesis at open_index closes right before OVER (a window call)."""
+    depth = 0
+    for j in range(open_index, len(tokens)):
+        if tokens[j] == "(":
+            depth += 1
+        elif tokens[j] == ")":
+            depth -= 1
+            if depth == 0:
+                return j + 1 < len(tokens) and tokens[j + 1] == "OVER"
+    return False
+
+
+def analyze_sql(sql) -> dict:
+    """Features of one statement (see FEATURE_COLUMNS); None for empty SQL."""
+    if not isinstance(sql, str) or not sql.strip():
+        return None
+    key = _sql_hash(sql)
+    if key not in _cache:
+        features = None
+        if sqlglot is not None:
+            try:
+                features = _analyze_parsed(sql)
+            except Exception:
+                features = None
+        if features is None:
+            features = _analyze_tokens(sql)
+        features["complexity_score"] = complexity_score(features)
+        _cache[key] = features
+    return _cache[key]
+
+
+def analyze(sqls: pd.Series) -> pd.DataFrame:
+    """Features for a Series of SQL statements, indexed like the input."""
+    features = {sql: analyze_sql(sql) for sql in sqls.dropna().unique()}
+    rows = [features.get(sql) if isinstance(sql, str) else None for sql in sqls]
+    empty = dict.fromkeys(FEATURE_COLUMNS)
+    return pd.DataFrame([r or empty for r in rows], index=sqls.index, columns=FEATURE_COLUMNS)
+
+
+# Normalized query text used to match generated SQL with executed queries
+NORMALIZED_SQL = "SHA2(UPPER(TRIM(RTRIM(TRIM({column}), ';'))))"
+
+
+def query_elapsed(session, history_table: str, days: int = 30) -> pd.DataFrame:
+    """
+    Execution stats of each generated statement from ACCOUNT_USAGE.QUERY_HISTORY.
+
+    Executed queries are matched to Analyst requests on a hash of the trimmed,
+    upper-cased query text. ACCOUNT_USAGE lags by up to 45 minutes.
+    """
+    return session.sql(f"""
+        WITH generated AS (
+            SELECT {NORMALIZED_SQL.format(column="GENERATED_SQL")} AS SQL_HASH,
+                   ANY_VALUE(GENERATED_SQL) AS GENERATED_SQL,
+                   COUNT(*) AS REQUESTS
+            FROM {history_table}
+            WHERE GENERATED_SQL IS NOT NULL
+              AND TIMESTAMP >= DATEADD(day, -?, CURRENT_TIMESTAMP())
+            GROUP BY 1
+        ),
+        executed AS (
+            SELECT {NORMALIZED_SQL.format(column="QUERY_TEXT")} AS SQL_HASH,
+                   WAREHOUSE_NAME,
+                   TOTAL_ELAPSED_TIME,
+                   BYTES_SCANNED
+            FROM SNOWFLAKE.ACCOUNT_USAGE.QUERY_HISTORY
+            WHERE START_TIME >= DATEADD(day, -?, CURRENT_TIMESTAMP())
+              AND QUERY_TYPE = 'SELECT'
+              AND EXECUTION_STATUS = 'SUCCESS'
+        )
+        SELECT g.GENERATED_SQL,
+               g.REQUESTS,
+               COUNT(*) AS EXECUTIONS,
+               ANY_VALUE(e.WAREHOUSE_NAME) AS WAREHOUSE_NAME,
+               MEDIAN(e.TOTAL_ELAPSED_TIME) / 1000 AS MEDIAN_ELAPSED_S,
+               MAX(e.TOTAL_ELAPSED_TIME) / 1000 AS MAX_ELAPSED_S,
+               AVG(e.BYTES_SCANNED) AS AVG_BYTES_SCANNED
+        FROM generated g
+        JOIN executed e ON e.SQL_HASH = g.SQL_HASH
+        GROUP BY g.GENERATED_SQL, g.REQUESTS
+    """, params=[days, days]).to_pandas()
+
+
+def query_shapes(session, history_table: str, days: int = 30) -> pd.DataFrame:
+    """
+    Median elapsed time per query shape (joins, CTEs, nesting, windows).
+
+    Combines query_elapsed() with the parsed features, most expensive first.
+    """
+    stats = query_elapsed(session, history_table, days)
+    if stats.empty:
+        return stats
+    stats = stats.join(analyze(stats["GENERATED_SQL"]))
+    shape = ["joins", "ctes", "subquery_depth", "windows"]
+    return (
+        stats.groupby(shape)
+        .agg(statements=("GENERATED_SQL", "count"),
+             executions=("EXECUTIONS", "sum"),
+             median_elapsed_s=("MEDIAN_ELAPSED_S", "median"),
+             max_elapsed_s=("MAX_ELAPSED_S", "max"),
+             avg_bytes_scanned=("AVG_BYTES_SCANNED", "mean"))
+        .reset_index()
+        .sort_values("median_elapsed_s", ascending=False)
+    )
@@ -0,0 +1,112 @@
+#------------------------------------------------------------------------------
+# APP WORKLOADS
+# Warehouse routing and QUERY_TAG for SQL issued by the Streamlit apps, so
+# interactive chat, batch regression runs and dashboards do not queue behind
+# each other and can be told apart in QUERY_HISTORY.
+#
+# - WORKLOAD_WAREHOUSES maps each workload class to a warehouse (None keeps
+#   the session's current warehouse)
+# - use_workload() sets the warehouse and QUERY_TAG for the rest of the
+#   session (call it once at the top of an app)
+# - workload() does the same for a block (e.g. one Analyst request or one
+#   batch question) and restores the previous settings afterwards
+# - queue_report() summarizes queueing per workload class from QUERY_HISTORY
+#
+# QUERY_TAG is compact JSON: {"app": ..., "workload": ..., "run_id": ...,
+# "request_id": ...}; keys without a value are omitted.
+#
+# Usage:
+#   use_workload(session, "dashboard", app="sis_analyst_dash")
+#   with workload(session, "interactive", app="streamlit_cortex_analyst", request_id=req_id):
+#       df = session.sql(sql).to_pandas()
+#------------------------------------------------------------------------------
+
+import json
+from contextlib import contextmanager
+
+import pandas as pd
+
+WORKLOAD_WAREHOUSES = {
+    "interactive": None,   # chat apps: Analyst SQL, catalog calls, search doc list
+    "batch": None,         # batch_cortex_analyst_tester regression runs
+    "dashboard": None,     # monitoring and cost dashboards
+}
+
+# (query_tag, warehouse) last applied per session, to skip redundant ALTERs on reruns
+_applied = {}
+
+
+def query_tag(app: str, workload_class: str, run_id: str = None, request_id: str = None) -> str:
+    """QUERY_TAG value for one app / workload / run / Analyst request."""
+    tag = {"app": app, "workload": workload_class, "run_id": run_id, "request_id": request_id}
+    return json.dumps({k: v for k, v in tag.items() if v}, separators=(",", ":"))
+
+
+def _apply(session, tag: str, warehouse: str = None) -> None:
+    current_tag, current_warehouse = _applied.get(id(session), (None, None))
+    if tag != current_tag:
+        session.query_tag = tag
+    if warehouse and warehouse != current_warehouse:
+        session.use_warehouse(warehouse)
+    else:
+        warehouse = current_warehouse
+    _applied[id(session)] = (tag, warehouse)
+
+
+def use_workload(session, workload_class: str, app: str, run_id: str = None,
+                 request_id: str = None, warehouse: str = None) -> None:
+    """
+    Route the session to a workload class and tag its queries.
+
+    Args:
+        session: Snowpark session.
+        workload_class: Key of WORKLOAD_WAREHOUSES.
+        app: Name of the calling app, recorded in QUERY_TAG.
+        run_id: Optional batch run / chat session id.
+        request_id: Optional Cortex Analyst request id.
+        warehouse: Overrides the class warehouse (e.g. a guardrail route).
+    """
+    if workload_class not in WORKLOAD_WAREHOUSES:
+        raise ValueError(f"Unknown workload class {workload_class!r}; expected one of {list(WORKLOAD_WAREHOUSES)}")
+    _apply(session, query_tag(app, workload_class, run_id, request_id),
+           warehouse or WORKLOAD_WAREHOUSES[workload_class])
+
+
+@contextmanager
+def workload(session, workload_class: str, app: str, run_id: str = None,
+             request_id: str = None, warehouse: str = None):
+    """use_workload() for the duration of a block, then restore the previous tag and warehouse."""
+    previous_tag = session.query_tag
+    previous_warehouse = session.get_current_warehouse()
+    use_workload(session, workload_class, app, run_id, request_id, warehouse)
+    try:
+        yield session
+    finally:
+        _apply(session, previous_tag or "", previous_warehouse)
+
+
+def queue_report(session, days: int = 7) -> pd.DataFrame:
+    """Queued vs. execution time per workload class and warehouse for tagged app queries."""
+    return session.sql("""
+        WITH tagged AS (
+            SELECT TRY_PARSE_JSON(QUERY_TAG) AS TAG,
+                   WAREHOUSE_NAME,
+                   (QUEUED_OVERLOAD_TIME + QUEUED_PROVISIONING_TIME) AS QUEUED_MS,
+                   EXECUTION_TIME AS EXECUTION_MS
+            FROM SNOWFLAKE.ACCOUNT_USAGE.QUERY_HISTORY
+            WHERE START_TIME >= DATEADD(day, -?, CURRENT_TIMESTAMP())
+              AND QUERY_TAG LIKE '{%"workload"%'
+        )
+        SELECT TAG:workload::STRING AS WORKLOAD,
+               TAG:app::STRING AS APP,
+               WAREHOUSE_NAME,
+               COUNT(*) AS QUERIES,
+               COUNT_IF(QUEUED_MS > 0) AS QUEUED_QUERIES,
+               AVG(QUEUED_MS) / 1000 AS AVG_QUEUED_S,
+               APPROX_PERCENTILE(QUEUED_MS, 0.95) / 1000 AS P95_QUEUED_S,
+               AVG(EXECUTION_MS) / 1000 AS AVG_EXECUTION_S
+        FROM tagged
+        WHERE TAG:workload IS NOT NULL
+        GROUP BY 1, 2, 3
+        ORDER BY P95_QUEUED_S DESC
+    """, params=[days]).to_pandas()
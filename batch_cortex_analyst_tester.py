@@ -1,17 +1,34 @@
 import streamlit as st
 import pandas as pd
+import io
 import json
 from snowflake.snowpark.context import get_active_session
 from snowflake.snowpark.types import StructType, StructField, StringType
 import _snowflake                     # Snowflake-internal HTTP helper
+import time
+import uuid
 from datetime import datetime         # Added for timestamp
 
+from analyst_judge import DEFAULT_JUDGE_MODEL, JUDGMENTS_TABLE, judge, judged_results
+from analyst_query_costs import QUERY_MAP_TABLE, record_query
+from app_workloads import use_workload, workload
+from sql_guardrail import GUARDRAIL_DECISIONS_TABLE, check, record_decision
+
+APP_NAME = "batch_cortex_analyst_tester"
+WORKLOAD = "batch"
+
 # ──────────── PAGE CONFIG ───────────────────────────────────────────
 st.set_page_config(page_title="Cortex Analyst Batch Tester", layout="wide")
 
+# Catalog (SHOW) calls and saves run as the batch workload too
+use_workload(get_active_session(), WORKLOAD, APP_NAME)
+
 # Initialize session state
 if 'results_df' not in st.session_state:
     st.session_state.results_df = None
+# Bumped whenever results_df changes; exports are cached per version
+if 'results_version' not in st.session_state:
+    st.session_state.results_version = 0
 if 'processing_complete' not in st.session_state:
     st.session_state.processing_complete = False
 
@@ -25,9 +42,10 @@ For every question we will:
 
 1. Call **Cortex Analyst** and capture the *interpretation* and any follow-ups.  
 2. Extract the generated SQL.  
-3. **Execute** the SQL with Snowpark (applying a preview limit safely).  
-4. Record the **Query ID** and **Request ID**.  
-5. Show everything in one dataframe and let you download it as CSV.
+3. Check its estimated scan with the **cost guardrail** (`EXPLAIN`).  
+4. **Execute** the SQL with Snowpark (applying a preview limit safely).  
+5. Record the **Query ID** and **Request ID**.  
+6. Show everything in one dataframe and let you download it as CSV, Parquet or JSONL.
 """
 )
 
@@ -63,28 +81,105 @@ def call_cortex(question: str, sm_path: str):
     return interpretation, follow_up, sql_stmt, request_id
 
 
-def execute_sql(sql: str, limit_rows: int):
+def execute_sql(sql: str, limit_rows: int, sm_path: str, request_id: str = None, run_id: str = None):
     """
-    Run SQL via Snowpark *without* string-hacking the LIMIT.
-    Returns (preview_rows:list[dict], query_id:str)
+    Run SQL via Snowpark *without* string-hacking the LIMIT, after the cost
+    guardrail (sql_guardrail.check) has accepted it.
+    Returns (preview_rows:list[dict], query_id:str, guardrail decision:dict)
     """
     if not sql.strip():
-        return [], "N/A"
+        return [], "N/A", None
 
     session = get_active_session()
 
-    # Strip a trailing semicolon if present (Snowpark dislikes it)
-    sql_clean = sql.rstrip().rstrip(";")
+    # The guardrail strips a trailing semicolon (Snowpark dislikes it) and may
+    # wrap the statement in a LIMIT or route it to a larger warehouse
+    decision = check(session, sql, sm_path)
+    preview_rows, query_id = [], "N/A"
+    if decision["decision"] == "reject":
+        preview_rows = [{"error": f"Rejected by cost guardrail: {decision['reason']}"}]
+    else:
+        try:
+            with workload(session, WORKLOAD, APP_NAME, run_id, request_id, warehouse=decision["warehouse"]):
+                df_sp = session.sql(decision["statement"])
+                df_preview = df_sp.limit(limit_rows)
+                # Take the id from the job itself: leaving the block runs
+                # ALTER SESSION / USE WAREHOUSE, so LAST_QUERY_ID() afterwards
+                # would point at the restore statement
+                job = df_preview.to_pandas(block=False)
+                query_id = job.query_id
+                preview_rows = job.result().to_dict(orient="records")
+        except Exception as exc:
+            preview_rows = [{"error": str(exc)}]
 
     try:
-        df_sp = session.sql(sql_clean)
-        df_preview = df_sp.limit(limit_rows)
-        preview_rows = df_preview.to_pandas().to_dict(orient="records")
-    except Exception as exc:
-        return [{"error": str(exc)}], "N/A"
+        record_decision(session, decision, APP_NAME, request_id,
+                        None if query_id == "N/A" else query_id,
+                        table=model_schema_table(sm_path, GUARDRAIL_DECISIONS_TABLE))
+    except Exception:
+        pass
+    return preview_rows, query_id, decision
+
+
+# Download formats: label -> (file extension, mime type)
+EXPORT_FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "Parquet (zstd)": ("parquet", "application/vnd.apache.parquet"),
+    "JSONL": ("jsonl", "application/jsonl"),
+}
+
+
+def flat_results(df: pd.DataFrame) -> pd.DataFrame:
+    """Copy with the structured result_preview serialized to JSON text (CSV, Parquet, Snowflake)."""
+    return df.assign(result_preview=df["result_preview"].map(
+        lambda rows: None if rows is None else json.dumps(rows, default=str)))
+
+
+@st.cache_data(max_entries=len(EXPORT_FORMATS) * 2, show_spinner="Preparing export…")
+def build_export(results_version: int, export_format: str, _df: pd.DataFrame) -> bytes:
+    """Export bytes for one results version (the DataFrame itself is not hashed)."""
+    if export_format == "JSONL":
+        # result_preview stays nested instead of a JSON string inside JSON
+        return _df.to_json(orient="records", lines=True, date_format="iso", default_handler=str).encode()
+    flat = flat_results(_df)
+    if export_format == "CSV":
+        return flat.to_csv(index=False).encode()
+    buf = io.BytesIO()
+    flat.to_parquet(buf, index=False, compression="zstd")
+    return buf.getvalue()
+
+
+JUDGE_MODELS = [DEFAULT_JUDGE_MODEL, "claude-3-5-sonnet", "llama3.1-70b", "mistral-large2"]
+
 
-    query_id = session.sql("SELECT LAST_QUERY_ID() AS QID").collect()[0][0]
-    return preview_rows, query_id
+def grade_results(df: pd.DataFrame, sm_path: str, judge_model: str, results_table: str = None) -> pd.DataFrame:
+    """
+    Grade results with analyst_judge (one AI_COMPLETE statement) and add judge_* columns.
+
+    Uses the saved results table if given, otherwise a temporary copy of df.
+    Judgments are cached in the semantic model's schema, so unchanged
+    (question, SQL) pairs are not graded again.
+    """
+    session = get_active_session()
+    if results_table is None:
+        results_table = model_schema_table(sm_path, "BATCH_RESULTS_TO_JUDGE")
+        session.create_dataframe(flat_results(df)).write.save_as_table(
+            results_table, mode="overwrite", table_type="temporary"
+        )
+    judgments_table = model_schema_table(sm_path, JUDGMENTS_TABLE)
+    judge(session, results_table, judge_model, judgments_table)
+    grades = judged_results(session, results_table, judgments_table, judge_model)
+    grades = grades.rename(columns=lambda c: c if c in ("QUESTION", "SQL") else f"judge_{c.lower()}")
+    grades = grades.drop_duplicates(subset=["QUESTION", "SQL"])
+    ungraded = df.drop(columns=[c for c in df.columns if c.startswith("judge_")])
+    return ungraded.merge(grades, how="left", left_on=["question", "query"], right_on=["QUESTION", "SQL"]) \
+        .drop(columns=["QUESTION", "SQL"])
+
+
+def model_schema_table(sm_path: str, table: str) -> str:
+    """Fully qualified table in the semantic model's database and schema."""
+    db, schema = sm_path.lstrip("@").split(".")[:2]
+    return f"{db}.{schema}.{table}"
 
 
 @st.cache_data
@@ -126,7 +221,7 @@ def save_to_snowflake(df: pd.DataFrame, database: str, schema: str, table: str,
         session = get_active_session()
         
         # Convert pandas DataFrame to Snowpark DataFrame
-        snowpark_df = session.create_dataframe(df)
+        snowpark_df = session.create_dataframe(flat_results(df))
         
         full_table_name = f"{database}.{schema}.{table}"
         
@@ -161,15 +256,23 @@ with st.sidebar:
     if st.session_state.results_df is not None:
         st.divider()
         
-        # CSV Download
+        # Downloads are only serialized when requested, then cached per results version
         st.subheader("⬇️ Download")
-        st.download_button(
-            "Download CSV",
-            data=st.session_state.results_df.to_csv(index=False).encode(),
-            file_name="cortex_analyst_batch_results.csv",
-            mime="text/csv",
-            use_container_width=True
-        )
+        export_format = st.selectbox("Format", list(EXPORT_FORMATS), key="export_format")
+        export_key = (st.session_state.results_version, export_format)
+        if st.session_state.get("export_ready") != export_key:
+            if st.button(f"Prepare {export_format}", use_container_width=True):
+                st.session_state.export_ready = export_key
+                st.rerun()
+        else:
+            extension, mime = EXPORT_FORMATS[export_format]
+            st.download_button(
+                f"Download {export_format}",
+                data=build_export(*export_key, st.session_state.results_df),
+                file_name=f"cortex_analyst_batch_results.{extension}",
+                mime=mime,
+                use_container_width=True
+            )
         
         # Snowflake Save Section
         st.divider()
@@ -248,6 +351,11 @@ with st.sidebar:
                                     )
                                     if "✅" in result_msg:
                                         st.success(result_msg)
+                                        # The judge grades against the saved table
+                                        st.session_state.saved_results = (
+                                            st.session_state.results_version,
+                                            f"{selected_db}.{selected_schema}.{table_name}",
+                                        )
                                     else:
                                         st.error(result_msg)
                 else:
@@ -255,6 +363,27 @@ with st.sidebar:
         else:
             st.warning("No databases accessible or error retrieving databases.")
 
+        # Optional LLM-as-a-judge scoring (analyst_judge.py)
+        st.divider()
+        st.subheader("🧑‍⚖️ Grade with LLM Judge")
+        judge_model = st.selectbox("Judge model", JUDGE_MODELS, key="judge_model")
+        saved = st.session_state.get("saved_results")
+        saved_table = saved[1] if saved and saved[0] == st.session_state.results_version else None
+        st.caption(f"Grades {'the saved table ' + saved_table if saved_table else 'these results'} "
+                   "in one statement; unchanged answers reuse earlier grades.")
+        if st.button("Grade results", use_container_width=True):
+            with st.spinner("Grading…"):
+                try:
+                    st.session_state.results_df = grade_results(
+                        st.session_state.results_df, st.session_state.results_model, judge_model, saved_table
+                    )
+                    st.session_state.results_version += 1
+                    if saved_table:
+                        st.session_state.saved_results = (st.session_state.results_version, saved_table)
+                    st.rerun()
+                except Exception as e:
+                    st.error(f"Grading failed: {e}")
+
 # ──────────── MAIN INPUT FIELDS ─────────────────────────────────────
 semantic_model_path = st.text_input(
     "Semantic-model YAML path",
@@ -273,6 +402,7 @@ with col1:
     if st.session_state.results_df is not None:
         if st.button("🗑️ Clear Results"):
             st.session_state.results_df = None
+            st.session_state.results_version += 1
             st.session_state.processing_complete = False
             st.rerun()
 
@@ -290,26 +420,44 @@ if run_btn:
 
     # Capture the timestamp when Run tests button is pressed
     run_timestamp = datetime.now()
+    run_id = uuid.uuid4().hex
 
     questions = [q.strip() for q in questions_input.splitlines() if q.strip()]
     results = []
+    session = get_active_session()
+    map_table = model_schema_table(semantic_model_path, QUERY_MAP_TABLE)
+    # Regression runs go to the batch warehouse, tagged with this run's id
+    use_workload(session, WORKLOAD, APP_NAME, run_id)
     prog = st.progress(0, text="Starting…")
 
     for idx, q in enumerate(questions, start=1):
         try:
             prog.progress((idx - 0.5)/len(questions),
                           text=f"Analyst {idx}/{len(questions)}")
+            started = time.perf_counter()
             interp, follow_up, sql, req_id = call_cortex(q, semantic_model_path)
+            analyst_ms = (time.perf_counter() - started) * 1000
 
             prog.progress(idx/len(questions),
                           text=f"Running SQL {idx}/{len(questions)}")
-            preview, qid = execute_sql(sql, row_limit)
-            preview_str = json.dumps(preview, default=str) if preview else "No rows"
+            preview, qid, guardrail = execute_sql(sql, row_limit, semantic_model_path, req_id, run_id)
+            guardrail_decision = guardrail["decision"] if guardrail else ""
+            est_bytes = guardrail["bytes_assigned"] if guardrail else None
+
+            if qid != "N/A":
+                # Persist the pair for analyst_query_costs.py; never fail the run over it
+                try:
+                    record_query(session, req_id, qid, APP_NAME,
+                                 semantic_model_path, q, analyst_ms, table=map_table)
+                except Exception:
+                    pass
 
         except Exception as err:
             interp = f"ERROR → {err}"
-            follow_up = sql = preview_str = ""
+            follow_up = sql = guardrail_decision = ""
+            preview = None
             qid = req_id = "N/A"
+            est_bytes = None
 
         results.append({
             "created_at": run_timestamp,  # Add timestamp to each result
@@ -317,7 +465,9 @@ if run_btn:
             "interpretation": interp,
             "follow_up": follow_up,
             "query": sql,
-            "result_preview": preview_str,
+            "result_preview": preview,            # list of row dicts (structured)
+            "guardrail": guardrail_decision,
+            "est_bytes_scanned": est_bytes,
             "query_id": qid,
             "request_id": req_id,
         })
@@ -326,12 +476,18 @@ if run_btn:
     
     # Store results in session state
     st.session_state.results_df = pd.DataFrame(results)
+    st.session_state.results_version += 1
+    st.session_state.results_model = semantic_model_path
     st.session_state.processing_complete = True
     st.rerun()  # Refresh to show the sidebar options
 
 # ──────────── DISPLAY RESULTS ───────────────────────────────────────
 if st.session_state.results_df is not None:
     st.subheader(f"✅ Results ({len(st.session_state.results_df)})")
+    if "judge_verdict" in st.session_state.results_df.columns:
+        verdicts = st.session_state.results_df["judge_verdict"].fillna("ungraded").value_counts()
+        for col, (verdict, count) in zip(st.columns(len(verdicts)), verdicts.items()):
+            col.metric(verdict.replace("_", " ").title(), count)
     st.dataframe(st.session_state.results_df, use_container_width=True)
     
     if st.session_state.processing_complete:
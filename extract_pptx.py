@@ -0,0 +1,310 @@
+# ── extract_pptx.py ─────────────────────────────────────────────────────────────
+"""
+Native PPTX extractor for RAG pipelines.
+• Text → one row per shape (or per nested shape) with (x, y, w, h) in EMUs
+• Pictures → one row with placeholder text '[IMAGE]' and image metadata
+• extract_from_stage() handles a single deck; extract_stage() handles every deck
+  in a stage with a process pool and streams rows into a table in batches
+• Images are content-addressed (<sha1>.<ext>): each unique blob is uploaded once,
+  with one PUT per batch, and rows reference it by hash
+• PptxExtractor runs the same walker as a UDTF inside the warehouse, reading
+  staged decks directly with SnowflakeFile
+• A re-extracted deck's rows replace its old rows in one transaction, so
+  removed shapes and slides disappear and other decks' rows are not touched
+"""
+
+import io
+import os
+import shutil
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+from pptx import Presentation
+from pptx.enum.shapes import MSO_SHAPE_TYPE
+
+EMU_PER_INCH = 914_400  # constant from Office spec
+
+# Columns written to the target table
+ROW_COLUMNS = ["file_name", "slide", "shape_id", "type", "content", "file", "image_sha1", "bbox"]
+
+
+def walk_slide_shapes(slide, slide_idx):
+    """
+    Walk a slide's shapes (expanding groups) without touching Snowflake.
+
+    Returns (rows, images) where images maps the content-addressed file name to
+    the blob, so a logo repeated on every slide appears only once.
+    """
+    stack = deque(slide.shapes)
+    rows = []
+    images = {}
+
+    while stack:
+        shp = stack.pop()
+        # Recursively expand group shapes
+        if shp.shape_type == MSO_SHAPE_TYPE.GROUP:
+            stack.extend(shp.shapes)
+            continue
+
+        bbox = [int(shp.left), int(shp.top), int(shp.width), int(shp.height)]
+
+        if shp.has_text_frame and shp.text_frame.text.strip():
+            rows.append({
+                "slide": slide_idx,
+                "shape_id": shp.shape_id,
+                "type": "TEXT",
+                "content": shp.text_frame.text.strip(),
+                "bbox": bbox,
+            })
+
+        elif shp.shape_type == MSO_SHAPE_TYPE.PICTURE:
+            image = shp.image
+            name = f"{image.sha1}.{image.ext}"
+            images.setdefault(name, image.blob)
+            rows.append({
+                "slide": slide_idx,
+                "shape_id": shp.shape_id,
+                "type": "IMAGE",
+                "content": "[IMAGE]",
+                "file": name,
+                "image_sha1": image.sha1,
+                "bbox": bbox,
+            })
+
+    return rows, images
+
+
+def extract_deck(path):
+    """Parse one PPTX file (path or file-like object). Safe to run in a worker process."""
+    prs = Presentation(path)
+    rows = []
+    images = {}
+    for idx, slide in enumerate(prs.slides, start=1):
+        slide_rows, slide_images = walk_slide_shapes(slide, idx)
+        rows.extend(slide_rows)
+        for name, blob in slide_images.items():
+            images.setdefault(name, blob)
+    return rows, images
+
+
+def order_rows(df):
+    """Sort rows into reading order: slide, then column group, then vertical position."""
+    if df.empty:
+        return df
+
+    # Extract coordinates from bbox for sorting
+    df["top"] = df["bbox"].apply(lambda x: x[1])
+    df["left"] = df["bbox"].apply(lambda x: x[0])
+
+    # Group elements into columns based on horizontal position
+    df["column_group"] = pd.cut(df["left"], bins=10, labels=False)
+
+    # Sort by slide, then column group, then vertical position
+    df = df.sort_values(by=["slide", "column_group", "top"])
+
+    # Drop the temporary columns
+    return df.drop(columns=["top", "left", "column_group"])
+
+
+def staged_images(session, image_stage_name):
+    """Names of the images already on the image stage."""
+    return {row["name"].split("/")[-1] for row in session.sql(f"LIST @{image_stage_name}").collect()}
+
+
+def upload_images(session, images, image_stage_name, existing=None, parallel=8):
+    """
+    Upload the images not yet on the stage with a single PUT.
+
+    Names are content hashes, so anything in `existing` (see staged_images) is
+    skipped. Returns the set of uploaded names, which callers add to `existing`.
+    """
+    if existing is None:
+        existing = staged_images(session, image_stage_name)
+    new_images = {name: blob for name, blob in images.items() if name not in existing}
+    if not new_images:
+        return set()
+    temp_dir = tempfile.mkdtemp()
+    try:
+        for name, blob in new_images.items():
+            with open(os.path.join(temp_dir, name), "wb") as f:
+                f.write(blob)
+        session.file.put(
+            os.path.join(temp_dir, "*"),
+            f"@{image_stage_name}/",
+            auto_compress=False,
+            overwrite=False,
+            parallel=parallel,
+        )
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    return set(new_images)
+
+
+def _find_downloaded(temp_dir, file_name):
+    """session.file.get can nest the file in a directory named after it."""
+    actual_file_path = os.path.join(temp_dir, file_name)
+    if os.path.isdir(actual_file_path):
+        files = os.listdir(actual_file_path)
+        if not files:
+            raise FileNotFoundError(f"No files found in {actual_file_path}")
+        actual_file_path = os.path.join(actual_file_path, files[0])
+    return actual_file_path
+
+
+def extract_from_stage(session, stage_name, file_name, image_stage_name):
+    """Extract content from a PPTX file stored in a Snowflake stage"""
+    temp_dir = tempfile.mkdtemp()
+    try:
+        # Download file from stage to temp directory
+        session.file.get(f"@{stage_name}/{file_name}", temp_dir)
+        rows, images = extract_deck(_find_downloaded(temp_dir, file_name))
+        upload_images(session, images, image_stage_name)
+        for row in rows:
+            row["file_name"] = file_name
+        return order_rows(pd.DataFrame(rows))
+    finally:
+        # Clean up temp directory and all contents
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def _extract_deck_worker(args):
+    path, file_name = args
+    return file_name, extract_deck(path)
+
+
+def ensure_table(session, table_name):
+    """Create the extraction target table if it does not exist."""
+    session.sql(f"""
+        CREATE TABLE IF NOT EXISTS {table_name} (
+            FILE_NAME VARCHAR,
+            SLIDE INTEGER,
+            SHAPE_ID INTEGER,
+            TYPE VARCHAR,
+            CONTENT VARCHAR,
+            FILE VARCHAR,
+            IMAGE_SHA1 VARCHAR,
+            BBOX VARCHAR
+        )
+    """).collect()
+    # Tables created before images were content-addressed
+    session.sql(f"ALTER TABLE {table_name} ADD COLUMN IF NOT EXISTS IMAGE_SHA1 VARCHAR").collect()
+
+
+def replace_rows(session, df, table_name):
+    """
+    Replace the rows of every deck in df with df's rows, in one transaction.
+
+    The deck's old rows are deleted by file_name before the new ones are
+    inserted, so shapes and slides removed from a re-extracted deck do not
+    linger. Other decks' rows are not touched.
+    """
+    if df.empty:
+        return 0
+    ensure_table(session, table_name)
+
+    # Fixed column set so every batch loads with the same schema
+    df = df.reindex(columns=ROW_COLUMNS).reset_index(drop=True)
+    df["bbox"] = df["bbox"].apply(str)
+    df.columns = [c.upper() for c in df.columns]
+    columns = ", ".join(df.columns)
+
+    # Load the batch before the transaction, so a failed upload leaves the table as it was
+    staging = f"{table_name}_BATCH"
+    session.create_dataframe(df).write.save_as_table(staging, mode="overwrite", table_type="temporary")
+
+    session.sql("BEGIN").collect()
+    try:
+        session.sql(f"DELETE FROM {table_name} WHERE FILE_NAME IN (SELECT DISTINCT FILE_NAME FROM {staging})").collect()
+        session.sql(f"INSERT INTO {table_name} ({columns}) SELECT {columns} FROM {staging}").collect()
+        session.sql("COMMIT").collect()
+    except Exception:
+        session.sql("ROLLBACK").collect()
+        raise
+    return len(df)
+
+
+def extract_stage(session, stage_name, image_stage_name, table_name,
+                  max_workers=None, batch_rows=5000):
+    """
+    Extract every PPTX in a stage into table_name.
+
+    All decks are downloaded with one GET and parsed in a process pool. Every
+    batch_rows rows, the batch's decks are replaced in the table (a deck is
+    never split across batches), together with one PUT of the batch's images
+    that are not on the image stage yet. Returns a per-deck summary DataFrame.
+    """
+    temp_dir = tempfile.mkdtemp()
+    summary = []
+    try:
+        session.file.get(f"@{stage_name}/", temp_dir, pattern=r".*\.pptx")
+
+        decks = []
+        for root, _, files in os.walk(temp_dir):
+            for name in files:
+                if name.lower().endswith(".pptx"):
+                    path = os.path.join(root, name)
+                    decks.append((path, os.path.relpath(path, temp_dir)))
+
+        existing = staged_images(session, image_stage_name)
+        rows, images = [], {}
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = {pool.submit(_extract_deck_worker, deck): deck[1] for deck in decks}
+            for future in as_completed(futures):
+                file_name = futures[future]
+                try:
+                    _, (deck_rows, deck_images) = future.result()
+                except Exception as exc:
+                    summary.append({"file": file_name, "rows": 0, "image_shapes": 0, "images": 0,
+                                    "error": str(exc)})
+                    continue
+
+                for row in deck_rows:
+                    row["file_name"] = file_name
+                rows.extend(deck_rows)
+                for name, blob in deck_images.items():
+                    images.setdefault(name, blob)
+                summary.append({"file": file_name, "rows": len(deck_rows),
+                                "image_shapes": sum(r["type"] == "IMAGE" for r in deck_rows),
+                                "images": len(deck_images), "error": None})
+
+                if len(rows) >= batch_rows:
+                    existing |= upload_images(session, images, image_stage_name, existing)
+                    replace_rows(session, order_rows(pd.DataFrame(rows)), table_name)
+                    rows, images = [], {}
+
+        if rows:
+            existing |= upload_images(session, images, image_stage_name, existing)
+            replace_rows(session, order_rows(pd.DataFrame(rows)), table_name)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    return pd.DataFrame(summary)
+
+
+class PptxExtractor:
+    """
+    UDTF handler that extracts one staged deck per input row inside the warehouse.
+
+    Input: a scoped file URL (BUILD_SCOPED_FILE_URL) and the deck's relative path.
+    Output: one row per text shape / picture in ROW_COLUMNS order. Pictures are
+    described but not uploaded - a UDTF cannot PUT to a stage.
+    """
+
+    def process(self, file_url, file_name):
+        from snowflake.snowpark.files import SnowflakeFile
+
+        with SnowflakeFile.open(file_url, "rb") as f:
+            # python-pptx needs a seekable file
+            data = io.BytesIO(f.read())
+
+        rows, _ = extract_deck(data)
+        if not rows:
+            return
+        for row in rows:
+            row["file_name"] = file_name
+        df = order_rows(pd.DataFrame(rows)).reindex(columns=ROW_COLUMNS)
+        df["bbox"] = df["bbox"].apply(str)
+        df = df.astype(object).where(df.notna(), None)
+        yield from df.itertuples(index=False, name=None)
@@ -0,0 +1,342 @@
+#------------------------------------------------------------------------------
+# PARSE DOCUMENT LOADER
+# Parallel, batched PARSE_DOCUMENT + chunking for large backfills.
+#
+# - The stage listing is split into size-balanced batches
+# - Batches run concurrently as async Snowpark queries that write to staging
+#   tables; a finished batch replaces its files' rows in one transaction, so
+#   a failed batch leaves the previously loaded rows in place
+# - A failed batch is split into single files that are retried on their own;
+#   files that still fail are written to DOCS_INGEST_ERRORS
+# - Parsed text is kept in DOCS_PARSED so documents can be re-chunked
+#   without being parsed again
+# - Reports pages per second and (once ACCOUNT_USAGE catches up) credits per page
+#
+# Usage (Snowflake notebook, with text_chunker registered):
+#   from parse_document_loader import load_stage
+#   summary, batches = load_stage(session, "DB.SCHEMA.STAGE", "DB.SCHEMA.DOCS_CHUNKS_TABLE")
+#------------------------------------------------------------------------------
+
+import heapq
+import time
+import uuid
+from datetime import datetime
+
+import pandas as pd
+
+PARSED_TABLE = "DOCS_PARSED"
+ERRORS_TABLE = "DOCS_INGEST_ERRORS"
+STATE_TABLE = "DOCS_INGEST_STATE"
+PARSED_STAGING_TABLE = "DOCS_PARSED_STAGING"
+CHUNKS_STAGING_TABLE = "DOCS_CHUNKS_STAGING"
+
+PARSED_COLUMNS = "RELATIVE_PATH, PAGE_COUNT, CONTENT, PARSED_AT"
+CHUNK_COLUMNS = "RELATIVE_PATH, SIZE, FILE_URL, SCOPED_FILE_URL, CHUNK_ORDER, CHUNK"
+
+
+def _qualify(target_table: str, name: str) -> str:
+    """Place a helper table in the same database/schema as the target table."""
+    prefix = target_table.rsplit(".", 1)[0] + "." if "." in target_table else ""
+    return prefix + name
+
+
+def ensure_tables(session, target_table: str) -> None:
+    """Create the parsed-text, staging, error and ingest-state tables next to the chunks table."""
+    session.sql(f"""
+        CREATE TABLE IF NOT EXISTS {_qualify(target_table, PARSED_TABLE)} (
+            RELATIVE_PATH VARCHAR,
+            PAGE_COUNT INTEGER,
+            CONTENT VARCHAR,
+            PARSED_AT TIMESTAMP_LTZ
+        )
+    """).collect()
+    # Async batches write here first; _publish() moves a finished batch into place
+    session.sql(f"""
+        CREATE TRANSIENT TABLE IF NOT EXISTS {_qualify(target_table, PARSED_STAGING_TABLE)} (
+            BATCH_ID VARCHAR,
+            RELATIVE_PATH VARCHAR,
+            PAGE_COUNT INTEGER,
+            CONTENT VARCHAR,
+            PARSED_AT TIMESTAMP_LTZ
+        )
+    """).collect()
+    session.sql(f"""
+        CREATE TRANSIENT TABLE IF NOT EXISTS {_qualify(target_table, CHUNKS_STAGING_TABLE)} (
+            BATCH_ID VARCHAR,
+            RELATIVE_PATH VARCHAR,
+            SIZE NUMBER,
+            FILE_URL VARCHAR,
+            SCOPED_FILE_URL VARCHAR,
+            CHUNK_ORDER INTEGER,
+            CHUNK VARCHAR
+        )
+    """).collect()
+    session.sql(f"""
+        CREATE TABLE IF NOT EXISTS {_qualify(target_table, ERRORS_TABLE)} (
+            RELATIVE_PATH VARCHAR,
+            STEP VARCHAR,
+            ERROR VARCHAR,
+            FAILED_AT TIMESTAMP_LTZ
+        )
+    """).collect()
+    session.sql(f"""
+        CREATE TABLE IF NOT EXISTS {_qualify(target_table, STATE_TABLE)} (
+            RELATIVE_PATH VARCHAR,
+            MD5 VARCHAR,
+            LAST_MODIFIED TIMESTAMP_LTZ,
+            INGESTED_AT TIMESTAMP_LTZ
+        )
+    """).collect()
+
+
+def list_stage(session, stage: str, pattern: str = None) -> list:
+    """Return [(relative_path, size)] for the files in a stage's directory table."""
+    query = f"SELECT RELATIVE_PATH, SIZE FROM DIRECTORY(@{stage})"
+    params = []
+    if pattern:
+        query += " WHERE RELATIVE_PATH ILIKE ?"
+        params.append(pattern)
+    return [(row["RELATIVE_PATH"], row["SIZE"] or 0) for row in session.sql(query, params=params).collect()]
+
+
+def balance_batches(files: list, max_batch_bytes: int = 256 * 1024 * 1024, max_batch_files: int = 200) -> list:
+    """
+    Split [(relative_path, size)] into batches of roughly equal total size.
+
+    Largest files are placed first, each into the currently lightest batch, so
+    one huge PDF does not end up sharing a batch with many others.
+    """
+    if not files:
+        return []
+    total = sum(size for _, size in files)
+    num_batches = max(
+        -(-total // max_batch_bytes),
+        -(-len(files) // max_batch_files),
+        1,
+    )
+    heap = [(0, i, []) for i in range(num_batches)]
+    for path, size in sorted(files, key=lambda f: f[1], reverse=True):
+        batch_bytes, i, paths = heapq.heappop(heap)
+        paths.append(path)
+        heapq.heappush(heap, (batch_bytes + size, i, paths))
+    return [paths for _, _, paths in sorted(heap, key=lambda b: b[1]) if paths]
+
+
+def _parse_sql(stage: str, staging_table: str, n: int) -> str:
+    # Binds: batch id, then the n paths
+    placeholders = ", ".join(["?"] * n)
+    return f"""
+        INSERT INTO {staging_table} (BATCH_ID, {PARSED_COLUMNS})
+        SELECT ?,
+               relative_path,
+               doc:metadata:pageCount::integer,
+               doc:content::varchar,
+               CURRENT_TIMESTAMP()
+        FROM (
+            SELECT relative_path,
+                   SNOWFLAKE.CORTEX.PARSE_DOCUMENT(@{stage}, relative_path, {{'mode': 'LAYOUT'}}) AS doc
+            FROM DIRECTORY(@{stage})
+            WHERE relative_path IN ({placeholders})
+        )
+    """
+
+
+def _chunk_sql(stage: str, target_table: str, staging_table: str, parsed_table: str, n: int,
+               chunk_size: int, chunk_overlap: int, length_unit: str) -> str:
+    # Binds: the n paths, then the batch id
+    placeholders = ", ".join(["?"] * n)
+    return f"""
+        INSERT INTO {staging_table} ({CHUNK_COLUMNS}, BATCH_ID)
+        WITH parsed AS (
+            SELECT relative_path, content
+            FROM {parsed_table}
+            WHERE relative_path IN ({placeholders})
+            QUALIFY ROW_NUMBER() OVER (PARTITION BY relative_path ORDER BY parsed_at DESC) = 1
+        ),
+        chunks AS (
+            SELECT func.relative_path, func.chunk_order, func.chunk
+            FROM parsed p,
+                TABLE({_qualify(target_table, 'text_chunker')}(
+                    p.relative_path, p.content, {int(chunk_size)}, {int(chunk_overlap)}, '{length_unit}'
+                ) OVER (PARTITION BY MOD(ABS(HASH(p.relative_path)), 16))) func
+        )
+        SELECT c.relative_path, d.size, d.file_url,
+               BUILD_SCOPED_FILE_URL(@{stage}, d.relative_path),
+               c.chunk_order, c.chunk, ?
+        FROM chunks c
+        JOIN DIRECTORY(@{stage}) d ON d.relative_path = c.relative_path
+    """
+
+
+def _publish(session, staging_table: str, table: str, columns: str, batch_id: str, paths: list) -> None:
+    """
+    Replace the rows of a batch's files with the batch's staged rows in one transaction.
+
+    Files the batch produced no rows for (e.g. an empty document) lose their
+    old rows too, matching a fresh load.
+    """
+    placeholders = ", ".join(["?"] * len(paths))
+    try:
+        session.sql("BEGIN").collect()
+        session.sql(f"DELETE FROM {table} WHERE relative_path IN ({placeholders})", params=paths).collect()
+        session.sql(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {staging_table} WHERE BATCH_ID = ?",
+                    params=[batch_id]).collect()
+        session.sql("COMMIT").collect()
+    except Exception:
+        session.sql("ROLLBACK").collect()
+        raise
+    finally:
+        session.sql(f"DELETE FROM {staging_table} WHERE BATCH_ID = ?", params=[batch_id]).collect()
+
+
+def _record_errors(session, target_table: str, paths: list, step: str, error: str) -> None:
+    rows = [(p, step, error[:10000], datetime.now()) for p in paths]
+    session.create_dataframe(
+        rows, schema=["RELATIVE_PATH", "STEP", "ERROR", "FAILED_AT"]
+    ).write.save_as_table(_qualify(target_table, ERRORS_TABLE), mode="append")
+
+
+def _update_state(session, stage: str, target_table: str, paths: list) -> None:
+    """Keep DOCS_INGEST_STATE (incremental ingestion) in sync with what was loaded."""
+    placeholders = ", ".join(["?"] * len(paths))
+    session.sql(f"""
+        MERGE INTO {_qualify(target_table, STATE_TABLE)} s
+        USING (
+            SELECT relative_path, md5, last_modified
+            FROM DIRECTORY(@{stage})
+            WHERE relative_path IN ({placeholders})
+        ) d
+        ON s.relative_path = d.relative_path
+        WHEN MATCHED THEN UPDATE SET
+            md5 = d.md5, last_modified = d.last_modified, ingested_at = CURRENT_TIMESTAMP()
+        WHEN NOT MATCHED THEN INSERT (relative_path, md5, last_modified, ingested_at)
+            VALUES (d.relative_path, d.md5, d.last_modified, CURRENT_TIMESTAMP())
+    """, params=paths).collect()
+
+
+def load_stage(session, stage: str, target_table: str, pattern: str = None,
+               max_concurrency: int = 4, max_batch_bytes: int = 256 * 1024 * 1024,
+               max_batch_files: int = 200, chunk_size: int = 1512, chunk_overlap: int = 256,
+               length_unit: str = "chars", warehouse: str = None, update_state: bool = True,
+               poll_seconds: float = 2.0):
+    """
+    Parse and chunk every file in a stage with concurrent, size-balanced batches.
+
+    Each batch is staged by an async query and then swapped in with a single
+    delete + insert transaction, so existing parsed text and chunks for a file
+    are only replaced once its new rows exist; files that fail keep their
+    previous rows. A partially failed backfill can simply be re-run.
+    Returns (summary dict, per-batch DataFrame).
+    """
+    if warehouse:
+        session.sql(f"USE WAREHOUSE {warehouse}").collect()
+    ensure_tables(session, target_table)
+    parsed_table = _qualify(target_table, PARSED_TABLE)
+    parsed_staging = _qualify(target_table, PARSED_STAGING_TABLE)
+    chunks_staging = _qualify(target_table, CHUNKS_STAGING_TABLE)
+
+    files = list_stage(session, stage, pattern)
+    pending = [{"paths": paths, "step": "parse", "isolated": len(paths) == 1} for paths in
+               balance_batches(files, max_batch_bytes, max_batch_files)]
+    active = []
+    log = []
+    loaded = []
+    failed = []
+    query_ids = []
+    started = time.perf_counter()
+
+    def submit(batch, step):
+        paths = batch["paths"]
+        batch_id = uuid.uuid4().hex
+        if step == "parse":
+            sql = _parse_sql(stage, parsed_staging, len(paths))
+            params = [batch_id] + paths
+        else:
+            sql = _chunk_sql(stage, target_table, chunks_staging, parsed_table, len(paths),
+                             chunk_size, chunk_overlap, length_unit)
+            params = paths + [batch_id]
+        batch["step"] = step
+        batch["batch_id"] = batch_id
+        batch["submitted"] = time.perf_counter()
+        batch["job"] = session.sql(sql, params=params).collect_nowait()
+        active.append(batch)
+
+    while pending or active:
+        while pending and len(active) < max_concurrency:
+            batch = pending.pop(0)
+            submit(batch, batch["step"])
+
+        time.sleep(poll_seconds)
+
+        for batch in [b for b in active if b["job"].is_done()]:
+            active.remove(batch)
+            job = batch["job"]
+            query_ids.append(job.query_id)
+            try:
+                job.result()
+                if batch["step"] == "parse":
+                    _publish(session, parsed_staging, parsed_table, PARSED_COLUMNS,
+                             batch["batch_id"], batch["paths"])
+                else:
+                    _publish(session, chunks_staging, target_table, CHUNK_COLUMNS,
+                             batch["batch_id"], batch["paths"])
+            except Exception as exc:
+                if not batch["isolated"]:
+                    # One bad file fails the whole statement: retry each file on its own
+                    pending.extend({"paths": [p], "step": batch["step"], "isolated": True}
+                                   for p in batch["paths"])
+                else:
+                    _record_errors(session, target_table, batch["paths"], batch["step"], str(exc))
+                    failed.extend(batch["paths"])
+                log.append({"files": len(batch["paths"]), "step": batch["step"], "status": "FAILED",
+                            "seconds": time.perf_counter() - batch["submitted"], "query_id": job.query_id})
+                continue
+
+            log.append({"files": len(batch["paths"]), "step": batch["step"], "status": "OK",
+                        "seconds": time.perf_counter() - batch["submitted"], "query_id": job.query_id})
+            if batch["step"] == "parse":
+                submit(batch, "chunk")
+            else:
+                loaded.extend(batch["paths"])
+                if update_state:
+                    _update_state(session, stage, target_table, batch["paths"])
+
+    elapsed = time.perf_counter() - started
+    pages = 0
+    if loaded:
+        placeholders = ", ".join(["?"] * len(loaded))
+        pages = session.sql(
+            f"SELECT COALESCE(SUM(PAGE_COUNT), 0) FROM {parsed_table} WHERE relative_path IN ({placeholders})",
+            params=loaded,
+        ).collect()[0][0]
+
+    summary = {
+        "files": len(files),
+        "loaded": len(loaded),
+        "failed": len(failed),
+        "pages": pages,
+        "seconds": round(elapsed, 1),
+        "pages_per_second": round(pages / elapsed, 2) if elapsed else None,
+        "query_ids": query_ids,
+    }
+    return summary, pd.DataFrame(log)
+
+
+def credits_per_page(session, query_ids: list):
+    """
+    Document-processing credits per page for a finished load.
+
+    ACCOUNT_USAGE lags by up to a few hours; returns None until the load's
+    queries show up in CORTEX_DOCUMENT_PROCESSING_USAGE_HISTORY.
+    """
+    if not query_ids:
+        return None
+    placeholders = ", ".join(["?"] * len(query_ids))
+    row = session.sql(f"""
+        SELECT SUM(CREDITS_USED) AS credits, SUM(PAGE_COUNT) AS pages
+        FROM SNOWFLAKE.ACCOUNT_USAGE.CORTEX_DOCUMENT_PROCESSING_USAGE_HISTORY
+        WHERE QUERY_ID IN ({placeholders})
+    """, params=query_ids).collect()[0]
+    if not row["PAGES"]:
+        return None
+    return row["CREDITS"] / row["PAGES"]
@@ -0,0 +1,322 @@
+#------------------------------------------------------------------------------
+# SEARCH BENCHMARK
+# Retrieval benchmark for Cortex Search configurations, so chunking, attributes
+# and target lag (and the chat app's "Number of chunks" default) are picked
+# from measurements instead of defaults.
+#
+# - Each configuration re-chunks the parsed text kept in DOCS_PARSED by
+#   parse_document_loader.py (no PARSE_DOCUMENT calls) into its own chunks
+#   table with the text_chunker UDTF, then builds its own search service
+# - The labeled set maps each QUESTION to one or more relevant RELATIVE_PATHs;
+#   questions are sent in parallel through the Python API (default) or
+#   SNOWFLAKE.CORTEX.SEARCH_PREVIEW
+# - Hits are scored at document level: recall@k (k counts chunks, like the
+#   chat app's "Number of chunks" slider) for every k in KS and MRR, with
+#   p50 / p95 client-side search latency
+# - search_credits() adds serving and embedding credits per service from
+#   CORTEX_SEARCH_DAILY_USAGE_HISTORY once ACCOUNT_USAGE catches up
+#
+# Usage (Snowflake notebook, with text_chunker registered and DOCS_PARSED loaded):
+#   from search_benchmark import CONFIGS, run_benchmark, search_credits
+#   summary, detail = run_benchmark(session, "DB.SCHEMA", "DB.SCHEMA.SEARCH_LABELS", CONFIGS)
+#   search_credits(session, summary["service"].tolist())  # a day later
+#------------------------------------------------------------------------------
+
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from app_workloads import workload
+from parse_document_loader import PARSED_TABLE
+
+APP_NAME = "search_benchmark"
+SERVICE_PREFIX = "SEARCH_BENCH"
+
+KS = (1, 3, 5, 10)            # recall@k cut-offs; max(KS) results are requested per question
+MAX_WORKERS = 8               # concurrent search requests
+READY_TIMEOUT_SECONDS = 1800  # wait for a new service to start serving
+
+# Candidate configurations; the first one matches the build notebook defaults
+CONFIGS = [
+    {"name": "C1512_O256", "chunk_size": 1512, "chunk_overlap": 256, "length_unit": "chars",
+     "attributes": ["RELATIVE_PATH", "CHUNK_ORDER"], "target_lag": "365 DAYS"},
+    {"name": "C512_O0", "chunk_size": 512, "chunk_overlap": 0, "length_unit": "chars",
+     "attributes": ["RELATIVE_PATH", "CHUNK_ORDER"], "target_lag": "365 DAYS"},
+    {"name": "T384_O64", "chunk_size": 384, "chunk_overlap": 64, "length_unit": "tokens",
+     "attributes": ["RELATIVE_PATH", "CHUNK_ORDER"], "target_lag": "365 DAYS"},
+    {"name": "T128_O0", "chunk_size": 128, "chunk_overlap": 0, "length_unit": "tokens",
+     "attributes": ["RELATIVE_PATH"], "target_lag": "1 DAY"},
+]
+
+
+#------------------------------------------------------------------------------
+# METRICS
+#------------------------------------------------------------------------------
+
+def recall_at_k(paths: list, relevant: set, k: int) -> float:
+    """Share of the relevant documents that appear in the first k hits."""
+    if not relevant:
+        return None
+    return len(relevant.intersection(paths[:k])) / len(relevant)
+
+
+def reciprocal_rank(paths: list, relevant: set) -> float:
+    """1 / rank of the first hit from a relevant document, 0 if none."""
+    for rank, path in enumerate(paths, start=1):
+        if path in relevant:
+            return 1.0 / rank
+    return 0.0
+
+
+#------------------------------------------------------------------------------
+# BUILD
+#------------------------------------------------------------------------------
+
+def names(schema: str, config: dict, prefix: str = SERVICE_PREFIX) -> tuple:
+    """(chunks table, search service) for one configuration."""
+    base = f"{schema}.{prefix}_{config['name']}".upper()
+    return f"{base}_CHUNKS", base
+
+
+def build(session, schema: str, config: dict, warehouse: str, parsed_table: str = None,
+          prefix: str = SERVICE_PREFIX) -> dict:
+    """
+    Re-chunk the parsed documents and (re)create the search service for one configuration.
+
+    Args:
+        session: Snowpark session.
+        schema: "DB.SCHEMA" holding text_chunker; the chunks table and service are created here.
+        config: One entry shaped like CONFIGS.
+        warehouse: Warehouse for the service's refreshes.
+        parsed_table: Parsed text (defaults to <schema>.DOCS_PARSED).
+        prefix: Name prefix for the benchmark objects.
+
+    Returns:
+        dict with service, chunks_table, chunks, avg_chunk_chars and build_seconds.
+    """
+    parsed_table = parsed_table or f"{schema}.{PARSED_TABLE}"
+    chunks_table, service = names(schema, config, prefix)
+    attributes = ", ".join(config.get("attributes") or [])
+    started = time.perf_counter()
+
+    session.sql(f"""
+        CREATE OR REPLACE TABLE {chunks_table} AS
+        WITH parsed AS (
+            SELECT relative_path, content
+            FROM {parsed_table}
+            QUALIFY ROW_NUMBER() OVER (PARTITION BY relative_path ORDER BY parsed_at DESC) = 1
+        )
+        SELECT func.relative_path AS RELATIVE_PATH, func.chunk_order AS CHUNK_ORDER, func.chunk AS CHUNK
+        FROM parsed p,
+            TABLE({schema}.text_chunker(
+                p.relative_path, p.content, ?, ?, ?
+            ) OVER (PARTITION BY MOD(ABS(HASH(p.relative_path)), 64))) func
+    """, params=[int(config["chunk_size"]), int(config["chunk_overlap"]),
+                 config.get("length_unit", "chars")]).collect()
+    session.sql(f"""
+        CREATE OR REPLACE CORTEX SEARCH SERVICE {service}
+        ON CHUNK
+        {f"ATTRIBUTES {attributes}" if attributes else ""}
+        WAREHOUSE = {warehouse}
+        TARGET_LAG = '{config.get("target_lag", "365 DAYS")}'
+        AS (
+            SELECT CHUNK, RELATIVE_PATH, CHUNK_ORDER
+            FROM {chunks_table}
+        )
+    """).collect()
+    wait_until_serving(session, service)
+
+    stats = session.sql(f"SELECT COUNT(*), AVG(LENGTH(CHUNK)) FROM {chunks_table}").collect()[0]
+    return {
+        "service": service,
+        "chunks_table": chunks_table,
+        "chunks": stats[0],
+        "avg_chunk_chars": round(stats[1] or 0, 1),
+        "build_seconds": round(time.perf_counter() - started, 1),
+    }
+
+
+def wait_until_serving(session, service: str, timeout: int = READY_TIMEOUT_SECONDS,
+                       poll_seconds: float = 10.0) -> None:
+    """Block until SHOW CORTEX SEARCH SERVICES reports the service as serving."""
+    database, schema, name = service.split(".")
+    deadline = time.time() + timeout
+    while True:
+        rows = session.sql(f"SHOW CORTEX SEARCH SERVICES LIKE '{name}' IN SCHEMA {database}.{schema}").collect()
+        state = rows[0]["serving_state"] if rows else None
+        if state == "ACTIVE":
+            return
+        if time.time() > deadline:
+            raise TimeoutError(f"{service} not serving after {timeout}s (serving_state={state})")
+        time.sleep(poll_seconds)
+
+
+def drop(session, schema: str, config: dict, prefix: str = SERVICE_PREFIX) -> None:
+    """Drop the service and chunks table of one configuration."""
+    chunks_table, service = names(schema, config, prefix)
+    session.sql(f"DROP CORTEX SEARCH SERVICE IF EXISTS {service}").collect()
+    session.sql(f"DROP TABLE IF EXISTS {chunks_table}").collect()
+
+
+#------------------------------------------------------------------------------
+# QUERY
+#------------------------------------------------------------------------------
+
+def _search_api(root, service: str, question: str, limit: int) -> list:
+    database, schema, name = service.split(".")
+    response = root.databases[database].schemas[schema].cortex_search_services[name].search(
+        question, ["relative_path"], limit=limit)
+    return [r["relative_path"] for r in response.results]
+
+
+def _search_preview(session, service: str, question: str, limit: int) -> list:
+    # Latency includes the SQL round trip on the session's warehouse
+    payload = json.dumps({"query": question, "columns": ["relative_path"], "limit": limit})
+    response = session.sql("SELECT SNOWFLAKE.CORTEX.SEARCH_PREVIEW(?, ?)", params=[service, payload]).collect()[0][0]
+    return [r["relative_path"] for r in json.loads(response)["results"]]
+
+
+def query_service(session, service: str, labels: pd.DataFrame, method: str = "api",
+                  max_workers: int = MAX_WORKERS, ks: tuple = KS) -> pd.DataFrame:
+    """
+    Send every labeled question to a service in parallel and score the hits.
+
+    Args:
+        session: Snowpark session.
+        service: Fully qualified search service.
+        labels: QUESTION, RELATIVE_PATH rows (several rows per question for several relevant documents).
+        method: "api" (snowflake.core) or "preview" (SEARCH_PREVIEW).
+        max_workers: Concurrent requests.
+        ks: recall@k cut-offs.
+
+    Returns:
+        One row per question with latency_ms, rr, recall@k columns and the returned paths.
+    """
+    relevant = labels.groupby("QUESTION")["RELATIVE_PATH"].agg(set).to_dict()
+    limit = max(ks)
+    if method == "api":
+        from snowflake.core import Root
+        root = Root(session)
+        search = lambda q: _search_api(root, service, q, limit)
+    elif method == "preview":
+        search = lambda q: _search_preview(session, service, q, limit)
+    else:
+        raise ValueError(f"Unknown method: {method}")
+
+    def timed(question):
+        started = time.perf_counter()
+        try:
+            paths, error = search(question), None
+        except Exception as e:
+            paths, error = [], str(e)
+        return question, (time.perf_counter() - started) * 1000, paths, error
+
+    # One untimed call so the first measured request does not pay for a cold start
+    search(next(iter(relevant)))
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = list(pool.map(timed, relevant))
+
+    rows = []
+    for question, latency_ms, paths, error in results:
+        row = {"question": question, "latency_ms": latency_ms, "error": error,
+               "rr": reciprocal_rank(paths, relevant[question])}
+        row.update({f"recall@{k}": recall_at_k(paths, relevant[question], k) for k in ks})
+        row["paths"] = paths
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+#------------------------------------------------------------------------------
+# REPORT
+#------------------------------------------------------------------------------
+
+def summarize(detail: pd.DataFrame, ks: tuple = KS) -> dict:
+    """recall@k, MRR and latency percentiles over the questions of one service."""
+    ok = detail[detail["error"].isna()]
+    latency = ok["latency_ms"].to_numpy()
+    summary = {
+        "questions": len(detail.index),
+        "errors": int(detail["error"].notna().sum()),
+        "mrr": round(ok["rr"].mean(), 4) if len(ok.index) else None,
+        "p50_ms": round(float(np.percentile(latency, 50)), 1) if len(latency) else None,
+        "p95_ms": round(float(np.percentile(latency, 95)), 1) if len(latency) else None,
+    }
+    summary.update({f"recall@{k}": round(ok[f"recall@{k}"].mean(), 4) if len(ok.index) else None for k in ks})
+    return summary
+
+
+def search_credits(session, services: list, since=None) -> pd.DataFrame:
+    """
+    Serving and embedding credits per service from CORTEX_SEARCH_DAILY_USAGE_HISTORY.
+
+    ACCOUNT_USAGE lags by a few hours; services without usage rows yet are
+    missing from the result. Serving credits accrue per day for the indexed
+    data whether or not it is queried.
+    """
+    if not services:
+        return pd.DataFrame()
+    placeholders = ", ".join(["?"] * len(services))
+    return session.sql(f"""
+        SELECT DATABASE_NAME || '.' || SCHEMA_NAME || '.' || SERVICE_NAME AS SERVICE,
+               SUM(IFF(CONSUMPTION_TYPE = 'SERVING', CREDITS, 0)) AS SERVING_CREDITS,
+               SUM(IFF(CONSUMPTION_TYPE ILIKE 'EMBED%', CREDITS, 0)) AS EMBEDDING_CREDITS,
+               SUM(IFF(CONSUMPTION_TYPE ILIKE 'EMBED%', TOKENS, 0)) AS EMBEDDING_TOKENS,
+               COUNT(DISTINCT USAGE_DATE) AS DAYS
+        FROM SNOWFLAKE.ACCOUNT_USAGE.CORTEX_SEARCH_DAILY_USAGE_HISTORY
+        WHERE UPPER(DATABASE_NAME || '.' || SCHEMA_NAME || '.' || SERVICE_NAME) IN ({placeholders})
+          AND USAGE_DATE >= COALESCE(TO_DATE(?), '1970-01-01'::DATE)
+        GROUP BY 1
+    """, params=[s.upper() for s in services] + [since]).to_pandas()
+
+
+def run_benchmark(session, schema: str, labels, configs: list = None, warehouse: str = None,
+                  method: str = "api", max_workers: int = MAX_WORKERS, ks: tuple = KS,
+                  rebuild: bool = True, prefix: str = SERVICE_PREFIX, log=print) -> tuple:
+    """
+    Build a service per configuration, query it with the labeled set and compare.
+
+    Args:
+        session: Snowpark session.
+        schema: "DB.SCHEMA" with text_chunker and DOCS_PARSED; benchmark objects are created here.
+        labels: Table name or DataFrame with QUESTION and RELATIVE_PATH columns.
+        configs: Configurations shaped like CONFIGS (default CONFIGS).
+        warehouse: Warehouse for the services' refreshes (default: the session's).
+        method: "api" or "preview", see query_service().
+        max_workers: Concurrent search requests.
+        ks: recall@k cut-offs.
+        rebuild: False reuses services from an earlier run.
+        prefix: Name prefix for the benchmark objects.
+        log: Progress callback.
+
+    Returns:
+        (summary with one row per configuration, per-question detail).
+    """
+    configs = configs or CONFIGS
+    if isinstance(labels, str):
+        labels = session.table(labels).to_pandas()
+    labels = labels.rename(columns=str.upper)[["QUESTION", "RELATIVE_PATH"]].dropna()
+    warehouse = warehouse or session.get_current_warehouse()
+
+    summaries, details = [], []
+    with workload(session, "batch", app=APP_NAME):
+        for config in configs:
+            chunks_table, service = names(schema, config, prefix)
+            if rebuild:
+                log(f"Building {service}")
+                built = build(session, schema, config, warehouse, prefix=prefix)
+            else:
+                built = {"service": service, "chunks_table": chunks_table}
+            detail = query_service(session, service, labels, method, max_workers, ks)
+            detail.insert(0, "config", config["name"])
+            details.append(detail)
+            summary = {"config": config["name"], **{k: v for k, v in config.items() if k != "name"}}
+            summary.update(built)
+            summary.update(summarize(detail, ks))
+            summaries.append(summary)
+            log(f"{config['name']}: MRR {summary['mrr']}, recall@{max(ks)} {summary[f'recall@{max(ks)}']}, "
+                f"p95 {summary['p95_ms']} ms")
+
+    return pd.DataFrame(summaries), pd.concat(details, ignore_index=True)
@@ -0,0 +1,167 @@
+#------------------------------------------------------------------------------
+# SEMANTIC MODEL REGISTRY
+# Cached listing, loading and validation of semantic model YAML files on a
+# stage, so the Analyst chat sidebar renders from memory.
+#
+# - list_models() runs LIST @stage at most once per LISTING_TTL_SECONDS and
+#   returns name, md5, size and last_modified per YAML file
+# - load_model() reads the file through the Snowpark file API (not
+#   SELECT $1 FROM @stage, which splits lines on commas), parses and validates
+#   it once per (path, md5) and exposes its tables, measures and metrics
+# - content_hash (SHA-256 of the file) can key downstream caches
+#
+# Usage:
+#   for entry in list_models(session, "DB.SCHEMA.STAGE"):
+#       model = load_model(session, "DB.SCHEMA.STAGE", entry["name"])
+#       model["errors"], model["tables"], model["measures"]
+#------------------------------------------------------------------------------
+
+import hashlib
+import time
+
+import yaml
+
+LISTING_TTL_SECONDS = 60
+
+# Column lists a logical table may define; each entry needs a name and expr
+COLUMN_SECTIONS = ("dimensions", "time_dimensions", "measures", "facts", "metrics")
+
+_listings = {}   # stage -> (fetched_at, [entries])
+_models = {}     # (path, md5) -> loaded model
+
+
+def list_models(session, stage: str, refresh: bool = False) -> list:
+    """YAML files on the stage as dicts of name, path, md5, size and last_modified."""
+    stage = stage.lstrip("@")
+    cached = _listings.get(stage)
+    if cached and not refresh and time.time() - cached[0] < LISTING_TTL_SECONDS:
+        return cached[1]
+
+    entries = []
+    for row in session.sql(f"LIST @{stage}").collect():
+        name = row["name"].split("/")[-1]
+        if name.endswith((".yaml", ".yml")):
+            entries.append({
+                "name": name,
+                "path": f"@{stage}/{name}",
+                "md5": row["md5"],
+                "size": row["size"],
+                "last_modified": row["last_modified"],
+            })
+    entries.sort(key=lambda e: e["name"])
+    _listings[stage] = (time.time(), entries)
+    return entries
+
+
+def validate(model) -> list:
+    """Structural problems that would make Cortex Analyst reject the model."""
+    if not isinstance(model, dict):
+        return ["Top level must be a mapping"]
+    errors = []
+    if not model.get("name"):
+        errors.append("Missing model 'name'")
+    tables = model.get("tables")
+    if not isinstance(tables, list) or not tables:
+        return errors + ["'tables' must be a non-empty list"]
+
+    for i, table in enumerate(tables):
+        label = table.get("name") if isinstance(table, dict) and table.get("name") else f"tables[{i}]"
+        if not isinstance(table, dict):
+            errors.append(f"{label}: must be a mapping")
+            continue
+        if not table.get("name"):
+            errors.append(f"{label}: missing 'name'")
+        base = table.get("base_table")
+        if not isinstance(base, dict) or not all(base.get(k) for k in ("database", "schema", "table")):
+            errors.append(f"{label}: 'base_table' needs database, schema and table")
+        for section in COLUMN_SECTIONS:
+            for j, column in enumerate(table.get(section) or []):
+                if not isinstance(column, dict) or not column.get("name") or not column.get("expr"):
+                    errors.append(f"{label}.{section}[{j}]: needs 'name' and 'expr'")
+    return errors
+
+
+def _summarize(model: dict) -> tuple:
+    """(tables, measures) lists for display."""
+    tables, measures = [], []
+    for table in model.get("tables") or []:
+        if not isinstance(table, dict):
+            continue
+        base = table.get("base_table") or {}
+        tables.append({
+            "table": table.get("name"),
+            "base_table": ".".join(str(base.get(k, "")) for k in ("database", "schema", "table")),
+            "dimensions": len(table.get("dimensions") or []) + len(table.get("time_dimensions") or []),
+            "measures": len(table.get("measures") or []) + len(table.get("facts") or []),
+        })
+        for section in ("measures", "facts", "metrics"):
+            for column in table.get(section) or []:
+                if isinstance(column, dict):
+                    measures.append({
+                        "table": table.get("name"),
+                        "kind": section[:-1],
+                        "name": column.get("name"),
+                        "expr": column.get("expr"),
+                        "description": column.get("description", ""),
+                    })
+    for metric in model.get("metrics") or []:
+        if isinstance(metric, dict):
+            measures.append({"table": None, "kind": "metric", "name": metric.get("name"),
+                             "expr": metric.get("expr"), "description": metric.get("description", "")})
+    return tables, measures
+
+
+def load_model(session, stage: str, name: str) -> dict:
+    """
+    Load, parse and validate one semantic model, cached by (path, md5).
+
+    Args:
+        session: Snowpark session.
+        stage: Fully qualified stage name (with or without '@').
+        name: YAML file name on the stage.
+
+    Returns:
+        dict with name, path, md5, content_hash, text, model (parsed YAML or
+        None), errors (list of str), tables and measures.
+    """
+    stage = stage.lstrip("@")
+    entry = next((e for e in list_models(session, stage) if e["name"] == name), None)
+    path = f"@{stage}/{name}"
+    key = (path, entry["md5"] if entry else None)
+    if key in _models:
+        return _models[key]
+
+    raw = session.file.get_stream(path).read()
+    text = raw.decode("utf-8")
+    loaded = {
+        "name": name,
+        "path": path,
+        "md5": key[1],
+        "content_hash": hashlib.sha256(raw).hexdigest(),
+        "text": text,
+        "model": None,
+        "errors": [],
+        "tables": [],
+        "measures": [],
+    }
+    try:
+        loaded["model"] = yaml.safe_load(text)
+    except yaml.YAMLError as e:
+        loaded["errors"] = [f"Invalid YAML: {e}"]
+    else:
+        loaded["errors"] = validate(loaded["model"])
+        if isinstance(loaded["model"], dict):
+            loaded["tables"], loaded["measures"] = _summarize(loaded["model"])
+
+    # Drop older versions of the same file
+    for old in [k for k in _models if k[0] == path]:
+        del _models[old]
+    if key[1] is not None:
+        _models[key] = loaded
+    return loaded
+
+
+def clear_cache() -> None:
+    """Forget stage listings and loaded models (e.g. after uploading a new version)."""
+    _listings.clear()
+    _models.clear()
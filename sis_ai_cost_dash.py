@@ -0,0 +1,172 @@
+import streamlit as st
+import pandas as pd
+from datetime import date, timedelta
+from snowflake.snowpark.context import get_active_session
+
+from app_workloads import use_workload
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Configuration
+# Reads the daily rollups maintained by REFRESH_AI_COST_ROLLUPS() (section 10
+# of TRACKING.ipynb) instead of scanning ACCOUNT_USAGE.
+# ──────────────────────────────────────────────────────────────────────────────
+DB            = "<DB_NAME>"
+ROLLUP_SCHEMA = f"{DB}.AI_COST_ROLLUP"
+
+CACHE_TTL_SECONDS = 600
+
+session = get_active_session()
+use_workload(session, "dashboard", app="sis_ai_cost_dash")
+
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def run_query(sql: str, params: tuple = ()) -> pd.DataFrame:
+    return session.sql(sql, params=list(params)).to_pandas()
+
+
+def rollup(select_sql: str, start: date, end: date) -> pd.DataFrame:
+    """Run select_sql with (start, end) bound to each BETWEEN ? AND ? pair."""
+    return run_query(select_sql.format(schema=ROLLUP_SCHEMA), (start, end) * (select_sql.count("?") // 2))
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Sidebar
+# ──────────────────────────────────────────────────────────────────────────────
+st.sidebar.title("Filters")
+start_date = st.sidebar.date_input("Start Date", date.today() - timedelta(days=30))
+end_date   = st.sidebar.date_input("End Date", date.today())
+
+dollar_per_credit = st.sidebar.number_input(
+    "Dollar Cost per Credit ($)",
+    min_value=0.0,
+    value=3.00,
+    step=0.01,
+    format="%.2f",
+    help="Enter your negotiated price per Snowflake credit."
+)
+
+if st.sidebar.button("Refresh data"):
+    st.cache_data.clear()
+    st.rerun()
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Header, freshness & KPIs
+# ──────────────────────────────────────────────────────────────────────────────
+st.title("💰 Snowflake AI Cost Dashboard")
+
+freshness = run_query(f"SELECT ROLLUP_NAME, LAST_DATE, REFRESHED_AT FROM {ROLLUP_SCHEMA}.ROLLUP_WATERMARKS")
+if freshness.empty:
+    st.error("Rollups are empty. Run REFRESH_AI_COST_ROLLUPS() from TRACKING.ipynb first.")
+    st.stop()
+st.caption("Data through " + ", ".join(
+    f"{row.ROLLUP_NAME}: {row.LAST_DATE}" for row in freshness.itertuples(index=False)
+))
+
+totals = rollup(
+    """
+    SELECT 'AI_SERVICES' AS SOURCE, SUM(CREDITS_USED) AS CREDITS
+    FROM {schema}.AI_SERVICE_DAILY WHERE USAGE_DATE BETWEEN ? AND ?
+    UNION ALL
+    SELECT 'FUNCTIONS', SUM(TOKEN_CREDITS)
+    FROM {schema}.CORTEX_FUNCTION_DAILY WHERE USAGE_DATE BETWEEN ? AND ?
+    UNION ALL
+    SELECT 'ANALYST', SUM(CREDITS)
+    FROM {schema}.CORTEX_ANALYST_DAILY WHERE USAGE_DATE BETWEEN ? AND ?
+    UNION ALL
+    SELECT 'SEARCH', SUM(CREDITS)
+    FROM {schema}.CORTEX_SEARCH_DAILY WHERE USAGE_DATE BETWEEN ? AND ?
+    """,
+    start_date,
+    end_date,
+).set_index("SOURCE")["CREDITS"].fillna(0)
+
+k1, k2, k3, k4, k5 = st.columns(5)
+k1.metric("AI Services Credits", f"{totals['AI_SERVICES']:,.2f}")
+k2.metric("Est. Cost ($)", f"${totals['AI_SERVICES'] * dollar_per_credit:,.2f}")
+k3.metric("Cortex Functions", f"{totals['FUNCTIONS']:,.2f}")
+k4.metric("Cortex Analyst", f"{totals['ANALYST']:,.2f}")
+k5.metric("Cortex Search", f"{totals['SEARCH']:,.2f}")
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Daily trend
+# ──────────────────────────────────────────────────────────────────────────────
+st.subheader("📅 Daily AI Credits")
+daily = rollup(
+    """
+    SELECT USAGE_DATE AS "Date", SUM(CREDITS_USED) AS "AI Services"
+    FROM {schema}.AI_SERVICE_DAILY
+    WHERE USAGE_DATE BETWEEN ? AND ?
+    GROUP BY 1 ORDER BY 1
+    """,
+    start_date,
+    end_date,
+)
+if not daily.empty:
+    st.line_chart(daily.set_index("Date"))
+else:
+    st.info("No AI Services usage in this range.")
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Cortex functions by function / model / user
+# ──────────────────────────────────────────────────────────────────────────────
+functions = rollup(
+    """
+    SELECT FUNCTION_NAME, MODEL_NAME, USER_NAME,
+           SUM(QUERY_COUNT) AS QUERIES, SUM(TOKENS) AS TOKENS, SUM(TOKEN_CREDITS) AS CREDITS
+    FROM {schema}.CORTEX_FUNCTION_DAILY
+    WHERE USAGE_DATE BETWEEN ? AND ?
+    GROUP BY 1, 2, 3
+    """,
+    start_date,
+    end_date,
+)
+
+st.subheader("🧠 Cortex Functions by Model")
+if not functions.empty:
+    st.bar_chart(functions.groupby("MODEL_NAME")["CREDITS"].sum().sort_values(ascending=False).head(10))
+    st.subheader("👥 Cortex Function Credits by User")
+    st.bar_chart(functions.groupby("USER_NAME")["CREDITS"].sum().sort_values(ascending=False).head(10))
+    with st.expander("Function × model × user detail"):
+        st.dataframe(functions.sort_values("CREDITS", ascending=False), use_container_width=True)
+else:
+    st.info("No Cortex function usage in this range.")
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Cortex Analyst & Cortex Search
+# ──────────────────────────────────────────────────────────────────────────────
+st.subheader("💬 Cortex Analyst")
+analyst = rollup(
+    """
+    SELECT USERNAME, SUM(REQUEST_COUNT) AS REQUESTS, SUM(CREDITS) AS CREDITS,
+           SUM(CREDITS) / NULLIF(SUM(REQUEST_COUNT), 0) AS CREDITS_PER_REQUEST
+    FROM {schema}.CORTEX_ANALYST_DAILY
+    WHERE USAGE_DATE BETWEEN ? AND ?
+    GROUP BY 1
+    ORDER BY CREDITS DESC
+    """,
+    start_date,
+    end_date,
+)
+if not analyst.empty:
+    st.dataframe(analyst, use_container_width=True)
+else:
+    st.info("No Cortex Analyst usage in this range.")
+
+st.subheader("🔎 Cortex Search")
+search = rollup(
+    """
+    SELECT DATABASE_NAME || '.' || SCHEMA_NAME || '.' || SERVICE_NAME AS SERVICE,
+           CONSUMPTION_TYPE, SUM(CREDITS) AS CREDITS
+    FROM {schema}.CORTEX_SEARCH_DAILY
+    WHERE USAGE_DATE BETWEEN ? AND ?
+    GROUP BY 1, 2
+    ORDER BY CREDITS DESC
+    """,
+    start_date,
+    end_date,
+)
+if not search.empty:
+    st.bar_chart(search.pivot_table(index="SERVICE", columns="CONSUMPTION_TYPE",
+                                    values="CREDITS", aggfunc="sum", fill_value=0))
+else:
+    st.info("No Cortex Search usage in this range.")
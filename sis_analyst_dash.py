@@ -1,9 +1,13 @@
-import _snowflake
-import json
 import streamlit as st
 import pandas as pd
 from snowflake.snowpark.context import get_active_session
 
+from analyst_intent import ai_classify
+from analyst_log_collector import enrichment_sql
+from analyst_query_costs import most_expensive_sql, request_costs, slowest_questions
+from analyst_sql_analysis import analyze, query_shapes
+from app_workloads import queue_report, use_workload
+
 # ──────────────────────────────────────────────────────────────────────────────
 # Configuration
 # ──────────────────────────────────────────────────────────────────────────────
@@ -13,84 +17,106 @@ STAGE        = "RAW_DATA"
 FILE_NAME    = "revenue_timeseries.yaml"
 STAGE_PATH   = f"@{DB}.{SCHEMA}.{STAGE}/{FILE_NAME}"
 
+# History table kept up to date by analyst_log_collector.py (covers every
+# semantic model). Set to None to read the live log for STAGE_PATH instead.
+HISTORY_TABLE = f"{DB}.{SCHEMA}.ANALYST_REQUESTS_HISTORY"
+
 # Credits charged per 1 000 successful messages for each semantic model
 CREDIT_RATE = {
     "default": 67,                 # fallback if model not listed below
     # "MY_MODEL": 72,              # example custom pricing
 }
 
+# Rows per page in the detail tables
+PAGE_SIZE = 100
+
+# Query results are cached for this long, keyed on the full SQL text (which
+# includes the log source) and the filter bind values
+CACHE_TTL_SECONDS = 600
+
+# (request_id, query_id) pairs recorded by the chat and batch apps
+QUERY_MAP_TABLE = f"{DB}.{SCHEMA}.ANALYST_QUERY_MAP"
+
 # ──────────────────────────────────────────────────────────────────────────────
-# Snowflake session & data load
+# Snowflake session & query layer
+# Filters and aggregations run in Snowflake; only aggregates and one page of
+# detail rows (never RESPONSE_BODY) are brought into pandas. Intent, complexity,
+# text response and table columns are precomputed in the history table; the
+# live log derives the same columns with the collector's SQL.
 # ──────────────────────────────────────────────────────────────────────────────
 session = get_active_session()
-
-query = f"""
-SELECT *
-FROM TABLE(
-  SNOWFLAKE.LOCAL.CORTEX_ANALYST_REQUESTS(
-    'FILE_ON_STAGE',
-    '{STAGE_PATH}'
+use_workload(session, "dashboard", app="sis_analyst_dash")
+
+LOG_SOURCE = HISTORY_TABLE or f"""
+(
+  SELECT *, {enrichment_sql()}
+  FROM TABLE(
+    SNOWFLAKE.LOCAL.CORTEX_ANALYST_REQUESTS(
+      'FILE_ON_STAGE',
+      '{STAGE_PATH}'
+    )
   )
 )
 """
 
-df = session.sql(query).to_pandas()
 
-if df.empty:
-    st.error("No Cortex Analyst log data found. Verify STAGE_PATH or permissions.")
-    st.stop()
+def build_filters(user: str = "All", model: str = "All", start_date=None, end_date=None):
+    """Return (WHERE clause, bind params) for the sidebar filters."""
+    clauses, params = [], []
+    if user != "All":
+        clauses.append("USER_NAME = ?")
+        params.append(user)
+    if model != "All":
+        clauses.append("SEMANTIC_MODEL_NAME = ?")
+        params.append(model)
+    if start_date is not None:
+        clauses.append("TO_DATE(TIMESTAMP) >= ?")
+        params.append(start_date)
+    if end_date is not None:
+        clauses.append("TO_DATE(TIMESTAMP) <= ?")
+        params.append(end_date)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    return where, params
 
-# ──────────────────────────────────────────────────────────────────────────────
-# Data preparation helpers
-# ──────────────────────────────────────────────────────────────────────────────
 
-# Parse timestamp column
-if "TIMESTAMP" in df.columns:
-    df["TIMESTAMP"] = pd.to_datetime(df["TIMESTAMP"])
+@st.cache_data(ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def run_query(sql: str, params: tuple) -> pd.DataFrame:
+    return session.sql(sql, params=list(params)).to_pandas()
 
-# Extract plain-text answer from RESPONSE_BODY JSON
 
-def extract_text_response(response: str | None) -> str | None:
-    if not isinstance(response, str):
-        return None
-    try:
-        content = json.loads(response)["message"]["content"]
-        for item in content:
-            if isinstance(item, dict) and "text" in item:
-                return item["text"]
-    except Exception:
-        pass
-    return None
+def query_logs(select_sql: str, filters, extra_params: list | None = None) -> pd.DataFrame:
+    """Run select_sql against the filtered log, exposed as the CTE `logs` (cached)."""
+    where, params = filters
+    sql = f"WITH logs AS (SELECT * FROM {LOG_SOURCE} {where}) {select_sql}"
+    return run_query(sql, tuple(params + (extra_params or [])))
+
 
-df["TEXT_RESPONSE"] = df["RESPONSE_BODY"].apply(extract_text_response)
+@st.cache_data(ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def cached_request_costs(start_date, end_date, user: str = "All", model: str = "All") -> pd.DataFrame:
+    # User and model live in the request log, so filter pairs by its REQUEST_IDs
+    requests = None
+    if user != "All" or model != "All":
+        where, params = build_filters(user, model, start_date, end_date)
+        requests = (f"SELECT REQUEST_ID FROM {LOG_SOURCE} {where}", params)
+    return request_costs(session, QUERY_MAP_TABLE, start_date, end_date, requests)
 
-# Heuristic intent classification
 
-def classify_intent(question: str | None) -> str:
-    if not isinstance(question, str):
-        return "Other"
-    q = question.lower()
-    if any(w in q for w in ["trend", "over time", "daily", "weekly", "monthly"]):
-        return "Trend Analysis"
-    if any(w in q for w in ["average", "sum", "count", "aggregate"]):
-        return "Aggregation"
-    if " vs " in q or "compare" in q:
-        return "Comparison"
-    if "anomaly" in q or "unexpected" in q:
-        return "Anomaly Detection"
-    return "Other"
+@st.cache_data(ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def cached_query_shapes(days: int) -> pd.DataFrame:
+    return query_shapes(session, LOG_SOURCE, days=days)
 
-df["INTENT"] = df["LATEST_QUESTION"].apply(classify_intent)
 
-# Simple query complexity metric
+@st.cache_data(ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def cached_queue_report(days: int) -> pd.DataFrame:
+    return queue_report(session, days=days)
 
-def query_complexity(sql: str | None) -> int:
-    if not isinstance(sql, str):
-        return 0
-    s = sql.upper()
-    return s.count("SELECT") + s.count("JOIN") + s.count("WITH")
 
-df["COMPLEXITY_SCORE"] = df["GENERATED_SQL"].apply(query_complexity)
+def distinct_values(column: str, filters) -> list:
+    values = query_logs(
+        f"SELECT DISTINCT {column} AS VALUE FROM logs WHERE {column} IS NOT NULL ORDER BY 1", filters
+    )
+    return values["VALUE"].tolist()
+
 
 # ──────────────────────────────────────────────────────────────────────────────
 # Sidebar filters
@@ -99,22 +125,26 @@ st.sidebar.title("Filters")
 
 selected_user = st.sidebar.selectbox(
     "User",
-    ["All"] + sorted(df["USER_NAME"].dropna().unique().tolist())
+    ["All"] + distinct_values("USER_NAME", build_filters())
 )
-if selected_user != "All":
-    df = df[df["USER_NAME"] == selected_user]
 
 selected_model = st.sidebar.selectbox(
     "Semantic Model",
-    ["All"] + sorted(df["SEMANTIC_MODEL_NAME"].dropna().unique().tolist())
+    ["All"] + distinct_values("SEMANTIC_MODEL_NAME", build_filters(selected_user))
 )
-if selected_model != "All":
-    df = df[df["SEMANTIC_MODEL_NAME"] == selected_model]
 
-start_date = st.sidebar.date_input("Start Date", df["TIMESTAMP"].min().date())
-end_date   = st.sidebar.date_input("End Date", df["TIMESTAMP"].max().date())
+bounds = query_logs(
+    "SELECT MIN(TIMESTAMP) AS FIRST_TS, MAX(TIMESTAMP) AS LAST_TS FROM logs",
+    build_filters(selected_user, selected_model),
+)
+if bounds.empty or pd.isna(bounds["FIRST_TS"].iloc[0]):
+    st.error("No Cortex Analyst log data found. Verify HISTORY_TABLE / STAGE_PATH or permissions.")
+    st.stop()
 
-df = df[(df["TIMESTAMP"].dt.date >= start_date) & (df["TIMESTAMP"].dt.date <= end_date)]
+start_date = st.sidebar.date_input("Start Date", pd.to_datetime(bounds["FIRST_TS"].iloc[0]).date())
+end_date   = st.sidebar.date_input("End Date", pd.to_datetime(bounds["LAST_TS"].iloc[0]).date())
+
+filters = build_filters(selected_user, selected_model, start_date, end_date)
 
 # Dollar-per-credit input (replaces search box)
 dollar_per_credit = st.sidebar.number_input(
@@ -126,13 +156,28 @@ dollar_per_credit = st.sidebar.number_input(
     help="Enter your negotiated price per Snowflake credit."
 )
 
+# Keyword intents are precomputed; AI_CLASSIFY relabels distinct questions on demand
+use_ai_intent = st.sidebar.checkbox(
+    "Classify intents with AI_CLASSIFY",
+    value=False,
+    help="Uses the same taxonomy as the keyword classifier (analyst_intent.py). Consumes Cortex credits."
+)
+
+if st.sidebar.button("Refresh data"):
+    st.cache_data.clear()
+    st.rerun()
+
 # ──────────────────────────────────────────────────────────────────────────────
 # Dashboard header & KPIs
 # ──────────────────────────────────────────────────────────────────────────────
 st.title("📊 Snowflake Cortex Analyst Dashboard")
 
-total_requests      = len(df)
-successful_requests = df["GENERATED_SQL"].notna().sum()
+kpis = query_logs(
+    "SELECT COUNT(*) AS TOTAL, COUNT(GENERATED_SQL) AS SUCCESSFUL FROM logs", filters
+).iloc[0]
+
+total_requests      = int(kpis["TOTAL"])
+successful_requests = int(kpis["SUCCESSFUL"])
 failure_rate        = 0.0 if total_requests == 0 else 100 * (total_requests - successful_requests) / total_requests
 
 current_rate = CREDIT_RATE.get(selected_model, CREDIT_RATE["default"])
@@ -146,13 +191,43 @@ kpi3.metric("Failure Rate", f"{failure_rate:.1f}%")
 kpi4.metric("Est. Credits Used", f"{credits_used:,.2f}")
 kpi5.metric("Est. Cost ($)", f"${cost_estimate:,.2f}")
 
+# ──────────────────────────────────────────────────────────────────────────────
+# Measured cost & latency (ACCOUNT_USAGE joined on recorded query IDs)
+# ──────────────────────────────────────────────────────────────────────────────
+st.subheader("💸 Measured Cost & Latency per Question")
+with st.expander("Show measured cost (reads ACCOUNT_USAGE, lags by a few hours)"):
+    try:
+        costs = cached_request_costs(start_date, end_date, selected_user, selected_model)
+    except Exception as e:
+        costs = None
+        st.info(f"No recorded query IDs available ({e}).")
+    if costs is not None and not costs.empty:
+        m1, m2, m3, m4 = st.columns(4)
+        m1.metric("Recorded Questions", costs["REQUEST_ID"].nunique())
+        m2.metric("Measured Credits", f"{costs['TOTAL_CREDITS'].sum():,.4f}")
+        m3.metric("Measured Cost ($)", f"${costs['TOTAL_CREDITS'].sum() * dollar_per_credit:,.2f}")
+        m4.metric("Median End-to-End", f"{costs['END_TO_END_MS'].median() / 1000:,.1f}s")
+
+        st.markdown("**Slowest questions**")
+        st.dataframe(slowest_questions(costs), use_container_width=True)
+        st.markdown("**Most expensive generated SQL**")
+        st.dataframe(most_expensive_sql(costs), use_container_width=True)
+    elif costs is not None:
+        st.info("No recorded questions in this date range.")
+
 # ──────────────────────────────────────────────────────────────────────────────
 # Daily usage trend
 # ──────────────────────────────────────────────────────────────────────────────
 st.subheader("📅 Daily Usage Trend")
-if not df.empty:
-    daily_counts = df.groupby(df["TIMESTAMP"].dt.date).size().reset_index(name="total_requests")
-    st.line_chart(daily_counts.rename(columns={"TIMESTAMP": "Date"}).set_index("Date"))
+if total_requests:
+    daily_counts = query_logs(
+        """
+        SELECT TO_DATE(TIMESTAMP) AS "Date", COUNT(*) AS "total_requests"
+        FROM logs GROUP BY 1 ORDER BY 1
+        """,
+        filters,
+    )
+    st.line_chart(daily_counts.set_index("Date"))
 else:
     st.info("No data after filters.")
 
@@ -160,8 +235,19 @@ else:
 # Intent distribution
 # ──────────────────────────────────────────────────────────────────────────────
 st.subheader("🧠 Question Intent Distribution")
-if not df.empty:
-    st.bar_chart(df["INTENT"].value_counts())
+if total_requests:
+    if use_ai_intent:
+        # Label each distinct question once and weight it by how often it was asked
+        question_counts = query_logs(
+            "SELECT LATEST_QUESTION, COUNT(*) AS N FROM logs GROUP BY 1", filters
+        )
+        question_counts["INTENT"] = ai_classify(session, question_counts["LATEST_QUESTION"])
+        intent_counts = question_counts.groupby("INTENT", as_index=False)["N"].sum()
+    else:
+        intent_counts = query_logs(
+            "SELECT INTENT, COUNT(*) AS N FROM logs GROUP BY 1 ORDER BY 2 DESC", filters
+        )
+    st.bar_chart(intent_counts.set_index("INTENT")["N"])
 else:
     st.info("No data to display intent distribution.")
 
@@ -169,30 +255,75 @@ else:
 # Questions with generated SQL
 # ──────────────────────────────────────────────────────────────────────────────
 st.subheader("🙋 Questions by User with Generated SQL")
-questions_df = df[[
-    "TIMESTAMP", "REQUEST_ID", "USER_NAME", "LATEST_QUESTION", "TEXT_RESPONSE",
-    "GENERATED_SQL", "INTENT", "COMPLEXITY_SCORE"
-]].rename(columns={"LATEST_QUESTION": "QUESTION"}).sort_values("TIMESTAMP", ascending=False)
+num_pages = max(1, -(-total_requests // PAGE_SIZE))
+page = st.number_input(f"Page (of {num_pages})", min_value=1, max_value=num_pages, value=1, step=1)
+
+questions_df = query_logs(
+    """
+    SELECT TIMESTAMP, REQUEST_ID, USER_NAME, LATEST_QUESTION AS QUESTION,
+           TEXT_RESPONSE, GENERATED_SQL, INTENT, COMPLEXITY_SCORE, TABLE_COUNT
+    FROM logs
+    ORDER BY TIMESTAMP DESC
+    LIMIT ? OFFSET ?
+    """,
+    filters,
+    [PAGE_SIZE, (page - 1) * PAGE_SIZE],
+)
+
+if use_ai_intent:
+    questions_df["INTENT"] = ai_classify(session, questions_df["QUESTION"])
+
+# Parsed SQL structure (cached per statement) instead of keyword counts
+sql_features = analyze(questions_df["GENERATED_SQL"])
+questions_df["COMPLEXITY_SCORE"] = sql_features["complexity_score"]
+questions_df[["JOINS", "CTES", "SUBQUERY_DEPTH", "WINDOWS"]] = sql_features[
+    ["joins", "ctes", "subquery_depth", "windows"]
+]
 
 st.dataframe(questions_df, use_container_width=True)
 
+# ──────────────────────────────────────────────────────────────────────────────
+# Query shapes vs. warehouse elapsed time
+# ──────────────────────────────────────────────────────────────────────────────
+st.subheader("🐢 Expensive Query Shapes")
+with st.expander("Show elapsed time by query shape (reads ACCOUNT_USAGE.QUERY_HISTORY)"):
+    shapes = cached_query_shapes(30)
+    if not shapes.empty:
+        st.dataframe(shapes, use_container_width=True)
+    else:
+        st.info("No executions of generated SQL found in QUERY_HISTORY yet.")
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Queueing per workload class (QUERY_TAG set by app_workloads.py)
+# ──────────────────────────────────────────────────────────────────────────────
+st.subheader("🚦 Queueing by Workload")
+with st.expander("Show queued time per workload class (reads ACCOUNT_USAGE.QUERY_HISTORY)"):
+    queues = cached_queue_report(7)
+    if not queues.empty:
+        st.bar_chart(queues.groupby("WORKLOAD")["P95_QUEUED_S"].max())
+        st.dataframe(queues, use_container_width=True)
+    else:
+        st.info("No tagged app queries in QUERY_HISTORY yet.")
+
 # ──────────────────────────────────────────────────────────────────────────────
 # Most referenced tables
 # ──────────────────────────────────────────────────────────────────────────────
 st.subheader("📃 Most Referenced Tables")
 
-def extract_tables(value: str | None):
-    if not isinstance(value, str):
-        return []
-    try:
-        return json.loads(value.replace("\n", "").replace("'", '"'))
-    except Exception:
-        return []
-
-if df["TABLES_REFERENCED"].notna().any():
-    table_series = df["TABLES_REFERENCED"].dropna().apply(extract_tables)
-    flat_tables  = pd.Series([t for sub in table_series for t in sub])
-    st.bar_chart(flat_tables.value_counts().head(10))
+table_counts = query_logs(
+    """
+    SELECT t.value::VARCHAR AS TABLE_NAME, COUNT(*) AS N
+    FROM logs,
+         LATERAL SPLIT_TO_TABLE(TABLE_LIST, ',') t
+    WHERE TABLE_COUNT > 0
+    GROUP BY 1
+    ORDER BY 2 DESC
+    LIMIT 10
+    """,
+    filters,
+)
+if not table_counts.empty:
+    st.bar_chart(table_counts.set_index("TABLE_NAME")["N"])
 else:
     st.info("No table reference data.")
 
@@ -201,21 +332,33 @@ else:
 # ──────────────────────────────────────────────────────────────────────────────
 st.subheader("⚠️ Requests with Warnings")
 with st.expander("Show Warnings"):
-    warn_df = df[
-        df["WARNINGS"].notna() &
-        (df["WARNINGS"].str.lower() != "null") &
-        (df["WARNINGS"] != "[]")
-    ][["TIMESTAMP", "USER_NAME", "LATEST_QUESTION", "WARNINGS"]].rename(columns={"LATEST_QUESTION": "QUESTION"})
+    warn_df = query_logs(
+        """
+        SELECT TIMESTAMP, USER_NAME, LATEST_QUESTION AS QUESTION, WARNINGS
+        FROM logs
+        WHERE HAS_WARNINGS
+        ORDER BY TIMESTAMP DESC
+        LIMIT ?
+        """,
+        filters,
+        [PAGE_SIZE],
+    )
     st.dataframe(warn_df, use_container_width=True)
 
 st.subheader("🚨 Top Warning Patterns")
-warning_series = df["WARNINGS"][
-    df["WARNINGS"].notna() &
-    (df["WARNINGS"].str.lower() != "null") &
-    (df["WARNINGS"] != "[]")
-]
-if not warning_series.empty:
-    st.bar_chart(warning_series.value_counts().head(10))
+warning_counts = query_logs(
+    """
+    SELECT TO_VARCHAR(WARNINGS) AS WARNING, COUNT(*) AS N
+    FROM logs
+    WHERE HAS_WARNINGS
+    GROUP BY 1
+    ORDER BY 2 DESC
+    LIMIT 10
+    """,
+    filters,
+)
+if not warning_counts.empty:
+    st.bar_chart(warning_counts.set_index("WARNING")["N"])
 else:
     st.info("No warnings to summarize.")
 
@@ -224,29 +367,43 @@ else:
 # ──────────────────────────────────────────────────────────────────────────────
 st.subheader("🚫 Failed Requests")
 with st.expander("Show Failed Requests"):
-    failed_df = df[df["GENERATED_SQL"].isnull()][[
-        "TIMESTAMP", "USER_NAME", "LATEST_QUESTION", "RESPONSE_STATUS_CODE", "WARNINGS"
-    ]].rename(columns={"LATEST_QUESTION": "QUESTION"})
+    failed_df = query_logs(
+        """
+        SELECT TIMESTAMP, USER_NAME, LATEST_QUESTION AS QUESTION, RESPONSE_STATUS_CODE, WARNINGS
+        FROM logs
+        WHERE GENERATED_SQL IS NULL
+        ORDER BY TIMESTAMP DESC
+        LIMIT ?
+        """,
+        filters,
+        [PAGE_SIZE],
+    )
     st.dataframe(failed_df, use_container_width=True)
 
 # ──────────────────────────────────────────────────────────────────────────────
-# Requests per user
+# Requests per user & success vs failure by user
 # ──────────────────────────────────────────────────────────────────────────────
+user_counts = query_logs(
+    """
+    SELECT USER_NAME,
+           COUNT(*) AS TOTAL,
+           COUNT(GENERATED_SQL) AS SUCCESS,
+           COUNT(*) - COUNT(GENERATED_SQL) AS FAILURE
+    FROM logs
+    GROUP BY 1
+    ORDER BY TOTAL DESC
+    """,
+    filters,
+).set_index("USER_NAME")
+
 st.subheader("👥 Requests Per User")
-if not df.empty:
-    st.bar_chart(df["USER_NAME"].value_counts())
+if not user_counts.empty:
+    st.bar_chart(user_counts["TOTAL"])
 else:
     st.info("No user data available.")
 
-# ──────────────────────────────────────────────────────────────────────────────
-# Success vs failure by user
-# ──────────────────────────────────────────────────────────────────────────────
 st.subheader("✅ Success vs ❌ Failure by User")
-
-if not df.empty:
-    df["SUCCESS"] = df["GENERATED_SQL"].notna()
-    sf_df = df.groupby(["USER_NAME", "SUCCESS"]).size().unstack(fill_value=0)
-    sf_df["Total"] = sf_df.sum(axis=1)          # ← axis=1 closes the paren
-    st.bar_chart(sf_df.drop(columns="Total"))
+if not user_counts.empty:
+    st.bar_chart(user_counts[["SUCCESS", "FAILURE"]])
 else:
-    st.info("No success/failure data for selected filters.")
\ No newline at end of file
+    st.info("No success/failure data for selected filters.")
@@ -0,0 +1,164 @@
+#------------------------------------------------------------------------------
+# SQL GUARDRAIL
+# Pre-execution cost check for Cortex Analyst generated SQL.
+#
+# - estimate() runs EXPLAIN USING JSON (compiles the statement, scans nothing)
+#   and reads the partitions and bytes the plan would scan
+# - check() compares the estimate with the semantic model's policy and decides:
+#     allow   - within budget
+#     reject  - over budget, do not run
+#     limit   - over budget, run wrapped in SELECT * FROM (...) LIMIT n
+#     route   - over budget, run on the policy's larger warehouse
+# - record_decision() stores the decision and estimates next to the query id
+#   in GUARDRAIL_DECISIONS_TABLE
+#
+# Policies are keyed by semantic model file name (e.g. "revenue.yaml"); models
+# without an entry use DEFAULT_POLICY.
+#
+# Usage:
+#   decision = check(session, sql, "revenue.yaml")
+#   if decision["decision"] != "reject":
+#       with workload(session, "interactive", app, warehouse=decision["warehouse"]):
+#           df = session.sql(decision["statement"]).to_pandas()
+#
+# Routing itself goes through app_workloads.workload(), which also tags the query.
+#------------------------------------------------------------------------------
+
+import json
+
+GUARDRAIL_DECISIONS_TABLE = "ANALYST_GUARDRAIL_DECISIONS"
+
+GB = 1024 ** 3
+
+DEFAULT_POLICY = {
+    "max_bytes": 50 * GB,        # bytes the plan may scan
+    "max_partitions": 10000,     # micro-partitions the plan may scan
+    "action": "reject",          # what to do when over budget: reject | limit | route
+    "limit_rows": 1000,          # row cap for action "limit"
+    "warehouse": None,           # warehouse for action "route"
+}
+
+# Per semantic model overrides of DEFAULT_POLICY
+POLICIES = {
+    # "revenue_timeseries.yaml": {"max_bytes": 200 * GB, "action": "route", "warehouse": "ANALYST_XL_WH"},
+    # "sales_detail.yaml": {"action": "limit", "limit_rows": 500},
+}
+
+_ensured = set()
+
+
+def policy_for(semantic_model: str, policies: dict = None) -> dict:
+    """DEFAULT_POLICY merged with the overrides for a model path or file name."""
+    policies = POLICIES if policies is None else policies
+    name = (semantic_model or "").rstrip("/").split("/")[-1]
+    return {**DEFAULT_POLICY, **policies.get(semantic_model, policies.get(name, {}))}
+
+
+def estimate(session, sql: str) -> dict:
+    """Partitions, bytes and tables the compiled plan would scan."""
+    plan = json.loads(session.sql(f"EXPLAIN USING JSON {sql}").collect()[0][0])
+    stats = plan.get("GlobalStats", {})
+    tables = {
+        obj
+        for step in plan.get("Operations", [])
+        for op in step
+        for obj in op.get("objects", [])
+    }
+    return {
+        "partitions_total": stats.get("partitionsTotal", 0),
+        "partitions_assigned": stats.get("partitionsAssigned", 0),
+        "bytes_assigned": stats.get("bytesAssigned", 0),
+        "tables": sorted(tables),
+    }
+
+
+def check(session, sql: str, semantic_model: str = None, policies: dict = None) -> dict:
+    """
+    Estimate a statement and decide how (or whether) to run it.
+
+    Args:
+        session: Snowpark session.
+        sql: Generated statement.
+        semantic_model: Semantic model path or file name, used to pick the policy.
+        policies: Overrides for POLICIES.
+
+    Returns:
+        dict with decision, reason, statement (possibly rewritten), warehouse
+        and the estimate() fields. If EXPLAIN fails the statement is allowed
+        and its own execution reports the error.
+    """
+    policy = policy_for(semantic_model, policies)
+    statement = sql.rstrip().rstrip(";")
+    decision = {
+        "semantic_model": semantic_model,
+        "decision": "allow",
+        "reason": "",
+        "statement": statement,
+        "warehouse": None,
+        "partitions_total": None,
+        "partitions_assigned": None,
+        "bytes_assigned": None,
+        "tables": [],
+    }
+    try:
+        decision.update(estimate(session, statement))
+    except Exception as e:
+        decision["reason"] = f"EXPLAIN failed: {e}"
+        return decision
+
+    over = []
+    if decision["bytes_assigned"] > policy["max_bytes"]:
+        over.append(f"{decision['bytes_assigned'] / GB:,.1f} GB > {policy['max_bytes'] / GB:,.1f} GB")
+    if decision["partitions_assigned"] > policy["max_partitions"]:
+        over.append(f"{decision['partitions_assigned']:,} partitions > {policy['max_partitions']:,}")
+    if not over:
+        return decision
+
+    decision["reason"] = "; ".join(over)
+    action = policy["action"]
+    if action == "limit":
+        decision["statement"] = f"SELECT * FROM ({statement}) LIMIT {int(policy['limit_rows'])}"
+    elif action == "route" and policy["warehouse"]:
+        decision["warehouse"] = policy["warehouse"]
+    else:
+        action = "reject"
+    decision["decision"] = action
+    return decision
+
+
+def ensure_table(session, table: str = GUARDRAIL_DECISIONS_TABLE) -> None:
+    """Create the decisions table once per process."""
+    if table in _ensured:
+        return
+    session.sql(f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            RECORDED_AT TIMESTAMP_LTZ,
+            SOURCE_APP VARCHAR,
+            SEMANTIC_MODEL VARCHAR,
+            REQUEST_ID VARCHAR,
+            QUERY_ID VARCHAR,              -- NULL when rejected
+            DECISION VARCHAR,
+            REASON VARCHAR,
+            WAREHOUSE VARCHAR,
+            PARTITIONS_TOTAL NUMBER,
+            PARTITIONS_ASSIGNED NUMBER,
+            BYTES_ASSIGNED NUMBER,
+            TABLES ARRAY,
+            STATEMENT VARCHAR
+        )
+    """).collect()
+    _ensured.add(table)
+
+
+def record_decision(session, decision: dict, source_app: str, request_id: str = None,
+                    query_id: str = None, table: str = GUARDRAIL_DECISIONS_TABLE) -> None:
+    """Persist one check() result next to the query id it produced."""
+    ensure_table(session, table)
+    session.sql(f"""
+        INSERT INTO {table} (RECORDED_AT, SOURCE_APP, SEMANTIC_MODEL, REQUEST_ID, QUERY_ID, DECISION, REASON,
+                             WAREHOUSE, PARTITIONS_TOTAL, PARTITIONS_ASSIGNED, BYTES_ASSIGNED, TABLES, STATEMENT)
+        SELECT CURRENT_TIMESTAMP(), ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, PARSE_JSON(?), ?
+    """, params=[source_app, decision["semantic_model"], request_id, query_id, decision["decision"],
+                 decision["reason"], decision["warehouse"], decision["partitions_total"],
+                 decision["partitions_assigned"], decision["bytes_assigned"],
+                 json.dumps(decision["tables"]), decision["statement"]]).collect()
@@ -1,6 +1,7 @@
 #------------------------------------------------------------------------------
 # IMPORTS
 # USE PACKAGE DROPDOWN IN STREAMLIT IN SNOWFLAKE FOR:
+# - pyyaml
 # - snowflake-snowpark-python
 # - streamlit
 #------------------------------------------------------------------------------
@@ -10,25 +11,124 @@ import _snowflake
 import json
 import streamlit as st
 import time
+import uuid
+from itertools import chain
 import pandas as pd
 from snowflake.snowpark.context import get_active_session
 
+from analyst_query_costs import record_query
+from analyst_charts import chart_data, chart_spec, fetch_result, warehouse_chart_data
+from app_workloads import use_workload, workload
+from semantic_model_registry import clear_cache, list_models, load_model
+from sql_guardrail import check, record_decision
+
 DATABASE = "<your_database_name>"
 SCHEMA = "<your_schema_name>"
 STAGE = "<your_stage_name>"
 
-def get_yaml_files():
-    session = get_active_session()
-    result = session.sql(f"LIST @{DATABASE}.{SCHEMA}.{STAGE}").collect()
-    yaml_files = [row['name'].split('/')[-1] for row in result if row['name'].endswith('.yaml')]
-    return yaml_files
+# (request_id, query_id) pairs are persisted here for analyst_query_costs.py
+QUERY_MAP_TABLE = f"{DATABASE}.{SCHEMA}.ANALYST_QUERY_MAP"
+
+# Generated SQL runs as an async job; Snowflake cancels it after this many seconds
+STATEMENT_TIMEOUT_SECONDS = 120
+POLL_INTERVAL_SECONDS = 0.5
+
+# Workload class and app name for routing and QUERY_TAG (see app_workloads.py)
+APP_NAME = "streamlit_cortex_analyst"
+WORKLOAD = "interactive"
+
+# Guardrail decisions (see sql_guardrail.POLICIES) are recorded here
+GUARDRAIL_TABLE = f"{DATABASE}.{SCHEMA}.ANALYST_GUARDRAIL_DECISIONS"
+
+def ensure_statement_timeout(session) -> None:
+    """Applies STATEMENT_TIMEOUT_SECONDS to this app's session once."""
+    if st.session_state.get("statement_timeout_set"):
+        return
+    session.sql(f"ALTER SESSION SET STATEMENT_TIMEOUT_IN_SECONDS = {int(STATEMENT_TIMEOUT_SECONDS)}").collect()
+    st.session_state.statement_timeout_set = True
+
+def submit_sql(session, statement: str, semantic_model: str, request_id: str = None):
+    """
+    Checks a statement with the cost guardrail and submits it as an async job.
+
+    Returns (job, decision); job is None when the guardrail rejects the query.
+    """
+    ensure_statement_timeout(session)
+    decision = check(session, statement, semantic_model)
+    job = None
+    if decision["decision"] != "reject":
+        with workload(session, WORKLOAD, APP_NAME, st.session_state.get("run_id"), request_id,
+                      warehouse=decision["warehouse"]):
+            job = session.sql(decision["statement"]).collect_nowait()
+    try:
+        record_decision(session, decision, "streamlit_cortex_analyst", request_id,
+                        job.query_id if job else None, table=GUARDRAIL_TABLE)
+    except Exception as e:
+        st.warning(f"Could not record guardrail decision: {e}")
+    return job, decision
+
+def run_sql_async(key: tuple, statement: str, semantic_model: str = None, submitted: tuple = None) -> dict:
+    """
+    Runs a generated statement as an async job and returns its cached result.
+
+    The entry in st.session_state.sql_results keeps the query id, so a rerun
+    (e.g. the Cancel button) resumes polling the same query instead of
+    submitting it again, and chat history is rendered without re-running SQL.
+    submitted is a (job, decision) pair from submit_sql() if the statement was
+    already started. Returns a dict with status ("done", "failed", "cancelled"
+    or "rejected"), query_id, guardrail, df, truncated and error; df holds at
+    most analyst_charts.MAX_FETCH_ROWS rows.
+    """
+    results = st.session_state.setdefault("sql_results", {})
+    entry = results.get(key)
+    if entry is not None and entry["status"] != "running":
+        return entry
 
-def get_yaml_content(file_name):
     session = get_active_session()
-    result = session.sql(f"SELECT $1 FROM @{DATABASE}.{SCHEMA}.{STAGE}/{file_name}").collect()
-    if result:
-        return '\n'.join([row[0] for row in result])
-    return "No content found"
+    if entry is None:
+        job, decision = submitted or submit_sql(
+            session, statement, semantic_model, st.session_state.get("current_request_id")
+        )
+        entry = results[key] = {
+            "status": "running" if job else "rejected",
+            "query_id": job.query_id if job else None,
+            "guardrail": decision,
+            "started": time.time(),
+            "df": None,
+            "truncated": False,
+            "chart": None,
+            "error": None if job else decision["reason"],
+        }
+        if job is None:
+            return entry
+    else:
+        job = session.create_async_job(entry["query_id"])
+
+    cancel_slot, status_slot = st.empty(), st.empty()
+    if cancel_slot.button("⏹ Cancel query", key=f"cancel_{entry['query_id']}"):
+        session.sql("SELECT SYSTEM$CANCEL_QUERY(?)", params=[entry["query_id"]]).collect()
+        entry["status"] = "cancelled"
+        cancel_slot.empty()
+        return entry
+
+    while not job.is_done():
+        status_slot.caption(
+            f"Running SQL… {time.time() - entry['started']:.0f}s "
+            f"(timeout {STATEMENT_TIMEOUT_SECONDS}s)"
+        )
+        time.sleep(POLL_INTERVAL_SECONDS)
+    cancel_slot.empty()
+    status_slot.empty()
+
+    try:
+        # Wait for success (raises on failure), then read a bounded page of the result
+        job.result(result_type="no_result")
+        entry["df"], entry["truncated"] = fetch_result(session, entry["query_id"])
+        entry["status"] = "done"
+    except Exception as e:
+        entry["error"] = str(e)
+        entry["status"] = "failed"
+    return entry
 
 def send_message(prompt: str, file: str) -> dict:
     """Calls the REST API and returns the response."""
@@ -62,6 +162,144 @@ def send_message(prompt: str, file: str) -> dict:
             f"Failed request with status {resp['status']}: {resp}"
         )
 
+def parse_sse(stream):
+    """
+    Yields (event, data) pairs from a server-sent event stream.
+
+    Accepts the whole body as one string or an iterable of text/bytes chunks.
+    Chunks are consumed lazily, so with a transport that really streams each
+    event is yielded as soon as it is complete.
+    """
+    if isinstance(stream, (str, bytes)):
+        stream = [stream]
+
+    buffer = ""
+    event, data = "message", []
+    # The trailing blank line flushes an event the body did not terminate
+    for chunk in chain(stream, ["\n\n"]):
+        buffer += chunk.decode("utf-8") if isinstance(chunk, bytes) else chunk
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            line = line.rstrip("\r")
+            if not line:
+                # A blank line ends the event
+                if data:
+                    yield event, json.loads("\n".join(data))
+                event, data = "message", []
+            elif line.startswith("event:"):
+                event = line[len("event:"):].strip()
+            elif line.startswith("data:"):
+                data.append(line[len("data:"):].lstrip())
+
+
+def stream_message(prompt: str, file: str):
+    """
+    Calls the REST API in streaming mode and yields (event, data) pairs.
+
+    In Streamlit in Snowflake, _snowflake.send_snow_api_request returns the
+    whole response body at once: nothing can be shown until the Analyst has
+    finished, so a spinner covers the request and the events are replayed
+    afterwards.
+    """
+    request_body = {
+        "messages": [
+            {"role": "user", "content": [{"type": "text", "text": prompt}]}
+        ],
+        "semantic_model_file": f"@{DATABASE}.{SCHEMA}.{STAGE}/{file}",
+        "stream": True,
+    }
+    with st.spinner("Generating response..."):
+        resp = _snowflake.send_snow_api_request(
+            "POST",
+            "/api/v2/cortex/analyst/message",
+            {},
+            {},
+            request_body,
+            {},
+            30000,
+        )
+    if resp["status"] >= 400:
+        raise Exception(
+            f"Failed request with status {resp['status']}: {resp}"
+        )
+
+    body = resp["content"]
+    if isinstance(body, str) and body.lstrip().startswith("["):
+        # Some runtimes hand back the buffered stream as a JSON list of events
+        for item in json.loads(body):
+            yield item.get("event", "message"), item.get("data", {})
+    else:
+        yield from parse_sse(body)
+
+
+def stream_response(prompt: str, file: str):
+    """
+    Renders a streamed Analyst response event by event (experimental, off by
+    default behind the "Stream responses" checkbox).
+
+    Text is shown delta by delta, and each SQL statement starts running
+    asynchronously as soon as its content block is complete (i.e. when a later
+    block starts or the stream ends). Because the body is buffered (see
+    stream_message), in Streamlit in Snowflake this all happens right after
+    the full response has arrived. Returns (content, request_id, jobs,
+    analyst_ms) where jobs maps content positions to submit_sql() results.
+    """
+    session = get_active_session()
+    status = st.empty()
+    blocks = {}
+    jobs = {}
+    request_id = "Unknown"
+    started = time.perf_counter()
+
+    def start_completed_sql(before=None):
+        for index, block in blocks.items():
+            if block["type"] == "sql" and index not in jobs and (before is None or index < before):
+                jobs[index] = submit_sql(session, block["statement"], file, request_id)
+
+    for event, data in stream_message(prompt, file):
+        if isinstance(data, dict):
+            request_id = data.get("request_id", request_id)
+
+        if event == "status":
+            status.caption(f"⏳ {data.get('status_message') or data.get('status', '')}")
+
+        elif event == "message.content.delta":
+            index = data["index"]
+            start_completed_sql(before=index)
+            block = blocks.setdefault(index, {"type": data["type"], "placeholder": st.empty()})
+            if data["type"] == "text":
+                block["text"] = block.get("text", "") + data.get("text_delta", "")
+                block["placeholder"].markdown(block["text"])
+            elif data["type"] == "sql":
+                block["statement"] = block.get("statement", "") + data.get("statement_delta", "")
+                block["placeholder"].code(block["statement"], language="sql")
+            elif data["type"] == "suggestions":
+                delta = data.get("suggestions_delta", {})
+                suggestions = block.setdefault("suggestions", {})
+                suggestions[delta.get("index", 0)] = (
+                    suggestions.get(delta.get("index", 0), "") + delta.get("suggestion_delta", "")
+                )
+
+        elif event == "error":
+            raise Exception(f"Cortex Analyst error: {data}")
+
+    start_completed_sql()
+    analyst_ms = (time.perf_counter() - started) * 1000
+
+    # Replace the live preview with the regular rendering done by display_content
+    status.empty()
+    content, position_jobs = [], {}
+    for index in sorted(blocks):
+        block = blocks.pop(index)
+        block.pop("placeholder").empty()
+        if block["type"] == "suggestions":
+            block["suggestions"] = [block["suggestions"][i] for i in sorted(block["suggestions"])]
+        if index in jobs:
+            position_jobs[len(content)] = jobs[index]
+        content.append(block)
+    return content, request_id, position_jobs, analyst_ms
+
+
 def process_message(prompt: str, file: str) -> None:
     """Processes a message and adds the response to the chat."""
     # Append the user prompt to session state
@@ -72,36 +310,57 @@ def process_message(prompt: str, file: str) -> None:
         st.markdown(prompt)
 
     with st.chat_message("assistant"):
-        with st.spinner("Generating response..."):
-            response = send_message(prompt=prompt, file=file)
+        if st.session_state.get("stream_responses", False):
+            content, request_id, jobs, analyst_ms = stream_response(prompt=prompt, file=file)
+        else:
+            with st.spinner("Generating response..."):
+                started = time.perf_counter()
+                response = send_message(prompt=prompt, file=file)
+                analyst_ms = (time.perf_counter() - started) * 1000
 
             # Get the request_id from the API response
             request_id = response.get("request_id", "Unknown")
+            content = response["message"]["content"]
+            jobs = None
+
+        # Store the current request so display_content can reference it
+        st.session_state.current_request_id = request_id
+        st.session_state.current_request = {
+            "semantic_model": file,
+            "question": prompt,
+            "analyst_ms": analyst_ms,
+        }
 
-            # Store the current request ID so display_content can reference it
-            st.session_state.current_request_id = request_id
+        # Store the assistant's content + request ID in session state before
+        # running its SQL, so a rerun (e.g. Cancel) finds the message in history
+        st.session_state.messages.append(
+            {
+                "role": "assistant",
+                "content": content,
+                "request_id": request_id,
+                "semantic_model": file,
+            }
+        )
 
-            content = response["message"]["content"]
-            display_content(content=content)
+        display_content(content=content, message_index=len(st.session_state.messages) - 1, jobs=jobs,
+                        semantic_model=file)
 
-            # Show the Request ID (the Query ID is retrieved for each SQL statement below)
-            st.write(f"**Request ID:** `{request_id}`")
+        # Show the Request ID (the Query ID is retrieved for each SQL statement below)
+        st.write(f"**Request ID:** `{request_id}`")
 
-    # Store the assistant's content + request ID in session state
-    st.session_state.messages.append(
-        {
-            "role": "assistant",
-            "content": content,
-            "request_id": request_id,
-        }
-    )
+def display_content(content: list, message_index: int = None, jobs: dict = None,
+                    semantic_model: str = None) -> None:
+    """
+    Displays each content item for a message, including running SQL statements.
 
-def display_content(content: list, message_index: int = None) -> None:
-    """Displays each content item for a message, including running SQL statements."""
+    jobs maps content positions to SQL already started by stream_response;
+    semantic_model selects the guardrail policy for the rest.
+    """
     # Use the current number of messages if no explicit index is provided
     message_index = message_index or len(st.session_state.messages)
+    jobs = jobs or {}
 
-    for item in content:
+    for item_index, item in enumerate(content):
         if item["type"] == "text":
             st.markdown(item["text"])
 
@@ -116,55 +375,76 @@ def display_content(content: list, message_index: int = None) -> None:
             with st.expander("SQL Query", expanded=False):
                 st.code(item["statement"], language="sql")
 
-            # Execute and display results
+            # Execute and display results (jobs started while streaming are reused)
             with st.expander("Results", expanded=True):
-                with st.spinner("Running SQL..."):
-                    session = get_active_session()
-                    df = session.sql(item["statement"]).to_pandas()
-
-                    # Retrieve the actual query ID for *this* SQL statement
-                    last_query_id_df = session.sql("SELECT LAST_QUERY_ID() AS QID").collect()
-                    last_query_id = last_query_id_df[0][0]
-
-                    # Show the Query ID below the results
-                    st.write(f"**Query ID:** `{last_query_id}`")
-
-                    # Append this (request_id, query_id) pair to a global list
-                    # so we can display it in the sidebar
-                    if "id_pairs" not in st.session_state:
-                        st.session_state.id_pairs = []
-
-                    # Use the current_request_id if it exists, otherwise "Unknown"
-                    current_req_id = st.session_state.get("current_request_id", "Unknown")
-
-                    st.session_state.id_pairs.append(
-                        {
-                            "Request Id": current_req_id,
-                            "Query Id": last_query_id,
-                        }
-                    )
-
-                    # Render the data and optional charts
-                    if len(df.index) > 1:
-                        data_tab, line_tab, bar_tab = st.tabs(["Data", "Line Chart", "Bar Chart"])
-                        data_tab.dataframe(df, use_container_width=True)
-                        if len(df.columns) > 1:
-                            df_indexed = df.set_index(df.columns[0])
+                session = get_active_session()
+                result = run_sql_async((message_index, item_index), item["statement"], semantic_model,
+                                       jobs.get(item_index))
+                guardrail = result["guardrail"]
+                if guardrail["decision"] != "allow":
+                    st.caption(f"🛡️ Guardrail: **{guardrail['decision']}** ({guardrail['reason']})")
+                if result["status"] == "rejected":
+                    st.error("Query not run: its estimated scan exceeds this semantic model's budget.")
+                    continue
+                last_query_id = result["query_id"]
+
+                # Show the Query ID below the results
+                st.write(f"**Query ID:** `{last_query_id}`")
+
+                # Append this (request_id, query_id) pair to a global list
+                # so we can display it in the sidebar
+                if "id_pairs" not in st.session_state:
+                    st.session_state.id_pairs = []
+
+                # Use the current_request_id if it exists, otherwise "Unknown"
+                current_req_id = st.session_state.get("current_request_id", "Unknown")
+
+                st.session_state.id_pairs.append(
+                    {
+                        "Request Id": current_req_id,
+                        "Query Id": last_query_id,
+                    }
+                )
+
+                # Persist new pairs (not on reruns of the chat history) for cost tracking
+                request = st.session_state.pop("current_request", None)
+                if request is not None:
+                    try:
+                        record_query(session, current_req_id, last_query_id, "streamlit_cortex_analyst",
+                                     table=QUERY_MAP_TABLE, **request)
+                    except Exception as e:
+                        st.warning(f"Could not record query ID: {e}")
+
+                if result["status"] == "cancelled":
+                    st.warning("Query cancelled.")
+                    continue
+                if result["status"] == "failed":
+                    st.error(f"Query failed: {result['error']}")
+                    continue
+                df = result["df"]
+
+                # Render the data and a chart chosen from the column types. Only the
+                # selected view is rendered; chart data is downsampled once and cached
+                spec = chart_spec(df)
+                view = "Data"
+                if spec["kind"] is not None:
+                    view = st.radio("View", ["Data", "Chart"], horizontal=True,
+                                    key=f"view_{message_index}_{item_index}", label_visibility="collapsed")
+                if view == "Data":
+                    st.dataframe(df, use_container_width=True)
+                    if result["truncated"]:
+                        st.caption(f"Showing the first {len(df.index):,} rows.")
+                else:
+                    try:
+                        if result["chart"] is None:
+                            result["chart"] = (warehouse_chart_data(session, last_query_id, spec)
+                                               if result["truncated"] else chart_data(df, spec))
+                        if spec["kind"] == "line":
+                            st.line_chart(result["chart"])
                         else:
-                            df_indexed = df
-                        with line_tab:
-                            try:
-                                st.line_chart(df_indexed)
-                            except Exception as e:
-                                st.error(f"Could not render line chart: {e}")
-                                st.dataframe(df, use_container_width=True)
-                        with bar_tab:
-                            try:
-                                st.bar_chart(df_indexed)
-                            except Exception as e:
-                                st.error(f"Could not render bar chart: {e}")
-                                st.dataframe(df, use_container_width=True)
-                    else:
+                            st.bar_chart(result["chart"])
+                    except Exception as e:
+                        st.error(f"Could not render chart: {e}")
                         st.dataframe(df, use_container_width=True)
 
 ########################################
@@ -187,25 +467,48 @@ if "current_request_id" not in st.session_state:
 if "id_pairs" not in st.session_state:
     st.session_state.id_pairs = []
 
+# Tag and route this chat session's queries (catalog calls included)
+if "run_id" not in st.session_state:
+    st.session_state.run_id = uuid.uuid4().hex
+use_workload(get_active_session(), WORKLOAD, APP_NAME, st.session_state.run_id)
+
 # ------------------------------
 # SIDEBAR - File selection and YAML
 # ------------------------------
+# Stage listing and parsed models come from semantic_model_registry's in-memory
+# cache; a file is only re-read when its md5 on the stage changes
 st.sidebar.title("File Selection")
-yaml_files = get_yaml_files()
+stage_name = f"{DATABASE}.{SCHEMA}.{STAGE}"
+if st.sidebar.button("Reload models"):
+    clear_cache()
+yaml_files = [entry["name"] for entry in list_models(get_active_session(), stage_name)]
 selected_file = st.sidebar.selectbox("Select a YAML file", yaml_files)
+semantic_model = load_model(get_active_session(), stage_name, selected_file) if selected_file else None
+
+if semantic_model is not None:
+    if semantic_model["errors"]:
+        st.sidebar.error("Semantic model problems:\n\n" + "\n".join(f"- {e}" for e in semantic_model["errors"]))
+    st.sidebar.caption(f"Content hash: `{semantic_model['content_hash'][:12]}`")
+    with st.sidebar.expander("Tables & measures"):
+        st.dataframe(pd.DataFrame(semantic_model["tables"]), use_container_width=True, hide_index=True)
+        st.dataframe(pd.DataFrame(semantic_model["measures"]), use_container_width=True, hide_index=True)
+
+st.sidebar.checkbox("Stream responses (experimental)", value=False, key="stream_responses",
+                    help="Request the answer in streaming mode. Streamlit in Snowflake buffers the response, so "
+                         "this does not show the answer or start its SQL any sooner than the default request.")
 
 show_yaml = st.sidebar.checkbox("Show YAML Content", value=False)
-if show_yaml:
+if show_yaml and semantic_model is not None:
     st.sidebar.subheader("YAML Content")
-    yaml_content = get_yaml_content(selected_file)
-    st.sidebar.code(yaml_content, language="yaml", line_numbers=True)
+    st.sidebar.code(semantic_model["text"], language="yaml", line_numbers=True)
 
 st.markdown(f"Semantic Model: `{selected_file}`")
 
 # Display existing conversation
 for message_index, message in enumerate(st.session_state.messages):
     with st.chat_message(message["role"]):
-        display_content(content=message["content"], message_index=message_index)
+        display_content(content=message["content"], message_index=message_index,
+                        semantic_model=message.get("semantic_model"))
 
         if message["role"] == "assistant":
             req_id = message.get("request_id", "Unknown")
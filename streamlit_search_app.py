@@ -14,6 +14,8 @@ from snowflake.snowpark.functions import call_udf, concat, lit
 from snowflake.snowpark.context import get_active_session
 from snowflake.core import Root
 
+from app_workloads import use_workload
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -21,11 +23,15 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 session = get_active_session()
 logging.info("Active Snowflake session retrieved.")
 
+# Route and tag this app's queries (document list, chunk lookups, COMPLETE calls)
+use_workload(session, "interactive", app="streamlit_search_app")
+
 # Define database, schema, and search service names
 # Update these parameters as needed for your specific Snowflake setup
 db_name = '<your_database_name>'
 schema_name = '<your_schema_name>'
 search_service_name = '<your_search_service_name>'
+chunks_table_name = 'DOCS_CHUNKS_TABLE'
 
 # Set up the Cortex Search Service Root
 root = Root(session)
@@ -99,7 +105,7 @@ if history_limit != st.session_state.history_limit:
 # Document filtering options (only shown when Cortex Search is enabled)
 if cortex_search_on:
     # Fetch unique document paths from the database
-    query = f"SELECT DISTINCT RELATIVE_PATH FROM {db_name}.{schema_name}.DOCS_CHUNKS_TABLE ORDER BY RELATIVE_PATH"
+    query = f"SELECT DISTINCT RELATIVE_PATH FROM {db_name}.{schema_name}.{chunks_table_name} ORDER BY RELATIVE_PATH"
     try:
         file_df = session.sql(query).collect()
         options = [row['RELATIVE_PATH'] for row in file_df]
@@ -111,6 +117,13 @@ if cortex_search_on:
     # Document selection and chunk limit controls
     selected_options = st.sidebar.multiselect('Select documents', options, default='All Documents')
     num_chunks = st.sidebar.slider('Number of chunks to use', min_value=1, max_value=10, value=5)
+    neighbor_chunks = st.sidebar.slider(
+        'Neighbor chunks (±N)',
+        min_value=0,
+        max_value=3,
+        value=0,
+        help="Expands each search hit with the N chunks before and after it in the same document. Use with a small, non-overlapping chunker so context past a chunk boundary is recovered at answer time instead of being embedded twice."
+    )
 
 #------------------------------------------------------------------------------
 # MAIN UI SETUP
@@ -170,6 +183,81 @@ def highlight_citations(text, show_sources=True):
         # Write the entire processed paragraph as a single markdown element
         st.markdown(processed_paragraph, unsafe_allow_html=True)
 
+def expand_with_neighbors(results, n):
+    """
+    Replace each search hit with the hit plus its ±n neighboring chunks.
+    
+    Windows that overlap or touch within the same document are merged into a
+    single contiguous range, and all ranges are fetched with one batched lookup
+    on (RELATIVE_PATH, CHUNK_ORDER).
+    
+    Args:
+        results (list): Cortex Search results with chunk, relative_path and chunk_order
+        n (int): Number of neighbors to fetch on each side of a hit
+    """
+    if n <= 0 or not results:
+        return results
+    
+    # Build the window around every hit, remembering the best (lowest) rank per document
+    windows = {}
+    for rank, result in enumerate(results):
+        order = int(result['chunk_order'])
+        windows.setdefault(result['relative_path'], []).append((max(order - n, 0), order + n, rank))
+    
+    # Merge overlapping or adjacent windows into contiguous ranges
+    ranges = []
+    for path, path_windows in windows.items():
+        path_windows.sort()
+        lo, hi, rank = path_windows[0]
+        for next_lo, next_hi, next_rank in path_windows[1:]:
+            if next_lo <= hi + 1:
+                hi = max(hi, next_hi)
+                rank = min(rank, next_rank)
+            else:
+                ranges.append((rank, path, lo, hi))
+                lo, hi, rank = next_lo, next_hi, next_rank
+        ranges.append((rank, path, lo, hi))
+    
+    # Keep the merged ranges in the order of their best-ranked hit
+    ranges.sort()
+    
+    # One lookup for every range
+    values = ", ".join(["(?, ?, ?, ?)"] * len(ranges))
+    params = []
+    for range_id, (_, path, lo, hi) in enumerate(ranges):
+        params.extend([range_id, path, lo, hi])
+    
+    query = f"""
+    WITH ranges (range_id, relative_path, lo, hi) AS (
+        SELECT * FROM VALUES {values}
+    )
+    SELECT r.range_id, c.chunk_order, c.chunk
+    FROM ranges r
+    JOIN {db_name}.{schema_name}.{chunks_table_name} c
+      ON c.relative_path = r.relative_path
+     AND c.chunk_order BETWEEN r.lo AND r.hi
+    ORDER BY r.range_id, c.chunk_order
+    """
+    rows = session.sql(query, params=params).collect()
+    
+    # Stitch each range back together in document order
+    range_chunks = {}
+    for row in rows:
+        range_chunks.setdefault(row['RANGE_ID'], []).append(row['CHUNK'])
+    
+    expanded = []
+    for range_id, (_, path, lo, hi) in enumerate(ranges):
+        if range_id not in range_chunks:
+            continue
+        expanded.append({
+            'chunk': '\n'.join(range_chunks[range_id]),
+            'relative_path': path,
+            'chunk_order': lo,
+            'chunk_range': f"{lo}-{hi}",
+        })
+    
+    return expanded
+
 def display_sources(sources):
     """
     Display source documents in expandable sections with proper formatting.
@@ -192,6 +280,8 @@ def display_sources(sources):
         source_title = f"Source {i+1}"
         if 'metadata' in result and result['metadata'] and 'source' in result['metadata']:
             source_title += f" - {result['metadata']['source']}"
+        elif result.get('relative_path'):
+            source_title += f" - {result['relative_path']}"
         
         # Create an expander for this source
         with st.expander(source_title):
@@ -302,13 +392,16 @@ if prompt:
             # Execute search with or without filter
             question_response = cortex_service.search(
                 prompt, 
-                ["chunk"], 
+                ["chunk", "relative_path", "chunk_order"], 
                 filter=filter_dict if filter_dict else None,
                 limit=num_chunks
             )
 
+            # Optionally widen each hit with its neighboring chunks
+            search_results = expand_with_neighbors(question_response.results, neighbor_chunks)
+
             # Build context string from search results
-            for i, result in enumerate(question_response.results):
+            for i, result in enumerate(search_results):
                 context += f"Source {i+1}:\n{result['chunk']}\n\n"
 
         except Exception as e:
@@ -321,7 +414,7 @@ if prompt:
     if cortex_search_on and not error_occurred:
         # Create source previews for citation guidance
         source_list = ""
-        for i, result in enumerate(question_response.results):
+        for i, result in enumerate(search_results):
             # Get the first 100 characters of each source as a preview
             preview = result['chunk'][:100] + "..." if len(result['chunk']) > 100 else result['chunk']
             source_list += f"Source {i+1}: {preview}\n\n"
@@ -387,8 +480,8 @@ Instructions:
         
         # Store the response with source data if available
         response_message = {"role": "assistant", "content": full_response}
-        if cortex_search_on and not error_occurred and 'question_response' in locals():
-            response_message["source_data"] = question_response.results
+        if cortex_search_on and not error_occurred and 'search_results' in locals():
+            response_message["source_data"] = search_results
         
         # Add response to chat history
         st.session_state.messages.append(response_message)
@@ -398,7 +491,7 @@ Instructions:
             highlight_citations(full_response, show_sources)
             
             # Display sources if enabled
-            if cortex_search_on and not error_occurred and 'question_response' in locals():
-                display_sources(question_response.results)
+            if cortex_search_on and not error_occurred and 'search_results' in locals():
+                display_sources(search_results)
     except Exception as e:
         st.error(f"An error occurred while processing the response: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,32 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from text_chunker import split_text, synthetic_corpus  # noqa: E402
+
+
+def _overlap(previous: str, following: str) -> str:
+    """Longest prefix of `following` that `previous` ends with."""
+    for n in range(min(len(previous), len(following)), 0, -1):
+        if previous.endswith(following[:n]):
+            return following[:n]
+    return ""
+
+
+def test_overlap_survives_a_space_at_the_chunk_end():
+    chunks = split_text("alpha beta gamma delta epsilon zeta eta theta iota kappa lambda mu", 20, 5)
+    assert len(chunks) > 1
+    for previous, following in zip(chunks, chunks[1:]):
+        assert _overlap(previous, following).strip()
+
+
+@pytest.mark.parametrize("chunk_size, chunk_overlap", [(200, 40), (1512, 256)])
+def test_consecutive_chunks_overlap(chunk_size, chunk_overlap):
+    for doc in synthetic_corpus(num_docs=20, seed=3):
+        chunks = split_text(doc, chunk_size, chunk_overlap)
+        assert all(len(c) <= chunk_size for c in chunks)
+        for previous, following in zip(chunks, chunks[1:]):
+            assert _overlap(previous, following).strip()
@@ -0,0 +1,212 @@
+#------------------------------------------------------------------------------
+# TEXT CHUNKER
+# Dependency-free replacement for the LangChain-based text_chunker UDTF used in
+# "Cortex Search Build.ipynb".
+#
+# - split_text() walks each document once, cutting at the best separator
+#   (paragraph, line, sentence, word) inside the window with str.rfind
+# - chunk size and overlap can be measured in characters or in (approximate)
+#   tokens, so chunks can be kept under the embedding model's context window
+# - TextChunker is a vectorized UDTF handler: a whole partition of documents is
+#   chunked in end_partition and returned as one DataFrame
+#
+# Run `python text_chunker.py` to benchmark against the LangChain splitter.
+#------------------------------------------------------------------------------
+
+import re
+import time
+from bisect import bisect_right
+
+import pandas as pd
+
+try:
+    from _snowflake import vectorized
+except ImportError:
+    # Outside Snowflake (e.g. the local benchmark) the decorator is a no-op
+    def vectorized(**kwargs):
+        return lambda func: func
+
+DEFAULT_CHUNK_SIZE = 1512
+DEFAULT_CHUNK_OVERLAP = 256
+
+# Preferred cut points, best first
+SEPARATORS = ("\n\n", "\n", ". ", " ")
+
+# Rough word-piece tokenizer: one token per word or punctuation mark
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def _token_offsets(text: str) -> list:
+    """Character offset of every token start, plus len(text) as the final boundary."""
+    offsets = [m.start() for m in TOKEN_PATTERN.finditer(text)]
+    offsets.append(len(text))
+    return offsets
+
+
+def split_text(text: str,
+               chunk_size: int = DEFAULT_CHUNK_SIZE,
+               chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+               length_unit: str = "chars") -> list:
+    """
+    Split text into chunks of at most chunk_size units with chunk_overlap units of overlap.
+
+    Args:
+        text (str): Document text
+        chunk_size (int): Maximum chunk length
+        chunk_overlap (int): Length shared between consecutive chunks
+        length_unit (str): "chars" or "tokens"
+    """
+    if not text:
+        return []
+    if chunk_overlap >= chunk_size:
+        raise ValueError("chunk_overlap must be smaller than chunk_size")
+
+    # Map unit positions to character offsets (identity for characters)
+    if length_unit == "tokens":
+        offsets = _token_offsets(text)
+        n_units = len(offsets) - 1
+        to_char = offsets.__getitem__
+        to_unit = lambda c: bisect_right(offsets, c) - 1
+    elif length_unit == "chars":
+        n_units = len(text)
+        to_char = to_unit = lambda i: i
+    else:
+        raise ValueError(f"Unknown length_unit: {length_unit}")
+
+    chunks = []
+    start = 0
+    while start < n_units:
+        end = min(start + chunk_size, n_units)
+        start_c, end_c = to_char(start), to_char(end)
+
+        if end < n_units:
+            # Cut at the best separator in the second half of the window
+            floor_c = to_char(start + chunk_size // 2)
+            for sep in SEPARATORS:
+                k = text.rfind(sep, floor_c, end_c)
+                if k != -1:
+                    cut = to_unit(k + len(sep))
+                    if cut > start:
+                        end = cut
+                        end_c = to_char(end)
+                    break
+
+        chunk = text[start_c:end_c].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= n_units:
+            break
+
+        # Step back by the overlap, then to a word boundary that still leaves
+        # some overlap: forward if one is inside it, otherwise backward
+        next_start = max(end - chunk_overlap, start + 1)
+        if length_unit == "chars" and chunk_overlap:
+            k = text.find(" ", next_start, end)
+            if k != -1 and k + 1 < end:
+                next_start = k + 1
+            else:
+                k = text.rfind(" ", start, next_start)
+                if k != -1 and k + 1 > start:
+                    next_start = k + 1
+        start = next_start
+
+    return chunks
+
+
+class TextChunker:
+    """
+    Vectorized UDTF handler.
+
+    Input columns: relative_path, text, chunk_size, chunk_overlap, length_unit
+    Output columns: relative_path, chunk_order, chunk
+
+    Call it with a PARTITION BY that groups many documents together, e.g.
+    OVER (PARTITION BY MOD(ABS(HASH(relative_path)), 64)), so each worker
+    chunks a batch of documents and emits them in a single DataFrame.
+    """
+
+    @vectorized(input=pd.DataFrame)
+    def end_partition(self, df):
+        paths, orders, chunks = [], [], []
+        for path, text, size, overlap, unit in df.itertuples(index=False, name=None):
+            size = int(size) if size else DEFAULT_CHUNK_SIZE
+            overlap = int(overlap) if overlap is not None else DEFAULT_CHUNK_OVERLAP
+            doc_chunks = split_text(text or "", size, overlap, unit or "chars")
+            paths.extend([path] * len(doc_chunks))
+            orders.extend(range(len(doc_chunks)))
+            chunks.extend(doc_chunks)
+        return pd.DataFrame({"relative_path": paths, "chunk_order": orders, "chunk": chunks})
+
+
+#------------------------------------------------------------------------------
+# BENCHMARK
+#------------------------------------------------------------------------------
+
+def synthetic_corpus(num_docs: int = 2000, paragraphs_per_doc: int = 40, seed: int = 7) -> list:
+    """Build parsed-PDF-like documents: headings, paragraphs of sentences and blank lines."""
+    import random
+
+    rng = random.Random(seed)
+    vocab = [
+        "revenue", "margin", "customer", "warehouse", "quarter", "growth", "policy",
+        "contract", "the", "of", "and", "to", "in", "for", "with", "on", "data",
+        "report", "system", "service", "account", "region", "forecast", "risk",
+    ]
+    docs = []
+    for d in range(num_docs):
+        parts = [f"## Document {d}"]
+        for _ in range(paragraphs_per_doc):
+            sentences = [
+                " ".join(rng.choice(vocab) for _ in range(rng.randint(6, 20))).capitalize() + "."
+                for _ in range(rng.randint(2, 6))
+            ]
+            parts.append(" ".join(sentences))
+        docs.append("\n\n".join(parts))
+    return docs
+
+
+def benchmark(num_docs: int = 2000, chunk_size: int = DEFAULT_CHUNK_SIZE,
+              chunk_overlap: int = DEFAULT_CHUNK_OVERLAP) -> pd.DataFrame:
+    """Time the LangChain UDTF logic against TextChunker on a synthetic corpus."""
+    docs = synthetic_corpus(num_docs)
+    total_mb = sum(len(d) for d in docs) / 1e6
+    results = []
+
+    try:
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+    except ImportError:
+        RecursiveCharacterTextSplitter = None
+
+    if RecursiveCharacterTextSplitter is not None:
+        # Same work the current notebook UDTF does: one splitter + DataFrame per document
+        t0 = time.perf_counter()
+        n_chunks = 0
+        for text in docs:
+            splitter = RecursiveCharacterTextSplitter(
+                chunk_size=chunk_size, chunk_overlap=chunk_overlap, length_function=len
+            )
+            df = pd.DataFrame(splitter.split_text(text), columns=["chunks"])
+            n_chunks += sum(1 for _ in df.itertuples(index=True, name=None))
+        results.append(("langchain (per-document UDTF)", time.perf_counter() - t0, n_chunks))
+    else:
+        print("langchain not installed - skipping the baseline")
+
+    for unit, size, overlap in (("chars", chunk_size, chunk_overlap), ("tokens", 384, 64)):
+        batch = pd.DataFrame({
+            0: [f"doc_{i}.pdf" for i in range(len(docs))],
+            1: docs,
+            2: size,
+            3: overlap,
+            4: unit,
+        })
+        t0 = time.perf_counter()
+        out = TextChunker().end_partition(batch)
+        results.append((f"text_chunker ({unit}, {size}/{overlap})", time.perf_counter() - t0, len(out)))
+
+    report = pd.DataFrame(results, columns=["implementation", "seconds", "chunks"])
+    report["MB_per_sec"] = total_mb / report["seconds"]
+    return report
+
+
+if __name__ == "__main__":
+    print(benchmark().to_string(index=False))